@@ -0,0 +1,375 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+import xml.etree.ElementTree as ET
+
+import aiohttp
+from yarl import URL
+
+from marvell_11abbe00.batch import (
+    DEFAULT_BATCH_MAX_SECTIONS,
+    SwitchTransaction,
+    build_queries,
+    plan_batches,
+)
+from marvell_11abbe00.endpoints import (
+    SystemActions,
+    get_login_endpoint,
+    get_system_action_endpoint,
+    get_wcd_endpoint,
+)
+from marvell_11abbe00.response import ActionStatus, StatusCode
+from marvell_11abbe00.retry import ResponseError
+from marvell_11abbe00.stream import (
+    DEFAULT_CHUNK_SIZE,
+    WCDStreamParser,
+    is_section_record,
+)
+from marvell_11abbe00.switch import (
+    SwitchOperations,
+    assign_action_statuses,
+    assign_bulk_status,
+    check_write,
+    is_authenticated,
+    record_bulk_error,
+    section_query,
+    session_id_from_login,
+)
+from marvell_11abbe00.template import serialize_payload
+from marvell_11abbe00.defaults import (
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_POOL_MAXSIZE,
+    DEFAULT_READ_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+
+class AsyncResponse:
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+
+class AsyncSwitchTransport:
+    """
+    aiohttp based counterpart of SwitchTransport. A semaphore bounds the number of
+    requests in flight so concurrent reads don't overwhelm the switch CPU.
+
+    The semaphore and the aiohttp session are created on first use, from inside the
+    running event loop, and again whenever another loop runs the transport: both are
+    bound to the loop they were created in, e.g. every asyncio.run() starts a new one.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        pool_maxsize=DEFAULT_POOL_MAXSIZE,
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+        read_timeout=DEFAULT_READ_TIMEOUT,
+        verify=False,
+    ):
+        self.max_concurrency = max_concurrency
+        self.pool_maxsize = pool_maxsize
+        self.timeout = aiohttp.ClientTimeout(
+            sock_connect=connect_timeout, sock_read=read_timeout
+        )
+        self.verify = verify
+        self.requests = 0
+        self._session = None
+        self._semaphore = None
+        self._loop = None
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            if self._session is not None:
+                # left open by a previous loop, it can't be closed from this one
+                logger.warning("aiohttp session of a previous event loop not closed")
+                self._session.detach()
+                self._session = None
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+
+    @property
+    def semaphore(self):
+        self._bind_loop()
+        return self._semaphore
+
+    @property
+    def session(self):
+        self._bind_loop()
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.pool_maxsize, ssl=None if self.verify else False
+                ),
+                timeout=self.timeout,
+            )
+        return self._session
+
+    async def request(self, method, url, **kwargs):
+        async with self.semaphore:
+            self.requests += 1
+            # the WCD query syntax uses raw braces which must not be re-quoted
+            async with self.session.request(
+                method, URL(url, encoded=True), **kwargs
+            ) as r:
+                content = await r.read()
+                return AsyncResponse(r.status, r.headers, content)
+
+    async def iter_chunks(self, method, url, chunk_size=DEFAULT_CHUNK_SIZE, **kwargs):
+        """
+        Async generator over the body chunks of a response as they are received
+        """
+        async with self.semaphore:
+            self.requests += 1
+            async with self.session.request(
+                method, URL(url, encoded=True), **kwargs
+            ) as r:
+                r.raise_for_status()
+                async for chunk in r.content.iter_chunked(chunk_size):
+                    yield chunk
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+def check_stream_item(item, section):
+    """
+    @return whether the item is a record of the section to yield
+    @raise ResponseError on an error ActionStatus, e.g. an expired session
+    """
+    if isinstance(item, ActionStatus):
+        if item.statusCode not in (None, StatusCode.OK):
+            raise ResponseError(f"error response: {item.statusString}", item.statusCode)
+        return False
+    return is_section_record(item, section)
+
+
+class AsyncSwitchTransaction(SwitchTransaction):
+    async def flush(self):
+        writes, self.writes = self.writes, []
+        batches = plan_batches(writes, self.max_sections)
+        logger.debug(f"flushing {len(writes)} writes in {len(batches)} requests")
+
+        for batch in batches:
+            await self.switch.post_writes(batch)
+            if len(batch) > 1 and self.isolate_failures:
+                for write in [write for write in batch if not write.ok]:
+                    await self.switch.post_writes([write])
+
+        self.results.extend(writes)
+        return writes
+
+
+class AsyncSwitchConfigurationManager(SwitchOperations):
+    """
+    asyncio version of SwitchConfigurationManager. It exposes the same setters, each of
+    them returning an awaitable, so independent reads and writes can be gathered:
+
+    async with AsyncSwitchConfigurationManager(host) as switch:
+        await switch.login()
+        trees = await asyncio.gather(
+            switch.fetch_sections_xml([Sections.STANDARD_8023_LIST.value]),
+            switch.fetch_sections_xml(["StatisticsList"]),
+        )
+
+    Inside `async with switch.batch() as tx` every setter still has to be awaited, it only
+    queues the write; the queued writes are flushed when the block exits.
+
+    Limitations: unlike SwitchConfigurationManager, requests are sent once, with no
+    retry_policy, deadline, circuit breaker, SwitchSession renewal or AdaptiveLimiter,
+    and observers get no RequestEvents. A streamed read fails with a ResponseError on an
+    error ActionStatus and an aiohttp.ClientResponseError on an HTTP error status. Only
+    the concurrency bound of the transport and the cache invalidation on writes are
+    shared with the blocking manager.
+    """
+
+    def __init__(
+        self,
+        host,
+        transport=None,
+        cache=None,
+        *,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    ):
+        super().__init__(host, cache=cache)
+        self.transport = (
+            AsyncSwitchTransport(max_concurrency=max_concurrency)
+            if transport is None
+            else transport
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        await self.transport.close()
+
+    async def login(self, user="cisco", password="cisco"):
+        r = await self.transport.get(
+            get_login_endpoint(self.host, user=user, password=password)
+        )
+        self.token = session_id_from_login(r.status_code, r.text, r.headers)
+        return self.token
+
+    @asynccontextmanager
+    async def batch(
+        self, *, max_sections=DEFAULT_BATCH_MAX_SECTIONS, isolate_failures=True
+    ):
+        if self._transaction is not None:
+            yield self._transaction
+            return
+
+        transaction = AsyncSwitchTransaction(
+            self, max_sections=max_sections, isolate_failures=isolate_failures
+        )
+        self._transaction = transaction
+        try:
+            yield transaction
+        except BaseException:
+            transaction.discard()
+            raise
+        finally:
+            self._transaction = None
+
+        await transaction.flush()
+        failures = transaction.failures
+        if failures:
+            raise Exception(
+                "error while flushing batch: "
+                + ", ".join(f"{write.key} ({write.description})" for write in failures)
+            )
+
+    async def submit(self, write):
+        if self._transaction is not None:
+            return self._transaction.queue(write)
+
+        await self.post_writes([write])
+        return check_write(write)
+
+    @is_authenticated
+    async def set_interfaces_section_settings(
+        self, *, section, interfaces, settings=None
+    ):
+        """
+        asyncio version of SwitchConfigurationManager.set_interfaces_section_settings, the
+        per interface requests are gathered and bounded by the transport concurrency
+        """
+        names, writes, merged = self.plan_bulk_writes(section, interfaces, settings)
+        if not names:
+            return writes
+        if self._transaction is not None:
+            for write in writes.values():
+                self._transaction.queue(write)
+            return writes
+
+        if merged is not None:
+            try:
+                await self.post_writes([merged])
+            except Exception as e:
+                record_bulk_error(self.host, e, writes.values())
+                return writes
+            if merged.ok:
+                assign_bulk_status(merged, writes)
+                return writes
+            logger.debug(f"[{self.host}] {section} rows rejected, one per request")
+
+        async def post(write):
+            try:
+                await self.post_writes([write])
+            except Exception as e:
+                record_bulk_error(self.host, e, [write])
+
+        await asyncio.gather(*(post(write) for write in writes.values()))
+
+        self.learn_bulk_support(section, merged, writes)
+        return writes
+
+    @is_authenticated
+    async def post_writes(self, writes):
+        xml = serialize_payload(writes, self.payload_backend)
+        url = get_wcd_endpoint(self.host, build_queries(writes))
+
+        logger.debug(f"url: {url}")
+        logger.debug(f"payload: {xml}")
+
+        r = await self.transport.post(url, data=xml, headers={"sessionID": self.token})
+        for write in writes:
+            self.cache.invalidate(write.section)
+
+        logger.debug(f"response: {r.text}")
+
+        assign_action_statuses(writes, r.content)
+        return writes
+
+    @is_authenticated
+    async def fetch_sections_xml(self, sections=[]):
+        endpoint = get_wcd_endpoint(self.host, sections)
+        r = await self.transport.get(endpoint, headers={"sessionID": self.token})
+
+        return ET.fromstring(r.content)
+
+    @is_authenticated
+    async def get_section(self, section, interfaceName=None, *, max_age=None):
+        section, query = section_query(section, interfaceName)
+        records = self.cache.get((section, query), max_age)
+        if records is None:
+            records = [
+                record async for record in self.stream_section_records([query], section)
+            ]
+            self.cache.put((section, query), records)
+
+        return records
+
+    @is_authenticated
+    async def stream_section_records(self, sections=[], section=None):
+        endpoint = get_wcd_endpoint(self.host, sections)
+        parser = WCDStreamParser()
+        async for chunk in self.transport.iter_chunks(
+            "GET", endpoint, headers={"sessionID": self.token}
+        ):
+            for item in parser.feed(chunk):
+                if check_stream_item(item, section):
+                    yield item
+        for item in parser.close():
+            if check_stream_item(item, section):
+                yield item
+
+    @is_authenticated
+    async def get_sections_xml(self, sections=[]):
+        xmltree = await self.fetch_sections_xml(sections)
+        ET.indent(xmltree, space="\t", level=0)
+        ET.dump(xmltree)
+
+    @is_authenticated
+    async def download_config(self):
+        """
+        It won't certainly work as the config that the ENCS5400 will pull doesn't seem to match the current state
+        """
+        endpoint = get_system_action_endpoint(
+            self.host, SystemActions.DOWNLOAD_CONFIGURATION_FILE.value
+        )
+        r = await self.transport.get(endpoint, headers={"sessionID": self.token})
+
+        print(f"Response: {r.text}")
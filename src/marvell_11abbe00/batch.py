@@ -0,0 +1,155 @@
+import logging
+
+from marvell_11abbe00.builder import DeviceConfiguration, Version
+from marvell_11abbe00.response import StatusCode
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_MAX_SECTIONS = 16
+
+
+class SectionWrite:
+    """
+    A single set operation on a WCD section.
+
+    @param section section name, e.g. Sections.STP.value
+    @param node ServiceFactory node holding the settings to apply
+    @param query WCD query to address the section, e.g. "PoEPSEInterfaceList&interfaceName=gi0".
+                 None posts to the bare wcd? endpoint.
+    @param versioned whether the payload carries the <version> node when sent on its own
+    @param description error message used when the switch rejects the write
+    @param idempotent whether sending the write twice is harmless, true for a `set`
+    """
+
+    def __init__(
+        self,
+        *,
+        section,
+        node,
+        query=None,
+        versioned=True,
+        description=None,
+        idempotent=True,
+    ):
+        self.section = section
+        self.node = node
+        self.query = query
+        self.versioned = versioned
+        self.description = description or f"error while setting {section} settings"
+        self.idempotent = idempotent
+        self.actionStatus = None
+        # exception the write failed with when it is recorded rather than raised
+        self.error = None
+        self.skipped = False
+
+    @property
+    def key(self):
+        return self.query if self.query is not None else self.section
+
+    @property
+    def ok(self):
+        if self.skipped:
+            return True
+        return self.actionStatus is not None and self.actionStatus.statusCode in (
+            None,
+            StatusCode.OK,
+        )
+
+    def __str__(self):
+        if self.skipped:
+            return f"<SectionWrite {self.key} skipped>"
+        if self.error is not None:
+            return f"<SectionWrite {self.key} error={self.error!r}>"
+        return f"<SectionWrite {self.key} actionStatus={self.actionStatus}>"
+
+
+def build_payload(writes):
+    """
+    Wrap one or more section writes into a single DeviceConfiguration request
+    """
+    root = DeviceConfiguration()
+    if len(writes) > 1 or writes[0].versioned:
+        root.append(Version("1.0"))
+    for write in writes:
+        root.append(write.node)
+
+    return root.build()
+
+
+def build_queries(writes):
+    return [write.query for write in writes if write.query is not None]
+
+
+def plan_batches(writes, max_sections=DEFAULT_BATCH_MAX_SECTIONS):
+    """
+    Group writes, in order, into the fewest possible WCD requests.
+
+    A request never addresses the same section/interface key twice, so a later write
+    to a key already present in the current request starts a new one and the
+    original ordering between writes to the same key is preserved.
+    """
+    batches = []
+    current = []
+    keys = set()
+    for write in writes:
+        if write.key in keys or len(current) >= max_sections:
+            batches.append(current)
+            current = []
+            keys = set()
+        current.append(write)
+        keys.add(write.key)
+
+    if current:
+        batches.append(current)
+
+    return batches
+
+
+class SwitchTransaction:
+    """
+    Collects the set operations issued inside SwitchConfigurationManager.batch() and
+    flushes them as multi-section WCD requests.
+
+    Every setter of the manager can be called on the transaction, it returns the queued
+    SectionWrite whose actionStatus is filled once the transaction is flushed.
+    """
+
+    def __init__(
+        self, switch, *, max_sections=DEFAULT_BATCH_MAX_SECTIONS, isolate_failures=True
+    ):
+        self.switch = switch
+        self.max_sections = max_sections
+        self.isolate_failures = isolate_failures
+        self.writes = []
+        self.results = []
+
+    def __getattr__(self, name):
+        return getattr(self.switch, name)
+
+    def queue(self, write):
+        self.writes.append(write)
+        return write
+
+    def discard(self):
+        self.writes = []
+
+    def flush(self):
+        writes, self.writes = self.writes, []
+        batches = plan_batches(writes, self.max_sections)
+        logger.debug(f"flushing {len(writes)} writes in {len(batches)} requests")
+
+        for batch in batches:
+            self.switch.post_writes(batch)
+            if len(batch) > 1 and self.isolate_failures:
+                # the switch may answer a multi-section request with a single status,
+                # resend on their own the writes that failed or whose outcome is unknown
+                # to find out which one the switch rejects
+                for write in [write for write in batch if not write.ok]:
+                    self.switch.post_writes([write])
+
+        self.results.extend(writes)
+        return writes
+
+    @property
+    def failures(self):
+        return [write for write in self.results if not write.ok]
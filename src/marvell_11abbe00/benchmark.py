@@ -0,0 +1,349 @@
+import argparse
+import json
+import logging
+import platform
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+
+from marvell_11abbe00.instrument import summarize
+from marvell_11abbe00.mock_server import MockSwitchServer, MockSwitchState
+from marvell_11abbe00.replay import compile_har, replay_entries
+from marvell_11abbe00.response import ActionStatus, WCDResponse
+from marvell_11abbe00.stream import iter_response
+from marvell_11abbe00.switch import SwitchConfigurationManager, SwitchOperations
+from marvell_11abbe00.template import (
+    PAYLOAD_BACKEND_BUILDER,
+    PAYLOAD_BACKEND_TEMPLATE,
+    serialize_payload,
+)
+from marvell_11abbe00.transport import SwitchTransport
+
+logger = logging.getLogger(__name__)
+
+RESULTS_FORMAT_VERSION = 1
+
+DEFAULT_REPEAT = 200
+
+# modules the command line entry points start with
+IMPORT_CASES = (
+    "marvell_11abbe00.client",
+    "marvell_11abbe00.switch",
+    "marvell_11abbe00.replay",
+    "marvell_11abbe00.snapshot",
+    "marvell_11abbe00.transport",
+)
+
+# representative arguments for every setter benchmarked
+SETTER_CASES = {
+    "set_max_idle_timeout": {"timeout": 0},
+    "set_time": {"date": datetime(2024, 1, 1, 12, 0, 0)},
+    "set_vlan_id": {"vlanid": 2350},
+    "set_interface_vlan_settings": {
+        "interfaceName": "te1",
+        "settings": [{"switchPortModeAdmin": "12", "trunkNativeVLAN": "1"}],
+    },
+    "set_interface_lldp_settings": {
+        "interfaceName": "te1",
+        "settings": [{"portState": "4"}],
+    },
+    "set_interface_cdp_settings": {"interfaceName": "te1", "settings": [{"enbl": 2}]},
+    "set_poe_pse_interface_settings": {
+        "interfaceName": "gi0",
+        "settings": [{"adminEnable": "1", "powerPriority": "3"}],
+    },
+    "set_security_interface_settings": {
+        "interfaceName": "gi0",
+        "settings": [{"lockInterfaceAdminEnabled": "2", "learningMode": "1"}],
+    },
+    "set_stp_global_settings": {"settings": [{"STPOperationMode": "2"}]},
+    "set_interface_8023_settings": {
+        "interfaceName": "gi0",
+        "settings": [{"speedAdmin": "1000", "duplexAdmin": "1"}],
+    },
+}
+
+
+def measure(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+class _CapturingSwitch(SwitchOperations):
+    """
+    Setters return their SectionWrite instead of sending it
+    """
+
+    def __init__(self):
+        super().__init__("benchmark")
+        self.token = "benchmark"
+
+    def submit(self, write):
+        return write
+
+
+def load_har_bodies(harFile):
+    """
+    XML response bodies of the WCD requests of a HAR capture
+    """
+    with open(harFile, "r", encoding="utf-8") as f:
+        har = json.load(f)
+
+    bodies = []
+    for entry in har["log"]["entries"]:
+        text = entry["response"]["content"].get("text")
+        if text and "<ResponseData" in text:
+            bodies.append(text.encode("utf-8"))
+    return bodies
+
+
+def bench_builder(repeat):
+    """
+    Payload construction per setter: setter call plus serialization, through
+    ElementTree (builder backend) and through cached templates (template backend)
+    """
+    switch = _CapturingSwitch()
+    results = {}
+    for name, kwargs in SETTER_CASES.items():
+        setter = getattr(switch, name)
+        results[name] = {
+            backend: measure(
+                lambda: serialize_payload([setter(**kwargs)], backend), repeat
+            )
+            for backend in (PAYLOAD_BACKEND_BUILDER, PAYLOAD_BACKEND_TEMPLATE)
+        }
+    return results
+
+
+def bench_parser(bodies, repeat):
+    """
+    Parse time over every WCD response body of the capture, per parser
+    """
+    totalBytes = sum(len(body) for body in bodies)
+
+    def action_status():
+        for body in bodies:
+            ActionStatus.from_xml_response(ET.fromstring(body))
+
+    def wcd_response():
+        for body in bodies:
+            WCDResponse.from_xml_response(ET.fromstring(body))
+
+    def streaming():
+        for body in bodies:
+            for _ in iter_response([body]):
+                pass
+
+    results = {"bodies": len(bodies), "bytes": totalBytes}
+    for name, func in (
+        ("ActionStatus.from_xml_response", action_status),
+        ("WCDResponse.from_xml_response", wcd_response),
+        ("stream.iter_response", streaming),
+    ):
+        stats = measure(func, repeat)
+        stats["MB/s"] = totalBytes / stats["p50"] / 1e6
+        results[name] = stats
+    return results
+
+
+def bench_replay(server, harFile, username, password):
+    """
+    End-to-end replay of the capture against the mock switch
+    """
+    plan = compile_har(harFile)
+    transport = SwitchTransport()
+    switch = SwitchConfigurationManager(server.address, transport=transport)
+    switch.login(username, password)
+
+    started = time.perf_counter()
+    summary = replay_entries(switch, plan.entries, username, password)
+    elapsed = time.perf_counter() - started
+    transport.close()
+
+    return {
+        "entries": len(plan),
+        "seconds": elapsed,
+        "requests_per_second": summary["sent"] / elapsed,
+        "summary": summary,
+        "transport": transport.stats(),
+    }
+
+
+def bench_setters(server, repeat, username, password):
+    """
+    Latency distribution of the SwitchConfigurationManager setters, round trip included
+    """
+    transport = SwitchTransport()
+    switch = SwitchConfigurationManager(server.address, transport=transport)
+    switch.login(username, password)
+
+    results = {}
+    for name, kwargs in SETTER_CASES.items():
+        setter = getattr(switch, name)
+        results[name] = measure(lambda: setter(**kwargs), repeat)
+
+    transport.close()
+    return results
+
+
+def bench_imports(repeat):
+    """
+    Startup cost of every entry point module: a fresh interpreter importing it, minus
+    an interpreter importing nothing
+    """
+
+    def start(code):
+        subprocess.run([sys.executable, "-c", code], check=True)
+
+    baseline = measure(lambda: start("pass"), repeat)
+    results = {"interpreter": baseline}
+    for module in IMPORT_CASES:
+        stats = measure(lambda: start(f"import {module}"), repeat)
+        stats["import_p50"] = stats["p50"] - baseline["p50"]
+        results[module] = stats
+    return results
+
+
+def run_benchmarks(
+    harFile, *, repeat=DEFAULT_REPEAT, latency=0.0, username="cisco", password="cisco"
+):
+    bodies = load_har_bodies(harFile)
+    results = {
+        "version": RESULTS_FORMAT_VERSION,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "har": harFile,
+        "repeat": repeat,
+        "latency": latency,
+        "benchmarks": {},
+    }
+    benchmarks = results["benchmarks"]
+
+    logger.info("benchmarking payload construction")
+    benchmarks["builder"] = bench_builder(repeat)
+    logger.info("benchmarking response parsing")
+    benchmarks["parser"] = bench_parser(bodies, max(1, repeat // 20))
+    logger.info("benchmarking imports")
+    benchmarks["imports"] = bench_imports(max(3, repeat // 40))
+
+    server = MockSwitchServer(
+        state=MockSwitchState.from_har(harFile),
+        username=username,
+        password=password,
+        latency=latency,
+    )
+    with server:
+        # per request logging would dominate the timings
+        replayLogger = logging.getLogger("marvell_11abbe00.replay")
+        level = replayLogger.level
+        replayLogger.setLevel(logging.WARNING)
+        try:
+            logger.info("benchmarking replay")
+            benchmarks["replay"] = bench_replay(server, harFile, username, password)
+        finally:
+            replayLogger.setLevel(level)
+        logger.info("benchmarking setters")
+        benchmarks["setters"] = bench_setters(server, repeat, username, password)
+
+    return results
+
+
+def compare(results, baseline):
+    """
+    @return lines comparing the p50 of every benchmark with a previous run
+    """
+    lines = []
+
+    def walk(current, previous, path):
+        for key, value in current.items():
+            if not isinstance(value, dict) or not isinstance(previous.get(key), dict):
+                continue
+            if "p50" in value and "p50" in previous[key]:
+                ratio = value["p50"] / previous[key]["p50"]
+                lines.append(
+                    f"{path}{key}: p50 {previous[key]['p50'] * 1e6:.1f}us -> "
+                    f"{value['p50'] * 1e6:.1f}us ({ratio:.2f}x)"
+                )
+            else:
+                walk(value, previous[key], f"{path}{key}/")
+
+    walk(results["benchmarks"], baseline.get("benchmarks", {}), "")
+    replay, previousReplay = (
+        results["benchmarks"].get("replay"),
+        baseline.get("benchmarks", {}).get("replay"),
+    )
+    if replay and previousReplay:
+        lines.append(
+            f"replay: {previousReplay['requests_per_second']:.1f} -> "
+            f"{replay['requests_per_second']:.1f} requests/s"
+        )
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark payload building, response parsing and replay against a mock switch"
+    )
+    parser.add_argument(
+        "--har",
+        required=True,
+        dest="harFile",
+        type=str,
+        help="HAR capture providing the response bodies, the replay and the mock state",
+    )
+    parser.add_argument(
+        "--output",
+        required=True,
+        dest="output",
+        type=str,
+        help="path of the JSON results file",
+    )
+    parser.add_argument(
+        "--repeat",
+        required=False,
+        default=DEFAULT_REPEAT,
+        dest="repeat",
+        type=int,
+        help="iterations of every micro benchmark",
+    )
+    parser.add_argument(
+        "--latency",
+        required=False,
+        default=0.0,
+        dest="latency",
+        type=float,
+        help="seconds of simulated switch latency per request",
+    )
+    parser.add_argument(
+        "--compare",
+        required=False,
+        dest="baseline",
+        type=str,
+        help="previous results file to compare against",
+    )
+
+    args = parser.parse_args()
+
+    logging.basicConfig(encoding="utf-8", level=logging.INFO)
+
+    results = run_benchmarks(args.harFile, repeat=args.repeat, latency=args.latency)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"results written to {args.output}")
+
+    if args.baseline is not None:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        for line in compare(results, baseline):
+            logger.info(line)
+
+
+if __name__ == "__main__":
+    main()
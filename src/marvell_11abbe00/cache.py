@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_CACHE_TTL = 30.0
+DEFAULT_CACHE_MAXSIZE = 128
+
+
+class SectionCache:
+    """
+    Per-host cache of parsed WCD section reads, keyed by (section, query).
+
+    Entries expire after ttl seconds and the least recently used ones are evicted once
+    maxsize is reached. Writing a section invalidates every cached read of it.
+    """
+
+    def __init__(
+        self,
+        *,
+        ttl=DEFAULT_CACHE_TTL,
+        maxsize=DEFAULT_CACHE_MAXSIZE,
+        clock=time.monotonic,
+    ):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, max_age=None):
+        max_age = self.ttl if max_age is None else max_age
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or self.clock() - item[0] > max_age:
+                if item is not None and self.clock() - item[0] > self.ttl:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (self.clock(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, section):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == section]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
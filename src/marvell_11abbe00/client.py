@@ -0,0 +1,111 @@
+import argparse
+import importlib
+import json
+import os
+import socket
+import sys
+
+# kept to the standard library: this is what automation starts hundreds of times, the
+# heavy modules are only imported when no daemon answers and the command runs here
+
+SOCKET_ENVIRONMENT_VARIABLE = "MARVELL_11ABBE00_SOCKET"
+
+# command name -> module whose main(argv) runs it without a daemon
+COMMANDS = {
+    "replay": "marvell_11abbe00.replay",
+    "snapshot": "marvell_11abbe00.snapshot",
+}
+DAEMON_COMMANDS = ("status", "stop")
+
+
+def default_socket_path():
+    """
+    $MARVELL_11ABBE00_SOCKET, else a socket private to the user in $XDG_RUNTIME_DIR or /tmp
+    """
+    path = os.environ.get(SOCKET_ENVIRONMENT_VARIABLE)
+    if path:
+        return path
+    directory = os.environ.get("XDG_RUNTIME_DIR") or "/tmp"
+    return os.path.join(directory, f"marvell_11abbe00-{os.getuid()}.sock")
+
+
+def connect(path):
+    """
+    @return a socket connected to the daemon, None when no daemon listens on path
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        client.close()
+        return None
+    return client
+
+
+def send_command(client, command, argv):
+    """
+    Send a command to the daemon and copy its output to stdout and stderr as it comes
+
+    @return the exit code of the command
+    """
+    request = {"command": command, "argv": list(argv), "cwd": os.getcwd()}
+    client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+
+    with client.makefile("r", encoding="utf-8") as lines:
+        for line in lines:
+            message = json.loads(line)
+            if "exit" in message:
+                return message["exit"]
+            stream = sys.stdout if "stdout" in message else sys.stderr
+            stream.write(message.get("stdout", message.get("stderr", "")))
+            stream.flush()
+    raise ConnectionError("daemon closed the connection before the command ended")
+
+
+def run_locally(command, argv):
+    try:
+        importlib.import_module(COMMANDS[command]).main(argv)
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run a command in the marvell_11abbe00 daemon, or here when it isn't running"
+    )
+    parser.add_argument(
+        "--socket",
+        required=False,
+        dest="socket",
+        type=str,
+        help="path of the daemon socket, $MARVELL_11ABBE00_SOCKET by default",
+    )
+    parser.add_argument(
+        "--no-fallback",
+        action="store_true",
+        dest="noFallback",
+        help="fail instead of running the command here when no daemon answers",
+    )
+    parser.add_argument(
+        "command",
+        choices=[*COMMANDS, *DAEMON_COMMANDS],
+        help="command to run, followed by its own arguments",
+    )
+    parser.add_argument("arguments", nargs=argparse.REMAINDER)
+
+    args = parser.parse_args(argv)
+
+    client = connect(args.socket or default_socket_path())
+    if client is not None:
+        with client:
+            sys.exit(send_command(client, args.command, args.arguments))
+
+    if args.command in DAEMON_COMMANDS or args.noFallback:
+        print("marvell_11abbe00 daemon is not running", file=sys.stderr)
+        sys.exit(1)
+    sys.exit(run_locally(args.command, args.arguments))
+
+
+if __name__ == "__main__":
+    main()
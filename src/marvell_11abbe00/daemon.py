@@ -0,0 +1,312 @@
+import argparse
+import json
+import logging
+import os
+import socketserver
+import sys
+import threading
+import time
+from contextlib import redirect_stderr, redirect_stdout
+
+from marvell_11abbe00 import replay, snapshot
+from marvell_11abbe00.client import connect, default_socket_path
+from marvell_11abbe00.defaults import DEFAULT_READ_TIMEOUT
+from marvell_11abbe00.replay import load_replay_plan
+from marvell_11abbe00.session import SwitchSession
+from marvell_11abbe00.switch import SwitchConfigurationManager
+from marvell_11abbe00.transport import SwitchTransport
+
+logger = logging.getLogger(__name__)
+
+# switches not used for this long are logged out of, their keep alive thread stopped
+DEFAULT_IDLE_CLOSE = 1800.0
+# replay plans kept parsed in memory
+DEFAULT_PLAN_CACHE_SIZE = 16
+
+LOG_FORMAT = logging.BASIC_FORMAT
+
+
+class _ClientStream:
+    """
+    File-like object forwarding what a command writes to the client as JSON lines
+    """
+
+    def __init__(self, connection, name):
+        self.connection = connection
+        self.name = name
+
+    def write(self, text):
+        if text:
+            self.connection.sendall(
+                json.dumps({self.name: text}).encode("utf-8") + b"\n"
+            )
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+class WarmSwitch:
+    def __init__(self, switch: SwitchConfigurationManager, session: SwitchSession):
+        self.switch = switch
+        self.session = session
+        self.lastUsed = time.monotonic()
+        self.commands = 0
+
+    def close(self):
+        self.session.stop()
+        self.switch.transport.close()
+
+
+class SwitchDaemon:
+    """
+    Runs replay and snapshot commands in a long-lived process.
+
+    Logged in switches stay open between commands, their session kept alive in the
+    background, so a command sent to a switch already used only costs its own requests.
+    Replay plans are kept parsed until their file changes. Commands run one at a time.
+
+    @param idle_close seconds after which a switch no command used is closed
+    """
+
+    def __init__(
+        self,
+        *,
+        idle_close=DEFAULT_IDLE_CLOSE,
+        plan_cache_size=DEFAULT_PLAN_CACHE_SIZE,
+    ):
+        self.idle_close = idle_close
+        self.plan_cache_size = plan_cache_size
+        self.switches = {}
+        self.plans = {}
+        self.commands = 0
+        self.started = time.monotonic()
+
+    def warm_switch(self, host, username, password, *, pool_maxsize, read_timeout):
+        """
+        @return the open manager of the host, logged in on first use
+        """
+        key = (host, username, password)
+        warm = self.switches.get(key)
+        if warm is None:
+            switch = SwitchConfigurationManager(
+                host,
+                transport=SwitchTransport(
+                    pool_maxsize=pool_maxsize, read_timeout=read_timeout
+                ),
+            )
+            session = SwitchSession(switch, username, password).start()
+            warm = self.switches[key] = WarmSwitch(switch, session)
+            logger.info(f"[{host}] opened session")
+        warm.lastUsed = time.monotonic()
+        warm.commands += 1
+        return warm.switch
+
+    def plan(self, path):
+        """
+        @return the replay plan of a HAR or plan file, parsed again only once it changed
+        """
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        plan = self.plans.pop(key, None)
+        if plan is None:
+            plan = load_replay_plan(path)
+        # most recently used last, the oldest plan is dropped first
+        self.plans[key] = plan
+        while len(self.plans) > self.plan_cache_size:
+            del self.plans[next(iter(self.plans))]
+        return plan
+
+    def close_idle(self):
+        now = time.monotonic()
+        for key, warm in list(self.switches.items()):
+            if now - warm.lastUsed >= self.idle_close:
+                logger.info(
+                    f"[{key[0]}] closing session idle for {now - warm.lastUsed:.0f}s"
+                )
+                warm.close()
+                del self.switches[key]
+
+    def close(self):
+        for warm in self.switches.values():
+            warm.close()
+        self.switches = {}
+
+    def run_replay(self, argv):
+        parser = replay.build_parser()
+        parser.prog = "marvell_11abbe00_replay"
+        args = parser.parse_args(argv)
+        switch = self.warm_switch(
+            args.host,
+            args.username,
+            args.password,
+            pool_maxsize=max(args.poolSize, args.parallel),
+            read_timeout=args.timeout,
+        )
+        replay.run(args, switch=switch, plan=self.plan(args.planFile or args.harFile))
+
+    def run_snapshot(self, argv):
+        parser = snapshot.build_parser()
+        parser.prog = "marvell_11abbe00_snapshot"
+        args = parser.parse_args(argv)
+        if args.diff:
+            snapshot.run(args)
+            return
+        if args.host is None:
+            parser.error("--host is required to take or restore a snapshot")
+        switch = self.warm_switch(
+            args.host,
+            args.username,
+            args.password,
+            pool_maxsize=snapshot.DEFAULT_SNAPSHOT_MAX_IN_FLIGHT,
+            read_timeout=DEFAULT_READ_TIMEOUT,
+        )
+        snapshot.run(args, switch=switch)
+
+    def status(self):
+        lines = [
+            f"pid {os.getpid()}, up {time.monotonic() - self.started:.0f}s, "
+            f"{self.commands} commands, {len(self.plans)} plans cached"
+        ]
+        for (host, username, _), warm in sorted(self.switches.items()):
+            lines.append(
+                f"{host} {username}: {warm.commands} commands, idle "
+                f"{time.monotonic() - warm.lastUsed:.0f}s, session {warm.session.stats()}, "
+                f"connections {warm.switch.transport.stats()}"
+                + (
+                    f", limits {warm.switch.limiter.stats()}"
+                    if warm.switch.limiter is not None
+                    else ""
+                )
+            )
+        print("\n".join(lines))
+
+    def execute(self, command, argv):
+        """
+        @return the exit code of the command
+        """
+        self.commands += 1
+        try:
+            if command == "replay":
+                self.run_replay(argv)
+            elif command == "snapshot":
+                self.run_snapshot(argv)
+            elif command == "status":
+                self.status()
+            else:
+                print(f"unknown command {command}", file=sys.stderr)
+                return 2
+        except SystemExit as e:
+            return e.code if isinstance(e.code, int) else 1
+        except Exception as e:
+            logger.exception(f"{command} failed: {e}")
+            return 1
+        return 0
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        request = json.loads(self.rfile.readline())
+        command = request.get("command")
+        if command == "stop":
+            self.reply({"exit": 0})
+            # shutdown waits for serve_forever, which is running this handler
+            threading.Thread(target=self.server.shutdown).start()
+            return
+
+        stdout = _ClientStream(self.connection, "stdout")
+        stderr = _ClientStream(self.connection, "stderr")
+        handler = logging.StreamHandler(stderr)
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        root = logging.getLogger()
+        root.addHandler(handler)
+        cwd = os.getcwd()
+        try:
+            # relative paths in the arguments are the client's
+            os.chdir(request.get("cwd") or cwd)
+            with redirect_stdout(stdout), redirect_stderr(stderr):
+                code = self.server.daemon.execute(command, request.get("argv", []))
+        finally:
+            os.chdir(cwd)
+            root.removeHandler(handler)
+        self.reply({"exit": code})
+
+    def reply(self, message):
+        self.connection.sendall(json.dumps(message).encode("utf-8") + b"\n")
+
+
+class DaemonServer(socketserver.UnixStreamServer):
+    """
+    Serves a SwitchDaemon on a unix socket only the current user can connect to.
+
+    A connection sends one JSON line {"command", "argv", "cwd"} and gets back JSON lines
+    {"stdout": text} and {"stderr": text} while the command runs, then {"exit": code}.
+    """
+
+    def __init__(self, path, daemon: SwitchDaemon):
+        self.path = path
+        self.daemon = daemon
+        if os.path.exists(path):
+            existing = connect(path)
+            if existing is not None:
+                existing.close()
+                raise Exception(f"a daemon is already listening on {path}")
+            os.unlink(path)
+        umask = os.umask(0o077)
+        try:
+            super().__init__(path, _RequestHandler)
+        finally:
+            os.umask(umask)
+
+    def service_actions(self):
+        self.daemon.close_idle()
+
+    def handle_error(self, request, client_address):
+        logger.exception("error while serving a client")
+
+    def server_close(self):
+        super().server_close()
+        self.daemon.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Keep switch sessions and replay plans warm for marvell_11abbe00_client"
+    )
+    parser.add_argument(
+        "--socket",
+        required=False,
+        dest="socket",
+        type=str,
+        help="path of the unix socket to listen on, $MARVELL_11ABBE00_SOCKET by default",
+    )
+    parser.add_argument(
+        "--idle-close",
+        required=False,
+        default=DEFAULT_IDLE_CLOSE,
+        dest="idleClose",
+        type=float,
+        help="seconds after which the session of a switch no command used is closed",
+    )
+
+    args = parser.parse_args()
+
+    logging.basicConfig(encoding="utf-8", level=logging.INFO, format=LOG_FORMAT)
+
+    path = args.socket or default_socket_path()
+    server = DaemonServer(path, SwitchDaemon(idle_close=args.idleClose))
+    logger.info(f"listening on {path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+# connection settings shared by the requests and the aiohttp transports, kept apart so
+# reading them doesn't import either HTTP stack
+DEFAULT_POOL_CONNECTIONS = 1
+DEFAULT_POOL_MAXSIZE = 4
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 30.0
@@ -1,9 +1,13 @@
 from enum import Enum
+import re
 
 from urllib.parse import urlencode
 
 
 def get_host(host):
+    # a scheme given with the host (e.g. http://127.0.0.1:8080 for a mock switch) is kept
+    if "://" in host:
+        return f"{host.rstrip('/')}/"
     return f"https://{host}/"
 
 
@@ -37,6 +41,32 @@ def get_section_query(section, query):
     return f"{section}&{querystring}"
 
 
+def expand_interfaces(interfaces):
+    """
+    Interface names of a port list, ranges included: "gi0-7,te1-4" or ["gi0-3", "te1"]
+    give gi0 ... gi7, te1 ... te4. Duplicates are dropped, the order is kept.
+    """
+    if isinstance(interfaces, str):
+        interfaces = interfaces.split(",")
+
+    names = []
+    for item in interfaces:
+        item = item.strip()
+        match = re.fullmatch(r"([a-zA-Z]+)(\d+)(?:-(?:\1)?(\d+))?", item)
+        if match is None:
+            raise ValueError(f"invalid interface {item!r}")
+        prefix, first, last = match.group(1), int(match.group(2)), match.group(3)
+        last = first if last is None else int(last)
+        if last < first:
+            raise ValueError(f"invalid interface range {item!r}")
+        for index in range(first, last + 1):
+            name = f"{prefix}{index}"
+            if name not in names:
+                names.append(name)
+
+    return names
+
+
 class SystemActions(Enum):
     DOWNLOAD_CONFIGURATION_FILE = "downloadConfigurationFile"
     UPLOAD_CONFIGURATION_FILE = "uploadConfigurationFile"
@@ -0,0 +1,396 @@
+import argparse
+import importlib
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from marvell_11abbe00.defaults import DEFAULT_READ_TIMEOUT
+from marvell_11abbe00.retry import DEFAULT_MAX_ATTEMPTS, Deadline, RetryPolicy
+from marvell_11abbe00.session import SwitchSession
+from marvell_11abbe00.switch import SwitchConfigurationManager
+from marvell_11abbe00.throttle import DEFAULT_MAX_RATE, AdaptiveLimiter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_IN_FLIGHT_HOSTS = 8
+
+
+class FleetHost:
+    def __init__(self, host, username="cisco", password="cisco"):
+        self.host = host
+        self.username = username
+        self.password = password
+
+    def __str__(self):
+        return f"<FleetHost {self.host} user={self.username}>"
+
+
+class HostResult:
+    def __init__(self, host):
+        self.host = host
+        self.result = None
+        self.error = None
+        self.started = None
+        self.finished = None
+        self.transportStats = None
+        self.limits = None
+
+    @property
+    def entryErrors(self):
+        """
+        Entries the switch answered with an error status, for plans returning the
+        summary of replay_entries
+        """
+        if isinstance(self.result, dict):
+            return self.result.get("errors", 0)
+        return 0
+
+    @property
+    def ok(self):
+        return (
+            self.finished is not None and self.error is None and self.entryErrors == 0
+        )
+
+    @property
+    def duration(self):
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+    def __str__(self):
+        if self.error is not None:
+            state = f"error={self.error}"
+        elif self.entryErrors:
+            state = f"entry_errors={self.entryErrors}"
+        else:
+            state = "ok" if self.ok else "unfinished"
+        return f"<HostResult {self.host} {state} duration={self.duration} result={self.result}>"
+
+
+def load_inventory(path):
+    """
+    Load the list of switches to configure.
+
+    Either a JSON list of {"host": ..., "username": ..., "password": ...} objects or a
+    text file with one `host [username [password]]` line per switch, `#` starts a comment.
+    """
+    with open(path, "r") as f:
+        content = f.read()
+
+    if content.lstrip().startswith("["):
+        return [FleetHost(**item) for item in json.loads(content)]
+
+    inventory = []
+    for line in content.splitlines():
+        fields = line.split("#", 1)[0].split()
+        if fields:
+            inventory.append(FleetHost(*fields))
+
+    return inventory
+
+
+def replay_plan(replayPlan, set_time=True, *, journal_dir=None, resume=False):
+    """
+    Build a plan replaying the given ReplayPlan on every switch of the fleet
+
+    @param journal_dir directory of the per host progress journals, None for no journal
+    @param resume skip the entries the journal of a host shows confirmed
+    """
+    from marvell_11abbe00.journal import ReplayJournal
+    from marvell_11abbe00.replay import replay_entries
+
+    def plan(switch, fleetHost, progress):
+        journal = None
+        if journal_dir is not None:
+            journal = ReplayJournal.open(
+                journal_dir, replayPlan, fleetHost.host, resume=resume
+            )
+        summary = None
+        try:
+            if set_time:
+                switch.set_time()
+            summary = replay_entries(
+                switch,
+                replayPlan.entries,
+                fleetHost.username,
+                fleetHost.password,
+                progress=progress,
+                journal=journal,
+            )
+        finally:
+            if journal is not None:
+                journal.close(remove=summary is not None and summary["errors"] == 0)
+        return summary
+
+    return plan
+
+
+def script_plan(script):
+    """
+    Build a plan from a `module:function` reference, the function is called with an
+    authenticated SwitchConfigurationManager
+    """
+    moduleName, _, functionName = script.partition(":")
+    function = getattr(importlib.import_module(moduleName), functionName or "configure")
+
+    def plan(switch, fleetHost, progress):
+        return function(switch)
+
+    return plan
+
+
+class FleetRunner:
+    """
+    Run the same plan on many switches at once.
+
+    Every host gets its own SwitchConfigurationManager and pooled transport; at most
+    max_in_flight hosts are configured concurrently. A plan is a callable
+    plan(switch, fleetHost, progress) whose return value ends up in HostResult.result.
+
+    @param progress optional callable(host, event, detail) called with the events
+                    "started", "progress" (detail=(index, total)), "finished" and "failed"
+    @param job_timeout seconds a host may take, its requests fail once they are spent
+    @param retry_policy RetryPolicy of every host, the manager default when None
+    @param limiter_factory optional callable(host) returning the AdaptiveLimiter pacing
+                           the requests of a host, each host gets its own
+    """
+
+    def __init__(
+        self,
+        inventory,
+        plan,
+        *,
+        max_in_flight=DEFAULT_MAX_IN_FLIGHT_HOSTS,
+        transport_factory=None,
+        progress=None,
+        job_timeout=None,
+        retry_policy=None,
+        limiter_factory=None,
+    ):
+        self.inventory = inventory
+        self.plan = plan
+        self.max_in_flight = max_in_flight
+        if transport_factory is None:
+            # imported here so importing the module doesn't load requests
+            from marvell_11abbe00.transport import SwitchTransport
+
+            transport_factory = SwitchTransport
+        self.transport_factory = transport_factory
+        self.progress = progress
+        self.job_timeout = job_timeout
+        self.retry_policy = retry_policy
+        self.limiter_factory = limiter_factory
+        self.results = {
+            fleetHost.host: HostResult(fleetHost.host) for fleetHost in inventory
+        }
+
+    def _notify(self, host, event, detail=None):
+        if self.progress is not None:
+            self.progress(host, event, detail)
+
+    def run_host(self, fleetHost):
+        result = self.results[fleetHost.host]
+        result.started = time.monotonic()
+        self._notify(fleetHost.host, "started")
+
+        transport = self.transport_factory()
+        switch = None
+        try:
+            switch = SwitchConfigurationManager(fleetHost.host, transport=transport)
+            if self.job_timeout is not None:
+                switch.deadline = Deadline(self.job_timeout)
+            if self.retry_policy is not None:
+                switch.retry_policy = self.retry_policy
+            if self.limiter_factory is not None:
+                switch.limiter = self.limiter_factory(fleetHost.host)
+            with SwitchSession(switch, fleetHost.username, fleetHost.password):
+                result.result = self.plan(
+                    switch,
+                    fleetHost,
+                    lambda index, total: self._notify(
+                        fleetHost.host, "progress", (index, total)
+                    ),
+                )
+        except Exception as e:
+            result.error = e
+            logger.error(f"[{fleetHost.host}] failed: {e}")
+        finally:
+            result.finished = time.monotonic()
+            result.transportStats = transport.stats()
+            if switch is not None and switch.limiter is not None:
+                result.limits = switch.limiter.stats()
+            transport.close()
+
+        self._notify(fleetHost.host, "finished" if result.ok else "failed", result)
+        return result
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            futures = [
+                executor.submit(self.run_host, fleetHost)
+                for fleetHost in self.inventory
+            ]
+            for future in as_completed(futures):
+                future.result()
+
+        return self.results
+
+
+def log_progress(host, event, detail):
+    if event == "progress":
+        index, total = detail
+        logger.debug(f"[{host}] {index} / {total}")
+    else:
+        logger.info(f"[{host}] {event}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Apply the same configuration to a fleet of switches"
+    )
+    parser.add_argument(
+        "--inventory",
+        required=True,
+        dest="inventory",
+        type=str,
+        help="path to the inventory of hosts and credentials",
+    )
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument(
+        "--plan",
+        dest="planFile",
+        type=str,
+        help="path to the replay plan (or HAR file) to replay on every host",
+    )
+    group.add_argument(
+        "--script",
+        dest="script",
+        type=str,
+        help="module:function called with an authenticated SwitchConfigurationManager",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        required=False,
+        default=DEFAULT_MAX_IN_FLIGHT_HOSTS,
+        dest="maxInFlight",
+        type=int,
+        help="maximum number of hosts configured at the same time",
+    )
+    parser.add_argument(
+        "--timeout",
+        required=False,
+        default=DEFAULT_READ_TIMEOUT,
+        dest="timeout",
+        type=float,
+        help="read timeout in seconds for each request",
+    )
+    parser.add_argument(
+        "--job-timeout",
+        required=False,
+        dest="jobTimeout",
+        type=float,
+        help="seconds after which a host still being configured is given up",
+    )
+    parser.add_argument(
+        "--max-attempts",
+        required=False,
+        default=DEFAULT_MAX_ATTEMPTS,
+        dest="maxAttempts",
+        type=int,
+        help="requests sent at most when the switch can't be reached",
+    )
+
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        dest="adaptive",
+        help="pace the requests of every host at the rate it handles, backing off when "
+        "it slows down or fails",
+    )
+    parser.add_argument(
+        "--max-rate",
+        required=False,
+        default=DEFAULT_MAX_RATE,
+        dest="maxRate",
+        type=float,
+        help="requests per second never exceeded on a host with --adaptive",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        dest="resume",
+        help="skip on every host the entries an interrupted run of the plan got OK for",
+    )
+    parser.add_argument(
+        "--journal-dir",
+        required=False,
+        dest="journalDir",
+        type=str,
+        help="directory of the progress journals, ~/.cache/marvell_11abbe00/journal by default",
+    )
+    parser.add_argument(
+        "--no-journal",
+        action="store_true",
+        dest="noJournal",
+        help="don't record the progress of the replays",
+    )
+
+    args = parser.parse_args()
+    if args.resume and args.noJournal:
+        parser.error("--resume needs the journal, drop --no-journal")
+
+    logging.basicConfig(encoding="utf-8", level=logging.INFO)
+
+    inventory = load_inventory(args.inventory)
+    if args.planFile is not None:
+        from marvell_11abbe00.journal import default_journal_dir
+        from marvell_11abbe00.replay import load_replay_plan
+
+        plan = replay_plan(
+            load_replay_plan(args.planFile),
+            journal_dir=(
+                None if args.noJournal else args.journalDir or default_journal_dir()
+            ),
+            resume=args.resume,
+        )
+    else:
+        plan = script_plan(args.script)
+
+    from marvell_11abbe00.transport import SwitchTransport
+
+    runner = FleetRunner(
+        inventory,
+        plan,
+        max_in_flight=args.maxInFlight,
+        transport_factory=lambda: SwitchTransport(read_timeout=args.timeout),
+        progress=log_progress,
+        job_timeout=args.jobTimeout,
+        retry_policy=RetryPolicy(max_attempts=args.maxAttempts),
+        limiter_factory=(
+            (
+                lambda host: AdaptiveLimiter(
+                    max_limit=1, max_rate=args.maxRate, label=f"[{host}]"
+                )
+            )
+            if args.adaptive
+            else None
+        ),
+    )
+    results = runner.run()
+
+    for result in results.values():
+        logger.info(str(result))
+
+    failed = [result for result in results.values() if not result.ok]
+    errors = [result for result in failed if result.error is not None]
+    logger.info(
+        f"{len(results) - len(failed)} / {len(results)} hosts configured, "
+        f"{len(errors)} failed, {len(failed) - len(errors)} with entry errors"
+    )
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
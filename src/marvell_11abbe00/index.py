@@ -0,0 +1,423 @@
+import argparse
+import gzip
+import json
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from marvell_11abbe00.fleet import DEFAULT_MAX_IN_FLIGHT_HOSTS, load_inventory
+from marvell_11abbe00.optimize import row_key
+from marvell_11abbe00.session import SwitchSession
+from marvell_11abbe00.snapshot import SNAPSHOT_SECTIONS, Snapshot, fetch_sections
+from marvell_11abbe00.switch import SwitchConfigurationManager
+from marvell_11abbe00.telemetry import TELEMETRY_SECTIONS
+from marvell_11abbe00.vlans import VLANSet, is_vlan_set_field
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 1
+
+# counters change on every read, indexing them is pointless
+INDEX_SECTIONS = tuple(
+    section for section in SNAPSHOT_SECTIONS if section not in TELEMETRY_SECTIONS
+)
+
+# a refresh reads again the sections of a host indexed longer ago than this
+DEFAULT_INDEX_MAX_AGE = 3600.0
+
+
+class IndexHit:
+    """
+    A row of a switch section matching a query
+    """
+
+    __slots__ = ("host", "section", "key", "fields")
+
+    def __init__(self, host, section, key, fields):
+        self.host = host
+        self.section = section
+        self.key = key
+        self.fields = fields
+
+    @property
+    def interfaceName(self):
+        return dict(self.key).get("interfaceName")
+
+    def __str__(self):
+        key = " ".join(f"{name}={value}" for name, value in self.key)
+        return f"<IndexHit {self.host} {self.section} {key or '-'}>"
+
+
+def parse_query(text):
+    """
+    @param text `field=value` or `section.field=value`
+    @return (section or None, field, value)
+    """
+    target, separator, value = text.partition("=")
+    if not separator or not target:
+        raise ValueError(f"Invalid query {text!r}, expected [section.]field=value")
+    section, _, field = target.rpartition(".")
+    return section or None, field, value
+
+
+class ConfigIndex:
+    """
+    Inverted index of the configuration of many switches, from (section, field, value)
+    to the rows holding it, answering queries without contacting any switch.
+
+    Sections are indexed per host and replaced as a whole whenever a new read of them
+    is ingested, so the index follows the switches incrementally. VLAN list fields are
+    kept as VLANSets instead of strings: a query for one VLAN matches every row whose
+    list contains it.
+
+    index = ConfigIndex()
+    index.ingest_snapshot(take_snapshot(switch))
+    index.find("trunkMemberVLANs", "2363")
+    index.lookup("PoEPSEInterfaceList", "powerPriority", "1")
+
+    Not thread safe, ingest from a single thread.
+    """
+
+    def __init__(self):
+        # host -> section -> {row key: fields}
+        self.rows = {}
+        # host -> section -> wall clock time of the read
+        self.fetched = {}
+        # (section, field, value) -> {(host, row key)}
+        self.postings = defaultdict(set)
+        # (section, field) -> {(host, row key): VLANSet}
+        self.vlanSets = defaultdict(dict)
+        # field -> sections having it, for queries without a section
+        self.fieldSections = defaultdict(set)
+
+    def ingest(self, host, section, rows, fetched=None):
+        """
+        Replace the indexed rows of one section of a host
+
+        @param rows {row key: fields}, row keys being tuples of (key field, value) pairs
+        """
+        self.remove(host, section)
+        rows = dict(rows)
+        self.rows.setdefault(host, {})[section] = rows
+        self.fetched.setdefault(host, {})[section] = (
+            time.time() if fetched is None else fetched
+        )
+
+        for key, fields in rows.items():
+            row = (host, key)
+            for field, value in fields.items():
+                self.fieldSections[field].add(section)
+                if is_vlan_set_field(field):
+                    try:
+                        self.vlanSets[(section, field)][row] = VLANSet.parse(value)
+                        continue
+                    except ValueError:
+                        pass
+                self.postings[(section, field, value)].add(row)
+
+    def ingest_records(self, host, records, fetched=None):
+        """
+        Index the SectionRecords of a read, every section read replaces its rows
+        """
+        sections = defaultdict(dict)
+        for record in records:
+            sections[record.section].setdefault(record.key, {}).update(record.fields)
+        for section, rows in sections.items():
+            self.ingest(host, section, rows, fetched)
+
+    def ingest_snapshot(self, snapshot: Snapshot):
+        for name, section in snapshot.sections.items():
+            rows = {}
+            for path, fields in section.records:
+                rows.setdefault(row_key(path), {}).update(fields)
+            self.ingest(snapshot.host, name, rows, section.fetched)
+
+    def remove(self, host, section=None):
+        """
+        Drop the rows of one section of a host, or of the whole host
+        """
+        sections = self.rows.get(host, {})
+        for name in [section] if section is not None else list(sections):
+            rows = sections.pop(name, None)
+            self.fetched.get(host, {}).pop(name, None)
+            if rows is None:
+                continue
+            for key, fields in rows.items():
+                row = (host, key)
+                for field, value in fields.items():
+                    vlanSets = self.vlanSets.get((name, field))
+                    if vlanSets is not None and vlanSets.pop(row, None) is not None:
+                        continue
+                    postings = self.postings.get((name, field, value))
+                    if postings is not None:
+                        postings.discard(row)
+                        if not postings:
+                            del self.postings[(name, field, value)]
+        if not sections:
+            self.rows.pop(host, None)
+            self.fetched.pop(host, None)
+
+    def _hit(self, host, section, key):
+        return IndexHit(host, section, key, self.rows[host][section][key])
+
+    def lookup(self, section, field, value):
+        """
+        @param value exact value, or for VLAN list fields VLANs in the range syntax, all
+                     of which the rows must contain
+        @return the IndexHits sorted by host and row key
+        """
+        value = str(value)
+        rows = None
+        if is_vlan_set_field(field):
+            try:
+                wanted = VLANSet.parse(value)
+            except ValueError:
+                wanted = None
+            if wanted is not None:
+                rows = [
+                    row
+                    for row, vlans in self.vlanSets.get((section, field), {}).items()
+                    if wanted <= vlans
+                ]
+        if rows is None:
+            rows = self.postings.get((section, field, value), ())
+        return [self._hit(host, section, key) for host, key in sorted(rows)]
+
+    def find(self, field, value, section=None):
+        """
+        lookup() over every section having the field, or over the given one
+        """
+        sections = [section] if section else sorted(self.fieldSections.get(field, ()))
+        return [hit for name in sections for hit in self.lookup(name, field, value)]
+
+    def query(self, text):
+        """
+        @param text `field=value` or `section.field=value`
+        """
+        section, field, value = parse_query(text)
+        return self.find(field, value, section)
+
+    def stale_sections(self, host, sections, max_age=None):
+        """
+        @return the sections of a host never indexed, or indexed more than max_age ago
+        """
+        fetched = self.fetched.get(host, {})
+        now = time.time()
+        return [
+            section
+            for section in sections
+            if section not in fetched
+            or (max_age is not None and now - fetched[section] > max_age)
+        ]
+
+    def stats(self):
+        return {
+            "hosts": len(self.rows),
+            "rows": sum(
+                len(rows)
+                for sections in self.rows.values()
+                for rows in sections.values()
+            ),
+            "terms": len(self.postings),
+            "vlan_lists": sum(len(rows) for rows in self.vlanSets.values()),
+        }
+
+    def to_dict(self):
+        return {
+            "version": INDEX_FORMAT_VERSION,
+            "hosts": {
+                host: {
+                    section: {
+                        "fetched": self.fetched[host][section],
+                        "rows": [
+                            [[list(pair) for pair in key], fields]
+                            for key, fields in sorted(rows.items())
+                        ],
+                    }
+                    for section, rows in sorted(sections.items())
+                }
+                for host, sections in sorted(self.rows.items())
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data) -> "ConfigIndex":
+        if data.get("version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported index version {data.get('version')}")
+
+        index = cls()
+        for host, sections in data["hosts"].items():
+            for section, content in sections.items():
+                index.ingest(
+                    host,
+                    section,
+                    {
+                        tuple(tuple(pair) for pair in key): fields
+                        for key, fields in content["rows"]
+                    },
+                    content["fetched"],
+                )
+        return index
+
+
+def save_index(index: ConfigIndex, path):
+    with gzip.open(path, "wt", encoding="utf-8", compresslevel=6) as f:
+        json.dump(index.to_dict(), f, separators=(",", ":"), sort_keys=True)
+
+
+def load_index(path) -> ConfigIndex:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return ConfigIndex.from_dict(json.load(f))
+
+
+def refresh_index(
+    index: ConfigIndex,
+    inventory,
+    sections=INDEX_SECTIONS,
+    *,
+    max_age=DEFAULT_INDEX_MAX_AGE,
+    max_in_flight=DEFAULT_MAX_IN_FLIGHT_HOSTS,
+    transport_factory=None,
+):
+    """
+    Read the stale sections of every switch of the inventory, max_in_flight switches at
+    a time, and ingest them as each switch answers. Sections indexed less than max_age
+    seconds ago aren't read again.
+
+    @return {host: error} for the switches that couldn't be read
+    """
+    if transport_factory is None:
+        from marvell_11abbe00.transport import SwitchTransport
+
+        transport_factory = SwitchTransport
+
+    def read(fleetHost, stale):
+        switch = SwitchConfigurationManager(
+            fleetHost.host, transport=transport_factory()
+        )
+        try:
+            with SwitchSession(
+                switch,
+                fleetHost.username,
+                fleetHost.password,
+                keep_alive_interval=None,
+            ):
+                return fetch_sections(switch, stale)
+        finally:
+            switch.transport.close()
+
+    errors = {}
+    jobs = [
+        (fleetHost, index.stale_sections(fleetHost.host, sections, max_age))
+        for fleetHost in inventory
+    ]
+    jobs = [(fleetHost, stale) for fleetHost, stale in jobs if stale]
+    if not jobs:
+        return errors
+
+    with ThreadPoolExecutor(max_workers=min(max_in_flight, len(jobs))) as executor:
+        futures = {
+            executor.submit(read, fleetHost, stale): fleetHost.host
+            for fleetHost, stale in jobs
+        }
+        for future in as_completed(futures):
+            host = futures[future]
+            try:
+                fetched = future.result()
+            except Exception as e:
+                logger.warning(f"[{host}] index refresh failed: {e}")
+                errors[host] = e
+                continue
+            index.ingest_snapshot(Snapshot(host, fetched))
+            logger.info(f"[{host}] indexed {len(fetched)} sections")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Index the configuration of a fleet of switches and query it offline"
+    )
+    parser.add_argument(
+        "--index",
+        required=True,
+        dest="index",
+        type=str,
+        help="path of the index file, created when missing",
+    )
+    parser.add_argument(
+        "--inventory",
+        required=False,
+        dest="inventory",
+        type=str,
+        help="refresh the index from the switches of this inventory",
+    )
+    parser.add_argument(
+        "--section",
+        required=False,
+        action="append",
+        dest="sections",
+        type=str,
+        help="section to index, can be repeated, every configuration section by default",
+    )
+    parser.add_argument(
+        "--max-age",
+        required=False,
+        default=DEFAULT_INDEX_MAX_AGE,
+        dest="maxAge",
+        type=float,
+        help="read again the sections indexed more than this many seconds ago",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        required=False,
+        default=DEFAULT_MAX_IN_FLIGHT_HOSTS,
+        dest="maxInFlight",
+        type=int,
+        help="maximum number of switches read at the same time",
+    )
+    parser.add_argument(
+        "--query",
+        required=False,
+        action="append",
+        dest="queries",
+        type=str,
+        help="[section.]field=value to look up, can be repeated",
+    )
+
+    args = parser.parse_args()
+
+    logging.basicConfig(encoding="utf-8", level=logging.INFO)
+
+    try:
+        index = load_index(args.index)
+    except FileNotFoundError:
+        index = ConfigIndex()
+
+    if args.inventory:
+        refresh_index(
+            index,
+            load_inventory(args.inventory),
+            args.sections or INDEX_SECTIONS,
+            max_age=args.maxAge,
+            max_in_flight=args.maxInFlight,
+        )
+        save_index(index, args.index)
+        logger.info(f"index {index.stats()} written to {args.index}")
+
+    for text in args.queries or []:
+        started = time.perf_counter()
+        try:
+            hits = index.query(text)
+        except ValueError as e:
+            parser.error(str(e))
+        for hit in hits:
+            key = " ".join(f"{name}={value}" for name, value in hit.key) or "-"
+            print(f"{hit.host} {hit.section} {key}")
+        logger.info(
+            f"{text}: {len(hits)} rows in {(time.perf_counter() - started) * 1000:.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+import logging
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from urllib.parse import parse_qsl
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# phases of a request, in seconds; connect includes name resolution
+TIMINGS = ("connect", "tls", "server_wait", "download", "parse")
+
+# (metric, AdaptiveLimiter.stats() field, help) exported per host
+LIMIT_GAUGES = (
+    ("concurrency_limit", "limit", "Requests the adaptive limiter lets in flight."),
+    ("rate_limit", "rate", "Requests per second the adaptive limiter lets start."),
+    ("in_flight", "in_flight", "Requests in flight when last observed."),
+)
+
+
+def percentile(samples, fraction):
+    """
+    Nearest rank percentile of an already sorted list
+    """
+    if not samples:
+        return None
+    index = min(len(samples) - 1, max(0, round(fraction * len(samples)) - 1))
+    return samples[index]
+
+
+def summarize(samples):
+    """
+    @return distribution of a list of durations in seconds
+    """
+    samples = sorted(samples)
+    return {
+        "n": len(samples),
+        "min": samples[0],
+        "mean": statistics.fmean(samples),
+        "p50": percentile(samples, 0.50),
+        "p95": percentile(samples, 0.95),
+        "p99": percentile(samples, 0.99),
+        "max": samples[-1],
+    }
+
+
+def interface_of(query):
+    """
+    interfaceName addressed by a WCD query such as `PoEPSEInterfaceList&interfaceName=gi0`
+    """
+    if not query or "&" not in query:
+        return None
+    return dict(parse_qsl(query.partition("&")[2])).get("interfaceName")
+
+
+class RequestEvent:
+    """
+    Everything measured about one HTTP request sent to a switch
+    """
+
+    def __init__(self, *, host, method, kind, sections=(), interfaces=()):
+        self.host = host
+        self.method = method
+        self.kind = kind
+        self.sections = list(sections)
+        self.interfaces = [name for name in interfaces if name is not None]
+        self.payloadBytes = 0
+        self.responseBytes = 0
+        self.timings = {}
+        self.statusCode = None
+        self.retries = 0
+        self.error = None
+        # AdaptiveLimiter.stats() of the host once the request is done, when it has one
+        self.limits = None
+        self.started = time.perf_counter()
+        self.duration = None
+
+    @property
+    def section(self):
+        """
+        Label used for aggregation, several sections of a batch are joined with +
+        """
+        return "+".join(self.sections) if self.sections else self.kind
+
+    def record_response(self, response, body=True):
+        """
+        @param body False for streamed responses whose body hasn't been read yet
+        """
+        self.timings.update(getattr(response, "timings", None) or {})
+        if body:
+            self.responseBytes = len(response.content)
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+        return self
+
+    def __str__(self):
+        timings = " ".join(
+            f"{name}={self.timings[name] * 1000:.1f}ms"
+            for name in TIMINGS
+            if self.timings.get(name) is not None
+        )
+        limits = (
+            f" limit={self.limits['limit']} rate={self.limits['rate']}/s"
+            if self.limits is not None
+            else ""
+        )
+        return (
+            f"<RequestEvent {self.method} {self.section} "
+            f"interfaces={','.join(self.interfaces) or '-'} "
+            f"status={self.statusCode} retries={self.retries} "
+            f"out={self.payloadBytes}B in={self.responseBytes}B "
+            f"total={(self.duration or 0) * 1000:.1f}ms {timings}{limits}>"
+        )
+
+
+@contextmanager
+def observed(observable, event):
+    """
+    Notify the observers of an event once the block is done, with the exception that
+    interrupted it if any
+    """
+    try:
+        yield event
+    except Exception as e:
+        event.error = e
+        raise
+    finally:
+        if observable.observers:
+            observable.notify(event.finish())
+
+
+class Observable:
+    """
+    Mixin dispatching RequestEvents to observers, callables taking the event
+    """
+
+    observers = ()
+
+    def add_observer(self, observer):
+        self.observers = [*self.observers, observer]
+        return observer
+
+    def remove_observer(self, observer):
+        self.observers = [
+            current for current in self.observers if current is not observer
+        ]
+
+    def notify(self, event):
+        for observer in self.observers:
+            try:
+                observer(event)
+            except Exception as e:
+                logger.warning(f"observer {observer} failed: {e}")
+
+
+def log_event(event):
+    logger.info(str(event))
+
+
+class LatencyAggregator:
+    """
+    Observer collecting request durations and phase timings per section, with
+    p50/p95/p99 reports and an OpenMetrics text export. The latest limits of the hosts
+    paced by an AdaptiveLimiter are exported as gauges.
+
+    aggregator = switch.add_observer(LatencyAggregator())
+    ...
+    print(aggregator.report())
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations = defaultdict(list)
+        self.timings = defaultdict(lambda: defaultdict(list))
+        self.statusCodes = defaultdict(Counter)
+        self.payloadBytes = Counter()
+        self.responseBytes = Counter()
+        self.retries = Counter()
+        # host -> latest AdaptiveLimiter.stats()
+        self.limits = {}
+
+    def __call__(self, event: RequestEvent):
+        key = (event.method, event.section)
+        status = event.statusCode.name if event.statusCode is not None else "NONE"
+        with self._lock:
+            self.durations[key].append(event.duration)
+            for name, value in event.timings.items():
+                if value is not None:
+                    self.timings[key][name].append(value)
+            self.statusCodes[key][status if event.error is None else "ERROR"] += 1
+            self.payloadBytes[key] += event.payloadBytes
+            self.responseBytes[key] += event.responseBytes
+            self.retries[key] += event.retries
+            if event.limits is not None:
+                self.limits[event.host] = event.limits
+
+    def summary(self):
+        with self._lock:
+            return {
+                key: {
+                    "total": summarize(durations),
+                    **{
+                        name: summarize(samples)
+                        for name, samples in self.timings[key].items()
+                    },
+                }
+                for key, durations in self.durations.items()
+            }
+
+    def report(self):
+        """
+        One line per method and section, slowest p95 first
+        """
+        rows = sorted(
+            self.summary().items(),
+            key=lambda item: item[1]["total"]["p95"],
+            reverse=True,
+        )
+        lines = [
+            f"{'method':<6} {'section':<40} {'n':>5} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'p99 ms':>8} {'wait p50':>8} {'retries':>7}"
+        ]
+        for (method, section), stats in rows:
+            total = stats["total"]
+            wait = stats.get("server_wait", {}).get("p50")
+            lines.append(
+                f"{method:<6} {section[:40]:<40} {total['n']:>5} "
+                f"{total['p50'] * 1000:>8.1f} {total['p95'] * 1000:>8.1f} "
+                f"{total['p99'] * 1000:>8.1f} "
+                f"{'-' if wait is None else f'{wait * 1000:.1f}':>8} "
+                f"{self.retries[(method, section)]:>7}"
+            )
+        for host, limits in sorted(self.limits.items()):
+            lines.append(
+                f"{host}: {limits['limit']} in flight, {limits['rate']} requests/s, "
+                f"{limits['decreases']} cuts after {limits['overloads']} overloads"
+            )
+        return "\n".join(lines)
+
+    def openmetrics(self, prefix="marvell_wcd"):
+        """
+        OpenMetrics text exposition of the collected requests
+        """
+        lines = [
+            f"# TYPE {prefix}_request_duration_seconds summary",
+            f"# UNIT {prefix}_request_duration_seconds seconds",
+            f"# HELP {prefix}_request_duration_seconds Duration of WCD requests.",
+        ]
+        with self._lock:
+            keys = sorted(self.durations)
+            for key in keys:
+                labels = _labels(*key)
+                samples = sorted(self.durations[key])
+                for quantile in QUANTILES:
+                    lines.append(
+                        f'{prefix}_request_duration_seconds{{{labels},quantile="{quantile}"}} '
+                        f"{percentile(samples, quantile)}"
+                    )
+                lines.append(
+                    f"{prefix}_request_duration_seconds_sum{{{labels}}} {sum(samples)}"
+                )
+                lines.append(
+                    f"{prefix}_request_duration_seconds_count{{{labels}}} {len(samples)}"
+                )
+
+            lines.append(f"# TYPE {prefix}_phase_seconds summary")
+            lines.append(f"# UNIT {prefix}_phase_seconds seconds")
+            lines.append(f"# HELP {prefix}_phase_seconds Time spent per request phase.")
+            for key in keys:
+                for name, samples in sorted(self.timings[key].items()):
+                    labels = f'{_labels(*key)},phase="{name}"'
+                    lines.append(
+                        f"{prefix}_phase_seconds_sum{{{labels}}} {sum(samples)}"
+                    )
+                    lines.append(
+                        f"{prefix}_phase_seconds_count{{{labels}}} {len(samples)}"
+                    )
+
+            for name, counter in (
+                ("payload", self.payloadBytes),
+                ("response", self.responseBytes),
+            ):
+                lines.append(f"# TYPE {prefix}_{name}_bytes counter")
+                lines.append(f"# UNIT {prefix}_{name}_bytes bytes")
+                for key in keys:
+                    lines.append(
+                        f"{prefix}_{name}_bytes_total{{{_labels(*key)}}} {counter[key]}"
+                    )
+
+            lines.append(f"# TYPE {prefix}_requests counter")
+            for key in keys:
+                for status, count in sorted(self.statusCodes[key].items()):
+                    lines.append(
+                        f'{prefix}_requests_total{{{_labels(*key)},status="{status}"}} {count}'
+                    )
+
+            lines.append(f"# TYPE {prefix}_retries counter")
+            for key in keys:
+                lines.append(
+                    f"{prefix}_retries_total{{{_labels(*key)}}} {self.retries[key]}"
+                )
+
+            if self.limits:
+                for name, field, description in LIMIT_GAUGES:
+                    lines.append(f"# TYPE {prefix}_{name} gauge")
+                    lines.append(f"# HELP {prefix}_{name} {description}")
+                    for host, limits in sorted(self.limits.items()):
+                        lines.append(
+                            f'{prefix}_{name}{{host="{_escape(host)}"}} {limits[field]}'
+                        )
+
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _labels(method, section):
+    return f'method="{method}",section="{_escape(section)}"'
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from marvell_11abbe00.response import StatusCode
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_FORMAT_VERSION = 1
+
+# the journal is written to disk every that many entries or seconds, whichever first;
+# entries recorded after the last sync are sent again by a resume
+DEFAULT_JOURNAL_FSYNC_EVERY = 64
+DEFAULT_JOURNAL_FSYNC_INTERVAL = 1.0
+
+
+def default_journal_dir():
+    cache = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache, "marvell_11abbe00", "journal")
+
+
+def journal_key(planDigest, host):
+    """
+    Name of the journal of a plan replayed on a host
+    """
+    return hashlib.sha256(f"{planDigest}\n{host}".encode("utf-8")).hexdigest()[:32]
+
+
+class ReplayJournal:
+    """
+    Append-only record of the plan entries a host answered, one JSON line per entry
+    after a header naming the plan and the host.
+
+    A replay started with resume=True skips the entries the journal shows confirmed
+    with StatusCode.OK. Lines are buffered and synced to disk in batches, a crash loses
+    at most the last batch, whose entries are then sent again. A line torn by a crash
+    is ignored.
+
+    with ReplayJournal.open(default_journal_dir(), plan, host, resume=True) as journal:
+        replay_entries(switch, plan.entries, "cisco", "cisco", journal=journal)
+    """
+
+    def __init__(
+        self,
+        path,
+        planDigest,
+        host,
+        total,
+        *,
+        resume=False,
+        fsync_every=DEFAULT_JOURNAL_FSYNC_EVERY,
+        fsync_interval=DEFAULT_JOURNAL_FSYNC_INTERVAL,
+        clock=time.monotonic,
+    ):
+        self.path = path
+        self.planDigest = planDigest
+        self.host = host
+        self.total = total
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.clock = clock
+        self.confirmed = set()
+        self.recorded = 0
+        self._pending = 0
+        self._lastSync = clock()
+        self._lock = threading.Lock()
+
+        journal = self._read_journal() if resume and os.path.exists(path) else None
+        if journal is not None:
+            self.confirmed, end = journal
+            self._file = open(path, "a", encoding="utf-8")
+            # drop a line torn by a crash, the next record would be glued to it
+            self._file.truncate(end)
+            logger.info(
+                f"[{host}] resuming, {len(self.confirmed)} of {total} entries already "
+                "confirmed"
+            )
+        else:
+            self._file = open(path, "w", encoding="utf-8")
+            self._write(
+                {
+                    "version": JOURNAL_FORMAT_VERSION,
+                    "plan": planDigest,
+                    "host": host,
+                    "entries": total,
+                    "started": time.time(),
+                }
+            )
+            self.sync()
+
+    @classmethod
+    def open(cls, directory, plan, host, **kwargs) -> "ReplayJournal":
+        """
+        @param plan the ReplayPlan replayed, its digest names the journal with the host
+        """
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{journal_key(plan.digest, host)}.journal")
+        return cls(path, plan.digest, host, len(plan), **kwargs)
+
+    def _read_journal(self):
+        """
+        @return (indexes confirmed OK, size of the complete lines), None when the
+                journal can't be resumed and has to be started over
+        """
+        confirmed = set()
+        with open(self.path, "rb") as f:
+            line = f.readline()
+            try:
+                header = json.loads(line) if line.endswith(b"\n") else None
+            except ValueError:
+                header = None
+            if not isinstance(header, dict):
+                logger.warning(f"{self.path}: unreadable header, starting over")
+                return None
+            if (
+                header.get("version") != JOURNAL_FORMAT_VERSION
+                or header.get("plan") != self.planDigest
+                or header.get("host") != self.host
+            ):
+                logger.warning(f"{self.path}: written for another plan, starting over")
+                return None
+            end = f.tell()
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                end += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("status") == StatusCode.OK.name:
+                    confirmed.add(record["index"])
+        return confirmed, end
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def is_confirmed(self, index):
+        return index in self.confirmed
+
+    def record(self, index, statusCode):
+        """
+        @param statusCode StatusCode of the answer, None when it had none
+        """
+        with self._lock:
+            self._write(
+                {
+                    "index": index,
+                    "status": None if statusCode is None else statusCode.name,
+                }
+            )
+            if statusCode == StatusCode.OK:
+                self.confirmed.add(index)
+            self.recorded += 1
+            self._pending += 1
+            if (
+                self._pending >= self.fsync_every
+                or self.clock() - self._lastSync >= self.fsync_interval
+            ):
+                self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._lastSync = self.clock()
+
+    def sync(self):
+        with self._lock:
+            self._sync()
+
+    def close(self, remove=False):
+        """
+        @param remove delete the journal, once the whole plan went through
+        """
+        with self._lock:
+            if self._file.closed:
+                return
+            self._sync()
+            self._file.close()
+        if remove:
+            os.unlink(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,329 @@
+import argparse
+import logging
+import re
+import sys
+import time
+
+from marvell_11abbe00.endpoints import expand_interfaces, get_section_query
+from marvell_11abbe00.session import SwitchSession
+from marvell_11abbe00.switch import SwitchConfigurationManager
+from marvell_11abbe00.vlans import as_vlan_set
+
+logger = logging.getLogger(__name__)
+
+# address tables of the forwarding database, they aren't part of the configuration
+# sections of endpoints.Sections so snapshots and the fleet index leave them alone
+MAC_TABLE_SECTIONS = {
+    "dynamic": "DynamicAddressTable",
+    "secure": "SecureAddressTable",
+}
+
+DEFAULT_MAC_POLL_INTERVAL = 60.0
+
+ADDED = "added"
+REMOVED = "removed"
+MOVED = "moved"
+
+_MAC_DIGITS = re.compile(r"[0-9a-f]{12}")
+
+
+def normalize_mac(text):
+    """
+    @param text MAC address as aa:bb:cc:dd:ee:ff, aa-bb-cc-dd-ee-ff or aabb.ccdd.eeff
+    @return the lowercase colon separated form
+    """
+    digits = re.sub(r"[:.\-\s]", "", text or "").lower()
+    if not _MAC_DIGITS.fullmatch(digits):
+        raise ValueError(f"Invalid MAC address {text!r}")
+    pairs = []
+    for first in range(0, 12, 2):
+        last = first + 2
+        pairs.append(digits[first:last])
+    return ":".join(pairs)
+
+
+class MACEntry:
+    """
+    A row of a MAC address table, identified by its VLAN and MAC address
+    """
+
+    __slots__ = ("table", "vlan", "mac", "interfaceName", "fields")
+
+    def __init__(self, table, vlan, mac, interfaceName, fields):
+        self.table = table
+        self.vlan = vlan
+        self.mac = mac
+        self.interfaceName = interfaceName
+        self.fields = fields
+
+    @classmethod
+    def from_record(cls, table, record) -> "MACEntry":
+        return cls(
+            table,
+            record.get_int("VLANID"),
+            normalize_mac(record.get("MACAddress")),
+            record.get("interfaceName"),
+            record.fields,
+        )
+
+    @property
+    def key(self):
+        return (self.vlan, self.mac)
+
+    def __str__(self):
+        return (
+            f"<MACEntry {self.table} vlan={self.vlan} {self.mac} {self.interfaceName}>"
+        )
+
+
+class MACChange:
+    """
+    @param kind ADDED, REMOVED, or MOVED when the address showed up on another port
+    @param previous the entry before a move
+    """
+
+    __slots__ = ("kind", "entry", "previous")
+
+    def __init__(self, kind, entry: MACEntry, previous: MACEntry = None):
+        self.kind = kind
+        self.entry = entry
+        self.previous = previous
+
+    def __str__(self):
+        entry = self.entry
+        line = f"{self.kind} {entry.table} vlan={entry.vlan} {entry.mac} {entry.interfaceName}"
+        if self.previous is not None:
+            line += f" (was {self.previous.interfaceName})"
+        return line
+
+
+def mac_table_pages(section, interfaces=None, vlans=None):
+    """
+    WCD queries splitting a table into pages, one per interface, VLAN or both
+
+    @return [(page, query)] where page is the (interfaceName, VLANID) filter, None for
+            the parts not filtered
+    """
+    names = [None] if interfaces is None else expand_interfaces(interfaces)
+    vlanIds = [None] if vlans is None else list(as_vlan_set(vlans))
+    pages = []
+    for name in names:
+        for vlan in vlanIds:
+            filters = {}
+            if name is not None:
+                filters["interfaceName"] = name
+            if vlan is not None:
+                filters["VLANID"] = vlan
+            query = get_section_query(section, filters) if filters else section
+            pages.append(((name, vlan), query))
+    return pages
+
+
+def iter_mac_table(
+    switch: SwitchConfigurationManager, table="dynamic", *, interfaces=None, vlans=None
+):
+    """
+    Yield the entries of a MAC address table page after page, each page streamed and
+    parsed while it downloads: only the entry being parsed is held in memory, however
+    big the table.
+
+    for entry in iter_mac_table(switch, "secure", interfaces="gi0-7"):
+        print(entry.mac, entry.interfaceName)
+
+    @param table "dynamic" or "secure"
+    @param interfaces port list with ranges, one page per interface, the whole table in
+                      a single page when None
+    @param vlans VLANSet, range string or VLAN IDs, one page per VLAN
+    """
+    section = MAC_TABLE_SECTIONS[table]
+    for _, query in mac_table_pages(section, interfaces, vlans):
+        for record in switch.stream_section_records([query], section):
+            if record.get("MACAddress"):
+                yield MACEntry.from_record(table, record)
+
+
+class MACTableTracker:
+    """
+    Follows a MAC address table across polls and only reports what changed: addresses
+    learned, aged out or moved to another port since the previous poll.
+
+    The switch has no change feed: every poll reads the table again page by page and
+    compares it with the entries of the previous poll, the only state kept between
+    polls. Moves within a page are yielded as the page is compared, additions and
+    removals once every page was read, so a move across pages isn't reported twice.
+
+    tracker = MACTableTracker(switch, "secure", interfaces="gi0-7")
+    tracker.poll_all()  # baseline
+    for change in tracker.poll():
+        print(change)
+    """
+
+    def __init__(
+        self,
+        switch: SwitchConfigurationManager,
+        table="dynamic",
+        *,
+        interfaces=None,
+        vlans=None,
+    ):
+        self.switch = switch
+        self.table = table
+        self.pages = mac_table_pages(MAC_TABLE_SECTIONS[table], interfaces, vlans)
+        # page -> {(vlan, mac): MACEntry}
+        self.entries = {}
+        self.polls = 0
+
+    def _read_page(self, query):
+        section = MAC_TABLE_SECTIONS[self.table]
+        current = {}
+        for record in self.switch.stream_section_records([query], section):
+            if record.get("MACAddress"):
+                entry = MACEntry.from_record(self.table, record)
+                current[entry.key] = entry
+        return current
+
+    def poll(self):
+        """
+        Read the table once and yield the MACChanges since the previous poll, every
+        entry is reported as added by the first poll.
+
+        The entries read become the reference of the next poll only once every page was
+        read and every change yielded: a poll failing or abandoned halfway leaves the
+        previous reference in place, and the next poll reports its changes again.
+        """
+        seen = {}
+        gone = {}
+        entries = {}
+        for page, query in self.pages:
+            current = self._read_page(query)
+            previous = self.entries.get(page, {})
+            entries[page] = current
+
+            for key, entry in current.items():
+                if key not in previous:
+                    seen[key] = entry
+                elif previous[key].interfaceName != entry.interfaceName:
+                    yield MACChange(MOVED, entry, previous[key])
+            for key, entry in previous.items():
+                if key not in current:
+                    gone[key] = entry
+
+        # with per interface pages a move shows up as a removal and an addition
+        for key, entry in seen.items():
+            if key in gone:
+                yield MACChange(MOVED, entry, gone.pop(key))
+            else:
+                yield MACChange(ADDED, entry)
+        for entry in gone.values():
+            yield MACChange(REMOVED, entry)
+        self.entries = entries
+        self.polls += 1
+
+    def poll_all(self):
+        """
+        @return the list of changes of a poll
+        """
+        return list(self.poll())
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.entries.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Print the MAC address table of a switch, or follow its changes"
+    )
+    parser.add_argument(
+        "--host",
+        required=True,
+        dest="host",
+        type=str,
+        help="host switch api",
+    )
+    parser.add_argument(
+        "--username",
+        required=False,
+        default="cisco",
+        dest="username",
+        type=str,
+        help="switch api username",
+    )
+    parser.add_argument(
+        "--password",
+        required=False,
+        default="cisco",
+        dest="password",
+        type=str,
+        help="switch api password",
+    )
+    parser.add_argument(
+        "--table",
+        required=False,
+        default="dynamic",
+        choices=sorted(MAC_TABLE_SECTIONS),
+        dest="table",
+        help="address table to read",
+    )
+    parser.add_argument(
+        "--interfaces",
+        required=False,
+        dest="interfaces",
+        type=str,
+        help="port list such as gi0-7,te1-4, read one page per interface",
+    )
+    parser.add_argument(
+        "--vlans",
+        required=False,
+        dest="vlans",
+        type=str,
+        help="VLAN list such as 1,2350-2351, read one page per VLAN",
+    )
+    parser.add_argument(
+        "--follow",
+        action="store_true",
+        dest="follow",
+        help="poll the table and only print the addresses added, removed or moved",
+    )
+    parser.add_argument(
+        "--interval",
+        required=False,
+        default=DEFAULT_MAC_POLL_INTERVAL,
+        dest="interval",
+        type=float,
+        help="seconds between two polls with --follow",
+    )
+
+    args = parser.parse_args()
+
+    logging.basicConfig(encoding="utf-8", level=logging.INFO)
+
+    from marvell_11abbe00.transport import SwitchTransport
+
+    switch = SwitchConfigurationManager(args.host, transport=SwitchTransport())
+    try:
+        with SwitchSession(switch, args.username, args.password):
+            if not args.follow:
+                for entry in iter_mac_table(
+                    switch, args.table, interfaces=args.interfaces, vlans=args.vlans
+                ):
+                    print(f"{entry.vlan} {entry.mac} {entry.interfaceName}")
+                return
+
+            tracker = MACTableTracker(
+                switch, args.table, interfaces=args.interfaces, vlans=args.vlans
+            )
+            tracker.poll_all()
+            logger.info(f"{len(tracker)} addresses, following changes")
+            while True:
+                time.sleep(args.interval)
+                for change in tracker.poll():
+                    print(change)
+                sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        switch.transport.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,523 @@
+import argparse
+import json
+import logging
+import random
+import secrets
+import ssl
+import threading
+import time
+import xml.etree.ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+from xml.sax.saxutils import escape
+
+from marvell_11abbe00.response import KEY_FIELDS, StatusCode
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION_TTL = 600.0
+
+KEEP_ALIVE_RESPONSE = """<html><head><title>Document Error: Data follows</title></head>
+                    <body><h2>Access Error: Data follows</h2>
+                    <p>Form is not defined</p></body></html>
+"""
+
+STATUS_STRINGS = {
+    StatusCode.OK: "OK",
+    StatusCode.NOT_FOUND: "Not found",
+    StatusCode.PAYLOAD_ERROR: "Payload error",
+    StatusCode.AUTHENTICATION_ERROR: "Authentication error",
+}
+
+
+def action_status_xml(requestURL, statusCode=StatusCode.OK, statusString=None):
+    requestURL = escape(requestURL)
+    if statusCode is None:
+        return (
+            f"<ActionStatus>\n<requestURL>{requestURL}</requestURL>\n"
+            "<statusCode></statusCode>\n</ActionStatus>\n"
+        )
+
+    statusString = statusString or STATUS_STRINGS[statusCode]
+    return (
+        "<ActionStatus>\n<version>1.0</version>\n"
+        f"<requestURL>{requestURL}</requestURL>\n"
+        f"<statusCode>{statusCode.value}</statusCode>\n"
+        "<deviceStatusCode>0</deviceStatusCode>\n"
+        f"<statusString>{statusString}</statusString>\n</ActionStatus>\n"
+    )
+
+
+def response_xml(content):
+    return f"<?xml version='1.0' encoding='UTF-8'?>\n<ResponseData>\n{content}</ResponseData>\n"
+
+
+def parse_wcd_queries(query):
+    """
+    Split `{Section}{Section&interfaceName=gi0}` into [(section, {filters})]
+    """
+    queries = []
+    for part in unquote(query).replace("}", "").split("{")[1:]:
+        section, _, filters = part.partition("&")
+        queries.append((section, dict(parse_qsl(filters))))
+    return queries
+
+
+def _row_key(node):
+    return tuple(
+        (name, node.findtext(name))
+        for name in KEY_FIELDS
+        if node.find(name) is not None
+    )
+
+
+def _find_row(parent, node):
+    key = _row_key(node)
+    for child in parent:
+        if child.tag == node.tag and len(child) > 0 and _row_key(child) == key:
+            return child
+    return None
+
+
+def apply_set(current, node):
+    """
+    Merge the fields of a `set` ServiceFactory into the stored section, creating the
+    rows it addresses when they don't exist yet
+    """
+    for child in node:
+        if len(child) == 0:
+            leaf = current.find(child.tag)
+            if leaf is None:
+                leaf = ET.SubElement(current, child.tag)
+            leaf.text = child.text
+            continue
+
+        row = _find_row(current, child)
+        if row is None:
+            row = ET.SubElement(current, child.tag)
+        apply_set(row, child)
+
+
+def apply_delete(current, node):
+    for child in node:
+        if len(child) == 0:
+            continue
+        row = _find_row(current, child)
+        if row is None:
+            continue
+        if any(len(grandChild) > 0 for grandChild in child):
+            apply_delete(row, child)
+        else:
+            current.remove(row)
+
+
+def filter_section(section, filters):
+    """
+    Copy of a section only keeping the rows matching every filter field
+    """
+    if not filters:
+        return section
+
+    def matches(node):
+        return all(node.findtext(key) == value for key, value in filters.items())
+
+    def copy(node):
+        result = ET.Element(node.tag, node.attrib)
+        result.text = node.text
+        for child in node:
+            if len(child) == 0:
+                result.append(child)
+            elif any(len(grandChild) == 0 for grandChild in child) and not matches(
+                child
+            ):
+                continue
+            else:
+                result.append(copy(child))
+        return result
+
+    return copy(section)
+
+
+class MockSwitchState:
+    """
+    In-memory configuration of the mock switch: one element per WCD section
+    """
+
+    def __init__(self):
+        self.sections = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_har(cls, path) -> "MockSwitchState":
+        """
+        Seed the sections from the responses to the WCD reads found in a HAR capture,
+        the last full read of a section wins
+        """
+        state = cls()
+        with open(path, "r", encoding="utf-8") as f:
+            har = json.load(f)
+
+        for entry in har["log"]["entries"]:
+            url = entry["request"]["url"]
+            text = entry["response"]["content"].get("text")
+            if "/wcd?" not in url or entry["request"]["method"] != "GET" or not text:
+                continue
+            if any(filters for _, filters in parse_wcd_queries(urlsplit(url).query)):
+                continue
+            try:
+                root = ET.fromstring(text)
+            except ET.ParseError:
+                continue
+            deviceConfiguration = root.find("DeviceConfiguration")
+            if deviceConfiguration is None:
+                continue
+            for section in deviceConfiguration:
+                if section.tag != "version":
+                    state.sections[section.tag] = section
+
+        return state
+
+    def read(self, queries):
+        with self._lock:
+            content = ["<DeviceConfiguration>\n<version>1.0</version>\n"]
+            for section, filters in queries:
+                # sections never seeded nor written read as empty tables
+                node = self.sections.get(section)
+                if node is None:
+                    node = ET.Element(section, {"type": "section"})
+                content.append(
+                    ET.tostring(filter_section(node, filters), encoding="unicode")
+                )
+            content.append("</DeviceConfiguration>\n")
+
+        requestURL = "&".join(section for section, _ in queries)
+        return response_xml("".join(content) + action_status_xml(requestURL, None))
+
+    def write(self, body):
+        try:
+            root = ET.fromstring(body)
+        except ET.ParseError:
+            return StatusCode.PAYLOAD_ERROR
+        if root.tag != "DeviceConfiguration":
+            return StatusCode.PAYLOAD_ERROR
+
+        with self._lock:
+            for serviceFactory in root:
+                if serviceFactory.tag == "version":
+                    continue
+                action = serviceFactory.get("action")
+                current = self.sections.get(serviceFactory.tag)
+                if current is None:
+                    current = ET.Element(serviceFactory.tag, {"type": "section"})
+                    self.sections[serviceFactory.tag] = current
+                if action == "set":
+                    apply_set(current, serviceFactory)
+                elif action == "delete":
+                    apply_delete(current, serviceFactory)
+                elif action is None:
+                    return StatusCode.PAYLOAD_ERROR
+
+        return StatusCode.OK
+
+
+class MockSwitchServer:
+    """
+    Local stand-in for the ENCS switch web service speaking the login/logout, keep alive
+    and WCD read/write protocol, for offline load and concurrency testing.
+
+    with MockSwitchServer(state=MockSwitchState.from_har("switch-capture.har")) as server:
+        switch = SwitchConfigurationManager(server.address)
+
+    @param latency seconds added to every response, plus up to jitter seconds
+    @param session_ttl idle seconds after which a sessionID is rejected with status 4
+    @param certfile serve https with this certificate (and keyfile) instead of http
+    """
+
+    def __init__(
+        self,
+        *,
+        host="127.0.0.1",
+        port=0,
+        state=None,
+        username="cisco",
+        password="cisco",
+        latency=0.0,
+        jitter=0.0,
+        session_ttl=DEFAULT_SESSION_TTL,
+        certfile=None,
+        keyfile=None,
+        clock=time.monotonic,
+    ):
+        self.state = state if state is not None else MockSwitchState()
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.jitter = jitter
+        self.session_ttl = session_ttl
+        self.clock = clock
+        self.sessions = {}
+        self.stats = {
+            "requests": 0,
+            "logins": 0,
+            "reads": 0,
+            "writes": 0,
+            "rejected": 0,
+            "unavailable": 0,
+        }
+        # (HTTP status, requests left to answer with it), see fail_next()
+        self._faults = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self.httpd = ThreadingHTTPServer((host, port), _handler_for(self))
+        self.httpd.daemon_threads = True
+        self.scheme = "http"
+        if certfile is not None:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            self.httpd.socket = context.wrap_socket(self.httpd.socket, server_side=True)
+            self.scheme = "https"
+
+    @property
+    def address(self):
+        """
+        Host to hand to SwitchConfigurationManager, scheme and port included
+        """
+        host, port = self.httpd.server_address[:2]
+        return f"{self.scheme}://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def fail_next(self, count=1, status=503):
+        """
+        Answer the next count requests with an HTTP error status instead of handling
+        them, as a gateway in front of an overwhelmed switch does
+        """
+        with self._lock:
+            self._faults.append([status, count])
+
+    def take_fault(self):
+        """
+        @return the HTTP status to answer the request with, None to handle it
+        """
+        with self._lock:
+            if not self._faults:
+                return None
+            fault = self._faults[0]
+            fault[1] -= 1
+            if fault[1] <= 0:
+                self._faults.pop(0)
+            self.stats["unavailable"] += 1
+            return fault[0]
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+
+    def login(self, user, password, client):
+        if user != self.username or password != self.password:
+            return None
+        sessionId = f"UserId={client}&{secrets.randbelow(10 ** 9)}&;path=/"
+        with self._lock:
+            self.sessions[sessionId] = self.clock()
+        return sessionId
+
+    def logout(self, sessionId):
+        with self._lock:
+            self.sessions.pop(sessionId, None)
+
+    def touch(self, sessionId):
+        """
+        @return True and refresh the session when it is known and not expired
+        """
+        now = self.clock()
+        with self._lock:
+            lastSeen = self.sessions.get(sessionId)
+            if lastSeen is None:
+                return False
+            if now - lastSeen > self.session_ttl:
+                del self.sessions[sessionId]
+                return False
+            self.sessions[sessionId] = now
+            return True
+
+
+def _handler_for(server):
+    class MockSwitchRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # headers and body go out in separate writes, Nagle would hold the body back
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            logger.debug(f"{self.address_string()} {format % args}")
+
+        def _send(self, body, headers=None, contentType="text/xml"):
+            content = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", contentType)
+            self.send_header("Content-Length", str(len(content)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(content)
+
+        def _status(self, requestURL, statusCode):
+            self._send(response_xml(action_status_xml(requestURL, statusCode)))
+
+        def do_GET(self):
+            self._handle(None)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            self._handle(self.rfile.read(length))
+
+        def _handle(self, body):
+            server.count("requests")
+            server.delay()
+            fault = server.take_fault()
+            if fault is not None:
+                self.send_error(fault)
+                return
+            url = urlsplit(self.path)
+
+            if url.path == "/System.xml":
+                return self._system(dict(parse_qsl(url.query)))
+
+            sessionId = self.headers.get("sessionID")
+            if url.path == "/device/authenticate_user.xml":
+                server.touch(sessionId)
+                return self._send(KEEP_ALIVE_RESPONSE, contentType="text/html")
+
+            if url.path != "/wcd":
+                self.send_error(404)
+                return
+
+            if not server.touch(sessionId):
+                server.count("rejected")
+                return self._status("wcd", StatusCode.AUTHENTICATION_ERROR)
+
+            if body is None:
+                server.count("reads")
+                queries = parse_wcd_queries(url.query)
+                return self._send(server.state.read(queries))
+
+            server.count("writes")
+            self._status("wcd", server.state.write(body))
+
+        def _system(self, params):
+            action = params.get("action")
+            if action == "login":
+                server.count("logins")
+                sessionId = server.login(
+                    params.get("user"), params.get("password"), self.client_address[0]
+                )
+                if sessionId is None:
+                    return self._status("/System.xml", StatusCode.AUTHENTICATION_ERROR)
+                return self._send(
+                    response_xml(action_status_xml("/System.xml")),
+                    headers={"sessionID": sessionId},
+                )
+
+            if action == "logout":
+                server.logout(self.headers.get("sessionID"))
+            elif not server.touch(self.headers.get("sessionID")):
+                return self._status("/System.xml", StatusCode.AUTHENTICATION_ERROR)
+
+            self._status("/System.xml", StatusCode.OK)
+
+    return MockSwitchRequestHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve a mock ENCS switch for offline testing"
+    )
+    parser.add_argument(
+        "--har",
+        required=False,
+        dest="harFile",
+        type=str,
+        help="HAR capture whose WCD read responses seed the switch state",
+    )
+    parser.add_argument("--bind", default="127.0.0.1", dest="bind", type=str)
+    parser.add_argument("--port", default=8080, dest="port", type=int)
+    parser.add_argument("--username", default="cisco", dest="username", type=str)
+    parser.add_argument("--password", default="cisco", dest="password", type=str)
+    parser.add_argument(
+        "--latency",
+        default=0.0,
+        dest="latency",
+        type=float,
+        help="seconds added to every response",
+    )
+    parser.add_argument(
+        "--jitter",
+        default=0.0,
+        dest="jitter",
+        type=float,
+        help="up to this many random seconds added on top of the latency",
+    )
+    parser.add_argument(
+        "--session-ttl",
+        default=DEFAULT_SESSION_TTL,
+        dest="sessionTtl",
+        type=float,
+        help="idle seconds before a session expires",
+    )
+    parser.add_argument("--certfile", default=None, dest="certfile", type=str)
+    parser.add_argument("--keyfile", default=None, dest="keyfile", type=str)
+
+    args = parser.parse_args()
+
+    logging.basicConfig(encoding="utf-8", level=logging.INFO)
+
+    state = (
+        MockSwitchState.from_har(args.harFile)
+        if args.harFile is not None
+        else MockSwitchState()
+    )
+    server = MockSwitchServer(
+        host=args.bind,
+        port=args.port,
+        state=state,
+        username=args.username,
+        password=args.password,
+        latency=args.latency,
+        jitter=args.jitter,
+        session_ttl=args.sessionTtl,
+        certfile=args.certfile,
+        keyfile=args.keyfile,
+    )
+    logger.info(
+        f"mock switch listening on {server.address} with {len(state.sections)} sections"
+    )
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+from collections import Counter
+import xml.etree.ElementTree as ET
+
+from marvell_11abbe00.builder import (
+    DeviceConfiguration,
+    RequestNode,
+    ServiceFactory,
+    Value,
+    Version,
+)
+from marvell_11abbe00.plan import PlanEntry, ReplayPlan
+from marvell_11abbe00.response import KEY_FIELDS
+
+ALL_SECTIONS = "*"
+
+
+class WriteShape:
+    """
+    Analysis of a WCD POST body made only of `set` actions.
+
+    Every container of the payload becomes a record: a slot, made of the section and the
+    path of containers with their key fields, and the leaf fields assigned in that slot.
+    """
+
+    def __init__(self, *, sections, records, versioned):
+        self.sections = sections
+        self.records = records
+        self.versioned = versioned
+
+    @property
+    def section(self):
+        return self.sections[0] if len(self.sections) == 1 else None
+
+    @property
+    def rows(self):
+        """
+        Table rows addressed by the write, a row being a section and its key fields
+        """
+        return {
+            (section, tuple(key for _, key in path if key))
+            for (section, path), _ in self.records
+        }
+
+
+class UnsupportedWrite(Exception):
+    pass
+
+
+def extract_records(serviceFactory):
+    """
+    Flatten a section element into (slot, fields) records
+    """
+    records = []
+    _walk(serviceFactory, serviceFactory.tag, (), records)
+    return records
+
+
+def row_key(path):
+    """
+    Key fields of the innermost keyed container of a record path
+    """
+    for _, key in reversed(path):
+        if key:
+            return key
+    return ()
+
+
+def _walk(node, section, path, records):
+    leaves = [child for child in node if len(child) == 0]
+    fields = {}
+    for leaf in leaves:
+        if leaf.tag in fields or leaf.attrib:
+            raise UnsupportedWrite(f"repeated or attributed field {leaf.tag}")
+        fields[leaf.tag] = leaf.text or ""
+
+    if fields:
+        records.append(((section, path), fields))
+
+    for child in node:
+        if len(child) == 0:
+            continue
+        childFields = {leaf.tag: leaf.text or "" for leaf in child if len(leaf) == 0}
+        key = tuple(
+            (name, childFields[name]) for name in KEY_FIELDS if name in childFields
+        )
+        _walk(child, section, path + ((child.tag, key),), records)
+
+
+def analyze_write(entry: PlanEntry):
+    """
+    @return a WriteShape for `set` writes, None for requests that are not writes
+    @raise UnsupportedWrite for writes that can't be safely reordered (delete, restore, ...)
+    """
+    if entry.method != "POST" or not entry.text:
+        return None
+
+    try:
+        root = ET.fromstring(entry.text)
+    except ET.ParseError:
+        raise UnsupportedWrite("unparseable body")
+
+    if root.tag != "DeviceConfiguration":
+        raise UnsupportedWrite(f"unknown root {root.tag}")
+
+    sections = []
+    records = []
+    versioned = False
+    for serviceFactory in root:
+        if serviceFactory.tag == "version":
+            versioned = True
+            continue
+        if serviceFactory.get("action") != "set":
+            raise UnsupportedWrite(
+                f"{serviceFactory.tag} {serviceFactory.get('action')}"
+            )
+        sections.append(serviceFactory.tag)
+        records.extend(extract_records(serviceFactory))
+
+    if not records:
+        raise UnsupportedWrite("empty payload")
+    if len({slot for slot, _ in records}) != len(records):
+        raise UnsupportedWrite("several rows with the same key")
+
+    return WriteShape(sections=sections, records=records, versioned=versioned)
+
+
+def touched_sections(entry):
+    try:
+        root = ET.fromstring(entry.text)
+    except ET.ParseError:
+        return [ALL_SECTIONS]
+    return [node.tag for node in root if node.tag != "version"] or [ALL_SECTIONS]
+
+
+def build_service_factory(section, records) -> ServiceFactory:
+    """
+    Rebuild the `set` payload of a section from its records
+    """
+    serviceFactory = ServiceFactory(serviceName=section, action="set")
+
+    nodes = {(): serviceFactory}
+    for (_, path), fields in records:
+        for depth in range(1, len(path) + 1):
+            prefix = path[:depth]
+            if prefix not in nodes:
+                nodes[prefix] = RequestNode(tag=prefix[-1][0])
+                nodes[prefix[:-1]].append(nodes[prefix])
+        for key, value in fields.items():
+            nodes[path].append(Value(key=key, value=value))
+
+    return serviceFactory
+
+
+def build_body(section, records, versioned):
+    root = DeviceConfiguration()
+    if versioned:
+        root.append(Version("1.0"))
+    root.append(build_service_factory(section, records))
+
+    return ET.tostring(root.build(), encoding="unicode", xml_declaration=True)
+
+
+class OptimizationReport:
+    def __init__(self, before):
+        self.before = before
+        self.after = before
+        self.identical = Counter()
+        self.superseded = Counter()
+        self.merged = Counter()
+
+    @property
+    def removed(self):
+        return self.before - self.after
+
+    def __str__(self):
+        lines = [
+            f"replay plan: {self.before} -> {self.after} requests "
+            f"({self.removed} cut, {sum(self.identical.values())} identical repeats, "
+            f"{sum(self.superseded.values())} superseded, {sum(self.merged.values())} merged)"
+        ]
+        sections = set(self.identical) | set(self.superseded) | set(self.merged)
+        for section in sorted(sections):
+            lines.append(
+                f"  {section}: identical={self.identical[section]} "
+                f"superseded={self.superseded[section]} merged={self.merged[section]}"
+            )
+        return "\n".join(lines)
+
+
+def _classify(entries):
+    shapes = []
+    for entry in entries:
+        try:
+            shapes.append(analyze_write(entry))
+        except UnsupportedWrite:
+            shapes.append(touched_sections(entry))
+    return shapes
+
+
+def _is_barrier(shape):
+    return isinstance(shape, list)
+
+
+def _barrier_hits(barrier, slot):
+    return ALL_SECTIONS in barrier or slot[0] in barrier
+
+
+def drop_identical(entries, shapes, report):
+    """
+    Drop writes repeating exactly what the previous write to the same slots already set
+    """
+    last = {}
+    kept = []
+    for entry, shape in zip(entries, shapes):
+        if _is_barrier(shape):
+            last = {
+                slot: fields
+                for slot, fields in last.items()
+                if not _barrier_hits(shape, slot)
+            }
+        elif shape is not None:
+            if all(last.get(slot) == fields for slot, fields in shape.records):
+                report.identical[shape.sections[0]] += 1
+                continue
+            for slot, fields in shape.records:
+                last[slot] = fields
+        kept.append((entry, shape))
+
+    return kept
+
+
+def drop_superseded(items, report):
+    """
+    Drop writes whose every field is assigned again by a later write to the same slot
+    """
+    covered = {}
+    kept = []
+    for entry, shape in reversed(items):
+        if _is_barrier(shape):
+            covered = {
+                slot: fields
+                for slot, fields in covered.items()
+                if not _barrier_hits(shape, slot)
+            }
+        elif shape is not None:
+            if all(
+                fields.keys() <= covered.get(slot, set())
+                for slot, fields in shape.records
+            ):
+                report.superseded[shape.sections[0]] += 1
+                continue
+            for slot, fields in shape.records:
+                covered.setdefault(slot, set()).update(fields)
+        kept.append((entry, shape))
+
+    kept.reverse()
+    return kept
+
+
+def _mergeable(previous, shape):
+    previousEntry, previousShape = previous
+    return (
+        previousShape is not None
+        and not _is_barrier(previousShape)
+        and previousShape.section is not None
+        and previousShape.section == shape.section
+        and previousShape.versioned == shape.versioned
+        and len(previousShape.rows | shape.rows) == 1
+    )
+
+
+def merge_consecutive(items, report):
+    """
+    Merge back to back writes to the same table row and URL into a single request
+    """
+    merged = []
+    lastWrite = None
+    for entry, shape in items:
+        if shape is None:
+            merged.append((entry, shape))
+            # a read in between must see the first write alone, don't merge across it
+            lastWrite = None
+            continue
+
+        if (
+            lastWrite is not None
+            and not _is_barrier(shape)
+            and shape.section is not None
+            and _mergeable(merged[lastWrite], shape)
+            and merged[lastWrite][0].target == entry.target
+        ):
+            previousEntry, previousShape = merged[lastWrite]
+            records = dict(previousShape.records)
+            for slot, fields in shape.records:
+                records[slot] = {**records.get(slot, {}), **fields}
+            combined = WriteShape(
+                sections=shape.sections,
+                records=list(records.items()),
+                versioned=shape.versioned,
+            )
+            # the merged request replaces the previous one at the position of the later write
+            del merged[lastWrite]
+            merged.append((_rewrite(entry, combined), combined))
+            report.merged[shape.section] += 1
+        else:
+            merged.append((entry, shape))
+
+        lastWrite = len(merged) - 1
+
+    return merged
+
+
+def _rewrite(entry, shape):
+    return PlanEntry(
+        method=entry.method,
+        scheme=entry.scheme,
+        path=entry.path,
+        query=entry.query,
+        text=build_body(shape.section, shape.records, shape.versioned),
+        headers=[
+            [key, value]
+            for key, value in entry.headers
+            if key.lower() != "content-length"
+        ],
+    )
+
+
+def optimize_plan(plan: ReplayPlan):
+    """
+    Remove redundant writes from a replay plan: identical repeats, writes fully
+    overwritten later on and back to back writes to the same row, merged into one.
+
+    Reads and keep-alive requests are kept as is. Writes that aren't plain `set` actions
+    (delete, restore, ...) act as barriers for the sections they touch.
+
+    @return (optimized plan, OptimizationReport)
+    """
+    report = OptimizationReport(len(plan))
+    items = drop_identical(plan.entries, _classify(plan.entries), report)
+    items = drop_superseded(items, report)
+    items = merge_consecutive(items, report)
+    report.after = len(items)
+
+    return ReplayPlan([entry for entry, _ in items], source=plan.source), report
@@ -0,0 +1,193 @@
+import heapq
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import unquote
+
+from marvell_11abbe00.optimize import (
+    ALL_SECTIONS,
+    UnsupportedWrite,
+    analyze_write,
+    touched_sections,
+)
+
+DEFAULT_PIPELINE_MAX_IN_FLIGHT = 4
+
+KEEP_ALIVE_PATH = "/device/authenticate_user.xml"
+
+# switch wide settings that may change how every other section behaves, writes to them
+# wait for everything before and hold back everything after
+BARRIER_SECTIONS = {
+    "EWSServiceTable",
+    "IPv4GlobalSetting",
+    "LACPGlobalSetting",
+    "LACPPortList",
+    "LAN1GlobalParameters",
+    "LLDPGlobalSetting",
+    "MulticastGlobalSetting",
+    "PoEGlobalSetting",
+    "SpanningTreeGlobalParam",
+    "Standard_802_1xGlobalSetting",
+    "SystemGlobalSetting",
+    "TimeSetting",
+}
+
+# sections referencing rows of other sections, e.g. a port can only join an existing VLAN
+COUPLED_SECTIONS = {
+    "VLANInterfaceISList": ("VLANList",),
+    "LAN1sVlanMappingTable": ("VLANList",),
+}
+
+
+class Access:
+    """
+    What a plan entry touches: table rows it writes, whole sections it writes or reads
+    """
+
+    def __init__(self, *, rows=(), sections=(), reads=(), barrier=False):
+        self.rows = set(rows)
+        self.sections = set(sections)
+        self.reads = set(reads)
+        self.barrier = barrier
+
+
+def read_sections(entry):
+    query = unquote(entry.query or "")
+    return {part.partition("&")[0] for part in query.replace("}", "").split("{")[1:]}
+
+
+def classify_entry(entry) -> Access:
+    if entry.path == KEEP_ALIVE_PATH:
+        return Access()
+
+    if entry.method == "GET":
+        sections = read_sections(entry)
+        return Access(reads=sections) if sections else Access(barrier=True)
+
+    try:
+        shape = analyze_write(entry)
+    except UnsupportedWrite:
+        sections = set(touched_sections(entry))
+        if ALL_SECTIONS in sections or sections & BARRIER_SECTIONS:
+            return Access(barrier=True)
+        return Access(sections=sections)
+
+    if shape is None or set(shape.sections) & BARRIER_SECTIONS:
+        return Access(barrier=True)
+
+    reads = {
+        coupled
+        for section in shape.sections
+        for coupled in COUPLED_SECTIONS.get(section, ())
+    }
+    return Access(rows=shape.rows, reads=reads)
+
+
+class _SectionState:
+    def __init__(self):
+        self.lastWrite = None
+        self.rowWrites = {}
+        self.readers = []
+
+    def writers(self):
+        return [
+            index
+            for index in [self.lastWrite, *self.rowWrites.values()]
+            if index is not None
+        ]
+
+
+def build_dependencies(entries):
+    """
+    Dependency graph of plan entries: an entry waits for every earlier entry writing
+    the same row, any row of a section it writes whole or reads, and for the earlier
+    readers of what it writes. Barriers are ordered against everything.
+
+    @return list of sets, the indexes each entry waits for
+    """
+    dependencies = []
+    sections = {}
+    lastBarrier = None
+    sinceBarrier = []
+
+    for index, entry in enumerate(entries):
+        access = classify_entry(entry)
+        waits = set() if lastBarrier is None else {lastBarrier}
+
+        if access.barrier:
+            waits.update(sinceBarrier)
+            sections = {}
+            lastBarrier = index
+            sinceBarrier = []
+            dependencies.append(waits)
+            continue
+
+        for section in access.reads:
+            state = sections.setdefault(section, _SectionState())
+            waits.update(state.writers())
+
+        for section in access.sections:
+            state = sections.setdefault(section, _SectionState())
+            waits.update(state.writers())
+            waits.update(state.readers)
+
+        for section, key in access.rows:
+            state = sections.setdefault(section, _SectionState())
+            if state.lastWrite is not None:
+                waits.add(state.lastWrite)
+            if key in state.rowWrites:
+                waits.add(state.rowWrites[key])
+            waits.update(state.readers)
+
+        for section in access.reads:
+            sections[section].readers.append(index)
+        for section in access.sections:
+            state = sections[section]
+            state.lastWrite, state.rowWrites, state.readers = index, {}, []
+        for section, key in access.rows:
+            sections[section].rowWrites[key] = index
+
+        waits.discard(index)
+        sinceBarrier.append(index)
+        dependencies.append(waits)
+
+    return dependencies
+
+
+def critical_path(dependencies):
+    """
+    Length of the longest chain of dependent entries, the lower bound in round trips
+    """
+    depth = []
+    for waits in dependencies:
+        depth.append(1 + max((depth[index] for index in waits), default=0))
+    return max(depth, default=0)
+
+
+def run_pipelined(entries, dependencies, send, max_in_flight):
+    """
+    Call send(index, entry) for every entry on a pool of max_in_flight threads, once
+    all the entries it depends on are done. Ready entries go out in plan order.
+    """
+    remaining = [len(waits) for waits in dependencies]
+    dependents = [[] for _ in entries]
+    for index, waits in enumerate(dependencies):
+        for dependency in waits:
+            dependents[dependency].append(index)
+
+    ready = [index for index, count in enumerate(remaining) if count == 0]
+    heapq.heapify(ready)
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        inFlight = {}
+        while ready or inFlight:
+            while ready and len(inFlight) < max_in_flight:
+                index = heapq.heappop(ready)
+                inFlight[executor.submit(send, index, entries[index])] = index
+
+            done, _ = wait(inFlight, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = inFlight.pop(future)
+                future.result()
+                for dependent in dependents[index]:
+                    remaining[dependent] -= 1
+                    if remaining[dependent] == 0:
+                        heapq.heappush(ready, dependent)
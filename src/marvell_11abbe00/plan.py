@@ -0,0 +1,145 @@
+import gzip
+import hashlib
+import json
+from urllib.parse import urlsplit
+
+PLAN_FORMAT_VERSION = 1
+
+SESSION_HEADER = "sessionid"
+
+
+class PlanEntry:
+    """
+    A single request of a replay plan. Only what is needed to resend it is kept: method,
+    path, raw query, body and a header template whose session header gets the current
+    sessionID at replay time.
+
+    It exposes url, method, text and headers like haralyzer's Request so the request
+    filters apply to both.
+    """
+
+    __slots__ = ("method", "scheme", "path", "query", "text", "headers")
+
+    def __init__(self, *, method, scheme, path, query, text, headers):
+        self.method = method
+        self.scheme = scheme
+        self.path = path
+        self.query = query
+        self.text = text
+        self.headers = headers
+
+    @classmethod
+    def from_request(cls, request) -> "PlanEntry":
+        url = urlsplit(request.url)
+        headers = []
+        for header in request.headers:
+            key = header["name"]
+            value = None if key.lower() == SESSION_HEADER else header["value"]
+            headers.append([key, value])
+
+        return cls(
+            method=request.method,
+            scheme=url.scheme,
+            path=url.path,
+            query=url.query if "?" in request.url else None,
+            text=request.text,
+            headers=headers,
+        )
+
+    @property
+    def target(self):
+        return self.path if self.query is None else f"{self.path}?{self.query}"
+
+    @property
+    def url(self):
+        return self.url_for("")
+
+    def url_for(self, host):
+        if "://" in host:
+            return f"{host.rstrip('/')}{self.target}"
+        return f"{self.scheme}://{host}{self.target}"
+
+    def render_headers(self, sessionId):
+        return {
+            key: sessionId if value is None else value for key, value in self.headers
+        }
+
+    def to_list(self):
+        return [
+            self.method,
+            self.scheme,
+            self.path,
+            self.query,
+            self.text,
+            self.headers,
+        ]
+
+    @classmethod
+    def from_list(cls, item) -> "PlanEntry":
+        method, scheme, path, query, text, headers = item
+        return cls(
+            method=method,
+            scheme=scheme,
+            path=path,
+            query=query,
+            text=text,
+            headers=headers,
+        )
+
+    def __str__(self):
+        return f"<PlanEntry {self.method} {self.target}>"
+
+
+class ReplayPlan:
+    def __init__(self, entries, source=None):
+        self.entries = entries
+        self.source = source
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    @property
+    def digest(self):
+        """
+        sha256 of the plan content, stable across saves of the same entries
+        """
+        content = json.dumps(
+            [entry.to_list() for entry in self.entries], separators=(",", ":")
+        )
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def to_dict(self):
+        return {
+            "version": PLAN_FORMAT_VERSION,
+            "source": self.source,
+            "entries": [entry.to_list() for entry in self.entries],
+        }
+
+    @classmethod
+    def from_dict(cls, data) -> "ReplayPlan":
+        if data.get("version") != PLAN_FORMAT_VERSION:
+            raise ValueError(f"Unsupported replay plan version {data.get('version')}")
+
+        return cls(
+            [PlanEntry.from_list(item) for item in data["entries"]],
+            source=data.get("source"),
+        )
+
+
+def _open(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def save_plan(plan: ReplayPlan, path):
+    with _open(path, "w") as f:
+        json.dump(plan.to_dict(), f, separators=(",", ":"))
+
+
+def load_plan(path) -> ReplayPlan:
+    with _open(path, "r") as f:
+        return ReplayPlan.from_dict(json.load(f))
@@ -0,0 +1,105 @@
+import logging
+
+from marvell_11abbe00.batch import SwitchTransaction
+from marvell_11abbe00.optimize import build_service_factory, extract_records, row_key
+from marvell_11abbe00.response import KEY_FIELDS, WCDResponse
+from marvell_11abbe00.vlans import field_values_equal
+
+logger = logging.getLogger(__name__)
+
+
+def read_query(write):
+    return write.query if write.query is not None else write.section
+
+
+def index_rows(deviceConfiguration):
+    """
+    Index the current values of a DeviceConfiguration by section and row key.
+
+    @return {section: {row key: {field: value}}}
+    """
+    sections = {}
+    if deviceConfiguration is None:
+        return sections
+
+    for section in deviceConfiguration:
+        if section.tag == "version":
+            continue
+        rows = sections.setdefault(section.tag, {})
+        for (_, path), fields in extract_records(section):
+            rows.setdefault(row_key(path), {}).update(fields)
+
+    return sections
+
+
+def diff_write(write, current):
+    """
+    Prune from a write every field already holding the requested value, VLAN lists
+    compared as sets whatever their ranges and order. The requested values then become
+    the expected state of the rows, so later writes to the same row in the same
+    transaction are compared against them.
+
+    @param current rows of the write's section as returned by index_rows
+    @return the pruned ServiceFactory node, None when nothing has to be sent
+    """
+    records = []
+    for slot, fields in extract_records(write.node.build()):
+        _, path = slot
+        known = current.setdefault(row_key(path), None)
+        if known is None:
+            records.append((slot, fields))
+            current[row_key(path)] = dict(fields)
+            continue
+
+        diff = {
+            key: value
+            for key, value in fields.items()
+            if key in KEY_FIELDS or not field_values_equal(key, known.get(key), value)
+        }
+        if any(key not in KEY_FIELDS for key in diff):
+            records.append((slot, diff))
+        known.update(fields)
+
+    if not records:
+        return None
+
+    return build_service_factory(write.section, records)
+
+
+class ReconcileTransaction(SwitchTransaction):
+    """
+    Batch transaction that first reads the current state of every targeted section with
+    a single WCD GET and only sends the fields that differ from it.
+
+    Writes already matching the switch are marked as skipped and never sent.
+    """
+
+    def reconcile(self):
+        writes = self.writes
+        queries = list(dict.fromkeys(read_query(write) for write in writes))
+        if not queries:
+            return writes
+
+        xmltree = self.switch.fetch_sections_xml(queries)
+        current = index_rows(WCDResponse.from_xml_response(xmltree).deviceConfiguration)
+
+        pending = []
+        for write in writes:
+            node = diff_write(write, current.setdefault(write.section, {}))
+            if node is None:
+                logger.debug(f"{write.key} already up to date")
+                write.skipped = True
+                self.results.append(write)
+                continue
+            write.node = node
+            pending.append(write)
+
+        logger.info(
+            f"reconcile: {len(pending)} of {len(writes)} writes differ from the switch"
+        )
+        self.writes = pending
+        return pending
+
+    def flush(self):
+        self.reconcile()
+        return super().flush()
@@ -1,23 +1,38 @@
 import json
 import logging
 import argparse
-from urllib.parse import urlparse
-import requests
-import urllib3
+import threading
+import time
 import xml.etree.ElementTree as ET
+from contextlib import nullcontext
+from typing import TYPE_CHECKING
 
-from haralyzer import HarPage
-from haralyzer.http import Request
-
-from marvell_11abbe00.response import StatusCode, WCDResponse
+from marvell_11abbe00.instrument import LatencyAggregator, RequestEvent, log_event
+from marvell_11abbe00.journal import ReplayJournal, default_journal_dir
+from marvell_11abbe00.optimize import optimize_plan, touched_sections
+from marvell_11abbe00.pipeline import (
+    DEFAULT_PIPELINE_MAX_IN_FLIGHT,
+    KEEP_ALIVE_PATH,
+    build_dependencies,
+    critical_path,
+    read_sections,
+    run_pipelined,
+)
+from marvell_11abbe00.plan import PlanEntry, ReplayPlan, load_plan, save_plan
+from marvell_11abbe00.response import StatusCode
+from marvell_11abbe00.retry import DEFAULT_MAX_ATTEMPTS, Deadline, RetryPolicy
+from marvell_11abbe00.session import SwitchSession
+from marvell_11abbe00.stream import parse_action_status
 from marvell_11abbe00.switch import SwitchConfigurationManager
+from marvell_11abbe00.throttle import DEFAULT_MAX_RATE, AdaptiveLimiter
+from marvell_11abbe00.defaults import DEFAULT_POOL_MAXSIZE, DEFAULT_READ_TIMEOUT
 
-logging.basicConfig(encoding="utf-8", level=logging.INFO)
-logger = logging.getLogger(__name__)
+if TYPE_CHECKING:
+    from haralyzer.http import Request
 
-urllib3.disable_warnings()
-urllib3.util.url._QUERY_CHARS.add("{")
-urllib3.util.url._QUERY_CHARS.add("}")
+    from marvell_11abbe00.transport import SwitchTransport
+
+logger = logging.getLogger(__name__)
 
 
 def request_process_filter(request: "Request") -> bool:
@@ -44,34 +59,316 @@ def request_process_filter(request: "Request") -> bool:
     return True
 
 
-def request_replace_headers(request: "Request", sessionId: str) -> dict[str, str]:
-    headers = {}
-    for header in request.headers:
-        key = header["name"]
-        value = header["value"]
-        if key.lower() == "sessionid":
-            headers[key] = sessionId
-        else:
-            headers[key] = value
+def compile_har(harFile) -> ReplayPlan:
+    """
+    Turn a HAR capture into a replay plan: the entries are filtered once and only the
+    method, path, query, body and header template of each request are kept
+    """
+    from haralyzer import HarPage
+
+    with open(harFile, "r") as f:
+        har_page = HarPage("unknown", har_data=json.loads(f.read()))
+
+    entries = [
+        PlanEntry.from_request(entry.request)
+        for entry in har_page.entries
+        if request_process_filter(entry.request)
+    ]
+    logger.info(
+        f"compiled {harFile}: kept {len(entries)} of {len(har_page.entries)} entries"
+    )
 
-    return headers
+    return ReplayPlan(entries, source=harFile)
 
 
-def request_process(request: "Request", host, sessionId) -> WCDResponse:
-    originalUrl = urlparse(request.url)
-    replacedUrl = originalUrl._replace(netloc=host)
-    response = requests.request(
+def load_replay_plan(path) -> ReplayPlan:
+    """
+    Load a compiled plan, or compile a HAR file on the fly
+    """
+    if path.endswith(".har"):
+        return compile_har(path)
+    return load_plan(path)
+
+
+def request_process(
+    request: PlanEntry, host, sessionId, transport: "SwitchTransport", deadline=None
+):
+    response = transport.request(
         method=request.method,
-        url=replacedUrl.geturl(),
+        url=request.url_for(host),
         data=request.text,
-        headers=request_replace_headers(request, sessionId),
-        verify=False,
+        headers=request.render_headers(sessionId),
+        deadline=deadline,
     )
 
     return response
 
 
-def main():
+def is_idempotent_entry(req: PlanEntry):
+    """
+    Whether a plan entry can be sent twice: reads and writes made only of `set` actions
+    """
+    if req.method == "GET":
+        return True
+    if not req.text:
+        return False
+    return req.text.count('action="') == req.text.count('action="set"')
+
+
+def replay_entry(
+    switch: SwitchConfigurationManager,
+    req,
+    username,
+    password,
+    label="",
+    *,
+    journal: ReplayJournal = None,
+    index=None,
+):
+    """
+    Send one plan entry under the retry policy of the switch, logging in again when the
+    switch rejects the session
+
+    @param journal ReplayJournal recording the answer of the entry at index
+    @return (number of requests sent, True when the switch accepted the entry)
+    """
+    event = entry_event(switch, req) if switch.observers else None
+    generation = None
+
+    def attempt(deadline):
+        nonlocal generation
+        headers, generation = switch.session_headers()
+        response = request_process(
+            req, switch.host, headers["sessionID"], switch.transport, deadline
+        )
+        switch.mark_session_used()
+        if req.path == KEEP_ALIVE_PATH:
+            return (response, None), None
+
+        started = time.perf_counter()
+        try:
+            actionStatus = parse_action_status(response.content)
+        except (ValueError, ET.ParseError) as e:
+            logger.warning(f"[{switch.host} {label}] unreadable response: {e}")
+            actionStatus = None
+        if event is not None:
+            event.timings["parse"] = time.perf_counter() - started
+        return (response, actionStatus), (
+            actionStatus.statusCode if actionStatus is not None else None
+        )
+
+    def relogin():
+        if switch.session is not None:
+            switch.session.refresh(generation)
+        else:
+            switch.login(username, password)
+
+    (response, actionStatus), sent = switch.call_with_retry(
+        attempt,
+        idempotent=is_idempotent_entry(req),
+        relogin=relogin,
+        label=f"[{switch.host} {label}]",
+    )
+
+    statusCode = None if actionStatus is None else actionStatus.statusCode
+    if journal is not None:
+        journal.record(index, statusCode)
+
+    if req.path == KEEP_ALIVE_PATH:
+        logger.info(f"[{switch.host} {label}] session keep alive")
+        notify_entry(switch, event, response, sent)
+        return sent, True
+
+    if actionStatus is None:
+        logger.error(f"[{switch.host} {label}] Unknown response format!")
+        logger.error(response.text)
+        notify_entry(switch, event, response, sent)
+        return sent, False
+
+    notify_entry(switch, event, response, sent, statusCode)
+    if actionStatus.statusCode in (
+        StatusCode.PAYLOAD_ERROR,
+        StatusCode.AUTHENTICATION_ERROR,
+    ):
+        logger.error(f"[{switch.host}] {actionStatus.statusCode.name}.")
+        logger.error(response.text)
+        return sent, False
+    logger.info(f"[{switch.host} {label}] result - {str(actionStatus)}")
+    return sent, True
+
+
+def entry_event(switch: SwitchConfigurationManager, req: PlanEntry) -> RequestEvent:
+    if req.path == KEEP_ALIVE_PATH:
+        sections = []
+    elif req.method == "GET":
+        sections = sorted(read_sections(req))
+    elif req.text:
+        sections = touched_sections(req)
+    else:
+        sections = []
+
+    kind = "keep_alive" if req.path == KEEP_ALIVE_PATH else "replay"
+    event = RequestEvent(
+        host=switch.host, method=req.method, kind=kind, sections=sections
+    )
+    event.payloadBytes = len(req.text.encode("utf-8")) if req.text else 0
+    return event
+
+
+def notify_entry(switch, event, response, sent, statusCode=None):
+    if event is None:
+        return
+    event.record_response(response)
+    event.statusCode = statusCode
+    event.retries = sent - 1
+    switch.notify(event.finish())
+
+
+def replay_entries(
+    switch: SwitchConfigurationManager,
+    entries,
+    username,
+    password,
+    progress=None,
+    journal: ReplayJournal = None,
+) -> dict:
+    """
+    Replay plan entries against an authenticated switch.
+
+    @param progress optional callable(index, total) invoked before each entry
+    @param journal ReplayJournal recording every answer, the entries it already shows
+                   confirmed are skipped
+    @return counters of sent, ok, failed and skipped entries
+    """
+    total = len(entries)
+    summary = {"sent": 0, "ok": 0, "errors": 0, "skipped": 0}
+
+    for index, req in enumerate(entries):
+        if journal is not None and journal.is_confirmed(index):
+            summary["skipped"] += 1
+            continue
+        logger.info(f"[{switch.host} {index} / {total}] processing entry - {req}")
+        if progress is not None:
+            progress(index, total)
+
+        sent, ok = replay_entry(
+            switch,
+            req,
+            username,
+            password,
+            f"{index} / {total}",
+            journal=journal,
+            index=index,
+        )
+        summary["sent"] += sent
+        summary["ok" if ok else "errors"] += 1
+
+    return summary
+
+
+def replay_entries_pipelined(
+    switch: SwitchConfigurationManager,
+    entries,
+    username,
+    password,
+    max_in_flight=DEFAULT_PIPELINE_MAX_IN_FLIGHT,
+    progress=None,
+    journal: ReplayJournal = None,
+) -> dict:
+    """
+    Replay plan entries with up to max_in_flight requests in flight. Entries touching
+    the same table row, or reading a section written before, keep their captured order.
+
+    @param journal ReplayJournal recording every answer, the entries it already shows
+                   confirmed are skipped
+    @return counters of sent, ok, failed and skipped entries
+    """
+    total = len(entries)
+    summary = {"sent": 0, "ok": 0, "errors": 0, "skipped": 0}
+    lock = threading.Lock()
+
+    def send(index, req):
+        if journal is not None and journal.is_confirmed(index):
+            # still goes through the pipeline so the entries depending on it wait
+            with lock:
+                summary["skipped"] += 1
+            return
+        logger.info(f"[{switch.host} {index} / {total}] processing entry - {req}")
+        if progress is not None:
+            progress(index, total)
+
+        sent, ok = replay_entry(
+            switch,
+            req,
+            username,
+            password,
+            f"{index} / {total}",
+            journal=journal,
+            index=index,
+        )
+        with lock:
+            summary["sent"] += sent
+            summary["ok" if ok else "errors"] += 1
+
+    dependencies = build_dependencies(entries)
+    logger.info(
+        f"[{switch.host}] {total} entries, longest dependency chain "
+        f"{critical_path(dependencies)}"
+    )
+    run_pipelined(entries, dependencies, send, max_in_flight)
+
+    return summary
+
+
+def compile_main():
+    parser = argparse.ArgumentParser(
+        description="Compile a HAR file into a replay plan"
+    )
+    parser.add_argument(
+        "--har",
+        required=True,
+        dest="harFile",
+        type=str,
+        help="path to the HAR file to compile",
+    )
+    parser.add_argument(
+        "--output",
+        required=False,
+        dest="output",
+        type=str,
+        help="path of the replay plan to write, gzip compressed when ending in .gz",
+    )
+    parser.add_argument(
+        "--optimize",
+        action="store_true",
+        dest="optimize",
+        help="drop identical, superseded and mergeable writes from the plan",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        dest="dryRun",
+        help="only report how many requests the optimization cuts",
+    )
+
+    args = parser.parse_args()
+    if args.output is None and not args.dryRun:
+        parser.error("--output is required unless --dry-run is given")
+
+    logging.basicConfig(encoding="utf-8", level=logging.INFO)
+
+    plan = compile_har(args.harFile)
+    if args.optimize or args.dryRun:
+        plan, report = optimize_plan(plan)
+        print(report)
+    if args.dryRun:
+        return
+
+    save_plan(plan, args.output)
+    logger.info(f"wrote {len(plan)} entries to {args.output} ({plan.digest})")
+
+
+def build_parser():
     parser = argparse.ArgumentParser(description="Replay a HAR file to the switch")
     parser.add_argument(
         "--host",
@@ -80,13 +377,19 @@ def main():
         type=str,
         help="host switch api",
     )
-    parser.add_argument(
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument(
         "--har",
-        required=True,
         dest="harFile",
         type=str,
         help="path to the HAR file to replay",
     )
+    group.add_argument(
+        "--plan",
+        dest="planFile",
+        type=str,
+        help="path to a replay plan compiled with marvell_11abbe00_compile",
+    )
     parser.add_argument(
         "--username",
         required=False,
@@ -103,55 +406,239 @@ def main():
         type=str,
         help="switch api password",
     )
+    parser.add_argument(
+        "--pool-size",
+        required=False,
+        default=DEFAULT_POOL_MAXSIZE,
+        dest="poolSize",
+        type=int,
+        help="maximum number of pooled connections to the switch",
+    )
+    parser.add_argument(
+        "--timeout",
+        required=False,
+        default=DEFAULT_READ_TIMEOUT,
+        dest="timeout",
+        type=float,
+        help="read timeout in seconds for each request",
+    )
 
-    args = parser.parse_args()
+    parser.add_argument(
+        "--optimize",
+        action="store_true",
+        dest="optimize",
+        help="drop identical, superseded and mergeable writes before replaying",
+    )
+    parser.add_argument(
+        "--parallel",
+        required=False,
+        default=1,
+        dest="parallel",
+        type=int,
+        help="requests in flight, entries touching the same rows keep their order",
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        dest="adaptive",
+        help="find the requests in flight, up to --parallel, and per second the switch "
+        "handles, backing off when it slows down or fails",
+    )
+    parser.add_argument(
+        "--max-rate",
+        required=False,
+        default=DEFAULT_MAX_RATE,
+        dest="maxRate",
+        type=float,
+        help="requests per second never exceeded with --adaptive",
+    )
+    parser.add_argument(
+        "--max-attempts",
+        required=False,
+        default=DEFAULT_MAX_ATTEMPTS,
+        dest="maxAttempts",
+        type=int,
+        help="requests sent at most when the switch can't be reached",
+    )
+    parser.add_argument(
+        "--call-timeout",
+        required=False,
+        dest="callTimeout",
+        type=float,
+        help="seconds an entry may take, retries included",
+    )
+    parser.add_argument(
+        "--job-timeout",
+        required=False,
+        dest="jobTimeout",
+        type=float,
+        help="seconds after which the replay is given up",
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        dest="metrics",
+        help="log p50/p95/p99 latencies per section once the replay is done",
+    )
+    parser.add_argument(
+        "--openmetrics",
+        required=False,
+        dest="openmetricsFile",
+        type=str,
+        help="write the request metrics to this file in the OpenMetrics text format",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        dest="trace",
+        help="log the timings of every request",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        dest="resume",
+        help="skip the entries an interrupted replay of the same plan and host got OK for",
+    )
+    parser.add_argument(
+        "--journal-dir",
+        required=False,
+        dest="journalDir",
+        type=str,
+        help="directory of the progress journals, ~/.cache/marvell_11abbe00/journal by default",
+    )
+    parser.add_argument(
+        "--no-journal",
+        action="store_true",
+        dest="noJournal",
+        help="don't record the progress of the replay",
+    )
 
-    with open(args.harFile, "r") as f:
-        har_page = HarPage("unknown", har_data=json.loads(f.read()))
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    logging.basicConfig(encoding="utf-8", level=logging.INFO)
+
+    run(args)
 
-    switch = SwitchConfigurationManager(args.host)
-    sessionId = switch.login(args.username, args.password)
-    switch.set_time()
 
-    logger.info(f"loaded {args.harFile} with {len(har_page.entries)} entries")
+def run(args, switch: SwitchConfigurationManager = None, plan: ReplayPlan = None):
+    """
+    Replay with the parsed command line arguments.
 
-    for index, entry in enumerate(har_page.entries):
-        req = entry.request
-        logger.info(f"[{index} / {len(har_page.entries)}] processing entry - {req.url}")
+    @param switch manager whose open session is reused, as the daemon does; it stays
+                  open afterwards. A new one is logged in and closed when None
+    @param plan already loaded plan of args.planFile or args.harFile
+    """
+    if args.resume and args.noJournal:
+        raise Exception("--resume needs the journal, drop --no-journal")
+    if plan is None:
+        started = time.monotonic()
+        plan = load_replay_plan(args.planFile or args.harFile)
+        logger.info(
+            f"loaded {args.planFile or args.harFile} with {len(plan)} entries "
+            f"in {time.monotonic() - started:.3f}s"
+        )
+    if args.optimize:
+        plan, report = optimize_plan(plan)
+        logger.info(str(report))
 
-        if not request_process_filter(req):
-            logger.info(
-                f"[{index} / {len(har_page.entries)}] url did not pass url filter skip"
+    owned = switch is None
+    if owned:
+        from marvell_11abbe00.transport import SwitchTransport
+
+        transport = SwitchTransport(
+            pool_maxsize=max(args.poolSize, args.parallel), read_timeout=args.timeout
+        )
+        switch = SwitchConfigurationManager(args.host, transport=transport)
+    switch.retry_policy = RetryPolicy(
+        max_attempts=args.maxAttempts, call_timeout=args.callTimeout
+    )
+    switch.deadline = None if args.jobTimeout is None else Deadline(args.jobTimeout)
+    # a warm switch keeps what its limiter learned for the next replay
+    previousLimiter = switch.limiter
+    if args.adaptive:
+        if switch.limiter is None:
+            switch.limiter = AdaptiveLimiter(
+                max_limit=args.parallel, max_rate=args.maxRate, label=f"[{args.host}]"
             )
-            continue
+        switch.limiter.set_maximums(max_limit=args.parallel, max_rate=args.maxRate)
+    else:
+        switch.limiter = None
+    observers = []
+    aggregator = None
+    if args.metrics or args.openmetricsFile:
+        aggregator = LatencyAggregator()
+        observers.append(aggregator)
+    if args.trace:
+        observers.append(log_event)
+    for observer in observers:
+        switch.add_observer(observer)
+
+    journal = None
+    if not args.noJournal:
+        journal = ReplayJournal.open(
+            args.journalDir or default_journal_dir(),
+            plan,
+            args.host,
+            resume=args.resume,
+        )
 
-        while True:
-            response = request_process(req, args.host, sessionId)
-
-            if "/device/authenticate_user.xml" in req.url:
-                logger.info(f"[{index} / {len(har_page.entries)}] session keep alive")
-                break
-
-            xmlResponse = ET.fromstring(response.text)
-            wcdResponse = WCDResponse.from_xml_response(xmlResponse)
-            actionStatus = wcdResponse.actionStatus
-
-            if actionStatus is not None:
-                if actionStatus.statusCode == StatusCode.AUTHENTICATION_ERROR:
-                    logger.warning("token expired. login again.")
-                    sessionId = switch.login(args.username, args.password)
-                    continue
-                elif actionStatus.statusCode == StatusCode.PAYLOAD_ERROR:
-                    logger.error("payload error.")
-                    logger.error(response.text)
-                    break
-                logger.info(
-                    f"[{index} / {len(har_page.entries)}] result - {str(actionStatus)}"
+    summary = None
+    try:
+        with (
+            SwitchSession(switch, args.username, args.password)
+            if owned
+            else nullcontext(switch.session)
+        ) as session:
+            switch.set_time()
+            started = time.monotonic()
+            if args.parallel > 1:
+                summary = replay_entries_pipelined(
+                    switch,
+                    plan.entries,
+                    args.username,
+                    args.password,
+                    max_in_flight=args.parallel,
+                    journal=journal,
                 )
-                break
             else:
-                logger.info("Unknown response format!")
-                break
+                summary = replay_entries(
+                    switch, plan.entries, args.username, args.password, journal=journal
+                )
+            logger.info(f"replayed {summary} in {time.monotonic() - started:.3f}s")
+            if switch.limiter is not None:
+                logger.info(f"adaptive limits: {switch.limiter.stats()}")
+
+        logger.info(
+            f"connection stats: {switch.transport.stats()}, session: "
+            f"{session.stats() if session is not None else '-'}"
+        )
+    finally:
+        if journal is not None:
+            # a complete replay needs no resume, an interrupted one keeps its journal
+            complete = summary is not None and summary["errors"] == 0
+            journal.close(remove=complete)
+            if not complete:
+                logger.info(f"progress kept in {journal.path}, rerun with --resume")
+        for observer in observers:
+            switch.remove_observer(observer)
+        switch.deadline = None
+        if not args.adaptive:
+            switch.limiter = previousLimiter
+        if owned:
+            switch.transport.close()
+
+    if args.metrics:
+        logger.info(f"request latencies:\n{aggregator.report()}")
+    if args.openmetricsFile:
+        with open(args.openmetricsFile, "w", encoding="utf-8") as f:
+            f.write(aggregator.openmetrics())
+        logger.info(f"metrics written to {args.openmetricsFile}")
+
+    return summary
 
 
 if __name__ == "__main__":
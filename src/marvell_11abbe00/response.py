@@ -3,6 +3,10 @@ from typing import Optional
 import xml.etree.ElementTree as ET
 
 
+# leaf fields identifying a row of a WCD table
+KEY_FIELDS = ("interfaceName", "VLANID", "profileIndex", "priority", "sVLANID")
+
+
 class StatusCode(Enum):
     NOT_FOUND = "-1"
     OK = "0"
@@ -43,21 +47,78 @@ class ActionStatus:
         if not actionStatus:
             raise ValueError("Can't find <ActionStatus> root")
 
-        version = get_node_text(actionStatus, "version")
-        requestURL = get_node_text(actionStatus, "requestURL")
-        statusCode = get_node_text(actionStatus, "statusCode")
-        deviceStatusCode = get_node_text(actionStatus, "deviceStatusCode")
-        statusString = get_node_text(actionStatus, "statusString")
+        return cls.from_xml_node(actionStatus)
+
+    @classmethod
+    def from_xml_node(cls, actionStatus: ET.Element) -> "ActionStatus":
+        # fields are direct children, a single pass avoids one tree scan per field
+        fields = {child.tag: child.text for child in actionStatus}
+        statusCode = fields.get("statusCode")
 
         return cls(
-            version=version,
-            requestURL=requestURL,
+            version=fields.get("version"),
+            requestURL=fields.get("requestURL"),
             statusCode=StatusCode(statusCode) if statusCode is not None else None,
-            deviceStatusCode=deviceStatusCode,
-            statusString=statusString,
+            deviceStatusCode=fields.get("deviceStatusCode"),
+            statusString=fields.get("statusString"),
         )
 
 
+class SectionRecord:
+    """
+    A row of a WCD section: the leaf fields of one container element, e.g. an <Entry> of
+    VLANInterfaceISList or the <BridgeSetting> of STP. Fields are reachable as attributes.
+    """
+
+    def __init__(self, section, path, fields):
+        self.section = section
+        self.path = path
+        self.fields = fields
+
+    @property
+    def key(self):
+        return tuple(
+            (name, self.fields[name]) for name in KEY_FIELDS if name in self.fields
+        )
+
+    def get(self, name, default=None):
+        return self.fields.get(name, default)
+
+    def get_int(self, name, default=None):
+        value = self.fields.get(name)
+        if value is None or value == "":
+            return default
+        return int(value)
+
+    def __getitem__(self, name):
+        return self.fields[name]
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__["fields"][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __str__(self):
+        key = " ".join(f"{name}={value}" for name, value in self.key)
+        return f"<SectionRecord {self.section}/{self.path} {key}>"
+
+
+def parse_section_records(sectionNode: ET.Element) -> list:
+    records = []
+
+    def walk(node, path):
+        fields = {child.tag: child.text or "" for child in node if len(child) == 0}
+        if fields:
+            records.append(SectionRecord(sectionNode.tag, path, fields))
+        for child in node:
+            if len(child) > 0:
+                walk(child, f"{path}/{child.tag}" if path else child.tag)
+
+    walk(sectionNode, "")
+    return records
+
+
 class WCDResponse:
     def __init__(self, actionStatus, deviceConfiguration):
         self.actionStatus = actionStatus
@@ -69,3 +130,13 @@ class WCDResponse:
         deviceConfiguration = next(xmltree.iter("DeviceConfiguration"), None)
 
         return cls(actionStatus=actionStatus, deviceConfiguration=deviceConfiguration)
+
+    def section_records(self, section) -> list:
+        records = []
+        if self.deviceConfiguration is None:
+            return records
+
+        for sectionNode in self.deviceConfiguration.findall(section):
+            records.extend(parse_section_records(sectionNode))
+
+        return records
@@ -0,0 +1,274 @@
+import logging
+import random
+import threading
+import time
+
+from marvell_11abbe00.response import StatusCode
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_MAX_RELOGINS = 2
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 10.0
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+
+# what to do with an answer or an error
+RETRY = "retry"
+RELOGIN = "relogin"
+FATAL = "fatal"
+
+STATUS_CLASSES = {
+    StatusCode.OK: None,
+    StatusCode.AUTHENTICATION_ERROR: RELOGIN,
+    StatusCode.PAYLOAD_ERROR: FATAL,
+    StatusCode.NOT_FOUND: FATAL,
+}
+
+# gateway errors in front of the switch, the request may not even have reached it
+RETRYABLE_HTTP_STATUSES = {502, 503, 504}
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class ResponseError(Exception):
+    def __init__(self, message, statusCode=None):
+        super().__init__(message)
+        self.statusCode = statusCode
+
+
+def classify_status(statusCode):
+    """
+    @return None for a successful answer, RELOGIN or FATAL
+    """
+    if statusCode is None:
+        return None
+    return STATUS_CLASSES.get(statusCode, FATAL)
+
+
+def classify_error(error, idempotent=True):
+    """
+    @param idempotent whether sending the request twice is harmless, a `set` is while a
+                      `delete` or a system action isn't
+    @return RETRY or FATAL
+    """
+    # requests is only imported once a request failed, keeping it off the startup path
+    import requests
+
+    if isinstance(error, requests.ConnectTimeout):
+        # the request was never sent
+        return RETRY
+    if isinstance(
+        error,
+        (
+            requests.ConnectionError,
+            requests.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+        ),
+    ):
+        # the switch may have applied the request before the connection broke
+        return RETRY if idempotent else FATAL
+    if isinstance(error, requests.HTTPError):
+        status = getattr(error.response, "status_code", None)
+        if status in RETRYABLE_HTTP_STATUSES:
+            return RETRY if idempotent else FATAL
+    return FATAL
+
+
+def is_transport_error(error):
+    import requests
+
+    return isinstance(error, requests.RequestException)
+
+
+class RetryPolicy:
+    """
+    How many times and how long to wait before sending a request again.
+
+    Delays grow exponentially with full jitter, a random delay between 0 and
+    min(max_delay, base_delay * 2^attempt), so many workers retrying against the same
+    switch spread out.
+
+    @param max_attempts requests sent at most for transport errors, the first included
+    @param max_relogins new sessions requested at most after authentication errors
+    @param call_timeout seconds a call may take, retries included, None for no limit
+    """
+
+    def __init__(
+        self,
+        *,
+        max_attempts=DEFAULT_MAX_ATTEMPTS,
+        max_relogins=DEFAULT_MAX_RELOGINS,
+        base_delay=DEFAULT_BASE_DELAY,
+        max_delay=DEFAULT_MAX_DELAY,
+        call_timeout=None,
+        rng=random.random,
+    ):
+        self.max_attempts = max_attempts
+        self.max_relogins = max_relogins
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.call_timeout = call_timeout
+        self.rng = rng
+
+    def backoff(self, attempt):
+        """
+        @param attempt number of the attempt that just failed, starting at 0
+        """
+        return self.rng() * min(self.max_delay, self.base_delay * 2**attempt)
+
+
+class Deadline:
+    """
+    Point in time after which a call or a whole job gives up
+    """
+
+    def __init__(self, seconds, clock=time.monotonic):
+        self.clock = clock
+        self.expires = clock() + seconds
+
+    def remaining(self):
+        return max(self.expires - self.clock(), 0.0)
+
+    @property
+    def expired(self):
+        return self.clock() >= self.expires
+
+    def check(self):
+        if self.expired:
+            raise DeadlineExceeded("deadline exceeded")
+
+    @staticmethod
+    def earliest(*deadlines):
+        deadlines = [deadline for deadline in deadlines if deadline is not None]
+        if not deadlines:
+            return None
+        return min(deadlines, key=lambda deadline: deadline.remaining())
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a switch after failure_threshold consecutive transport
+    failures. Once reset_timeout seconds passed a single trial request is let through,
+    its success closes the circuit again, its failure keeps it open.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        *,
+        failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+        reset_timeout=DEFAULT_RESET_TIMEOUT,
+        clock=time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.openedAt = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN:
+                if self.clock() - self.openedAt < self.reset_timeout:
+                    raise CircuitOpenError("circuit open")
+                self.state = self.HALF_OPEN
+                self._trial = False
+            if self._trial:
+                raise CircuitOpenError("circuit half open, trial in progress")
+            self._trial = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"circuit opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.openedAt = self.clock()
+                self._trial = False
+
+    def stats(self):
+        return {"state": self.state, "failures": self.failures}
+
+
+def call_with_retry(
+    attempt,
+    *,
+    policy: RetryPolicy,
+    idempotent=True,
+    deadline: Deadline = None,
+    breaker: CircuitBreaker = None,
+    relogin=None,
+    sleep=time.sleep,
+    label="",
+):
+    """
+    Send a request until it succeeds, fails for good or runs out of attempts or time.
+
+    @param attempt callable(deadline) sending the request once and returning
+                   (result, StatusCode of the answer or None)
+    @param relogin callable() getting a new session after an authentication error
+    @return (result of the last attempt, number of requests sent); the result of an
+            answer that can't be fixed by retrying is returned for the caller to report
+    @raise the last transport error once retries are exhausted, DeadlineExceeded or
+           CircuitOpenError
+    """
+    sent = 0
+    relogins = 0
+    while True:
+        if deadline is not None:
+            deadline.check()
+        if breaker is not None:
+            breaker.before_call()
+
+        sent += 1
+        try:
+            result, statusCode = attempt(deadline)
+        except Exception as e:
+            if breaker is not None and is_transport_error(e):
+                breaker.record_failure()
+            elif breaker is not None:
+                breaker.record_success()
+            if classify_error(e, idempotent) != RETRY or sent >= policy.max_attempts:
+                raise
+            logger.warning(f"{label} attempt {sent} failed: {e}")
+        else:
+            if breaker is not None:
+                breaker.record_success()
+            outcome = classify_status(statusCode)
+            if outcome != RELOGIN or relogin is None:
+                return result, sent
+            if relogins >= policy.max_relogins:
+                logger.error(f"{label} still rejected after {relogins} new sessions")
+                return result, sent
+            relogins += 1
+            logger.warning(f"{label} session rejected, login again")
+            relogin()
+            continue
+
+        delay = policy.backoff(sent - 1)
+        if deadline is not None and deadline.remaining() <= delay:
+            raise DeadlineExceeded(f"{label} deadline exceeded after {sent} attempts")
+        sleep(delay)
@@ -0,0 +1,162 @@
+import logging
+import threading
+import time
+
+from marvell_11abbe00.endpoints import get_keep_alive_endpoint
+
+logger = logging.getLogger(__name__)
+
+# web sessions of the switch expire after 10 minutes without requests by default
+DEFAULT_SESSION_IDLE_TIMEOUT = 600.0
+DEFAULT_REFRESH_MARGIN = 60.0
+DEFAULT_KEEP_ALIVE_INTERVAL = 120.0
+
+
+class SwitchSession:
+    """
+    Keeps the sessionID of a SwitchConfigurationManager valid during long jobs.
+
+    Every request made through the manager is recorded; a token left idle close to the
+    switch idle timeout is refreshed with a new login before the next request instead
+    of after an authentication error, and a background thread pings the keep alive
+    endpoint while the session would otherwise sit idle.
+
+    Concurrent workers share a single refresh: logins are serialized and a worker whose
+    token was already replaced by another one's refresh just picks up the new token.
+
+    with SwitchSession(switch, "cisco", "cisco"):
+        replay_entries(switch, entries, "cisco", "cisco")
+
+    @param idle_timeout seconds of inactivity after which the switch drops the session
+    @param refresh_margin log in again when the token is idle for idle_timeout - margin
+    @param keep_alive_interval seconds of inactivity before the keep alive ping, None
+                               disables the background thread
+    """
+
+    def __init__(
+        self,
+        switch,
+        username="cisco",
+        password="cisco",
+        *,
+        idle_timeout=DEFAULT_SESSION_IDLE_TIMEOUT,
+        refresh_margin=DEFAULT_REFRESH_MARGIN,
+        keep_alive_interval=DEFAULT_KEEP_ALIVE_INTERVAL,
+        clock=time.monotonic,
+    ):
+        self.switch = switch
+        self.username = username
+        self.password = password
+        self.idle_timeout = idle_timeout
+        self.refresh_margin = refresh_margin
+        self.keep_alive_interval = keep_alive_interval
+        self.clock = clock
+        self.generation = 0
+        # a token obtained before the session was attached counts as fresh
+        self.lastUsed = clock() if switch.token is not None else None
+        self.logins = 0
+        self.keepAlives = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        switch.session = self
+
+    @property
+    def idle(self):
+        return None if self.lastUsed is None else self.clock() - self.lastUsed
+
+    @property
+    def expiring(self):
+        idle = self.idle
+        return idle is None or idle >= self.idle_timeout - self.refresh_margin
+
+    def _login(self):
+        self.switch.login(self.username, self.password)
+        self.generation += 1
+        self.logins += 1
+        self.lastUsed = self.clock()
+        logger.debug(f"[{self.switch.host}] new session, generation {self.generation}")
+
+    def login(self):
+        with self._lock:
+            self._login()
+        return self.switch.token
+
+    def refresh(self, generation=None):
+        """
+        Log in again unless another worker already did since the given generation
+
+        @param generation the generation of the token found to be rejected or expiring
+        """
+        with self._lock:
+            if generation is None or generation == self.generation:
+                self._login()
+        return self.switch.token
+
+    def ensure_valid(self):
+        """
+        Refresh the token when it is about to expire
+
+        @return the generation of the token to use for the next request
+        """
+        if self.switch.token is None or self.expiring:
+            self.refresh(self.generation)
+        return self.generation
+
+    def touch(self):
+        self.lastUsed = self.clock()
+
+    def keep_alive(self):
+        r = self.switch.transport.get(
+            get_keep_alive_endpoint(self.switch.host),
+            headers={"sessionID": self.switch.token},
+        )
+        self.keepAlives += 1
+        self.touch()
+        return r
+
+    def _keep_alive_loop(self):
+        while not self._stopped.wait(self.keep_alive_interval / 4):
+            idle = self.idle
+            if idle is None or idle < self.keep_alive_interval:
+                continue
+            try:
+                if self.expiring:
+                    self.refresh(self.generation)
+                else:
+                    self.keep_alive()
+            except Exception as e:
+                logger.warning(f"[{self.switch.host}] keep alive failed: {e}")
+
+    def start(self):
+        if self.switch.token is None:
+            self.login()
+        if self.keep_alive_interval is not None and self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._keep_alive_loop,
+                name=f"keep-alive-{self.switch.host}",
+                daemon=True,
+            )
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def stats(self):
+        return {
+            "logins": self.logins,
+            "keep_alives": self.keepAlives,
+            "generation": self.generation,
+        }
@@ -0,0 +1,482 @@
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from marvell_11abbe00.batch import SectionWrite
+from marvell_11abbe00.endpoints import Sections
+from marvell_11abbe00.optimize import build_service_factory, extract_records
+from marvell_11abbe00.response import StatusCode, WCDResponse
+from marvell_11abbe00.retry import ResponseError
+from marvell_11abbe00.session import SwitchSession
+from marvell_11abbe00.switch import SwitchConfigurationManager
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+SNAPSHOT_SECTIONS = tuple(section.value for section in Sections)
+
+# sections per WCD read and reads in flight while taking a snapshot
+DEFAULT_SNAPSHOT_BATCH_SECTIONS = 4
+DEFAULT_SNAPSHOT_MAX_IN_FLIGHT = 4
+
+# fields reporting the state of a port rather than its configuration
+OPERATIONAL_FIELDS = {"linkState", "MACAddress", "portCapabilities"}
+
+
+def is_operational_field(name):
+    return name in OPERATIONAL_FIELDS or "Oper" in name or name.startswith("remote")
+
+
+def normalize_section(sectionNode):
+    """
+    Records of a section read, sorted by path so equal configurations serialize equally
+
+    @return [(path, fields)] where path is ((container tag, key fields), ...)
+    """
+    return sorted(
+        (path, dict(sorted(fields.items())))
+        for (_, path), fields in extract_records(sectionNode)
+    )
+
+
+def _records_to_json(records):
+    return [
+        [[[tag, [list(pair) for pair in key]] for tag, key in path], fields]
+        for path, fields in records
+    ]
+
+
+def _records_from_json(items):
+    return [
+        (tuple((tag, tuple(tuple(pair) for pair in key)) for tag, key in path), fields)
+        for path, fields in items
+    ]
+
+
+def _digest(value):
+    content = json.dumps(value, separators=(",", ":"), sort_keys=True)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def source_digest(sectionNode):
+    """
+    sha256 of a section as the switch sent it, equal digests mean the normalized records
+    are equal too
+    """
+    return hashlib.sha256(ET.tostring(sectionNode)).hexdigest()
+
+
+class SectionSnapshot:
+    """
+    @param source source_digest() of the section read, None when unknown
+    """
+
+    def __init__(self, section, records, fetched, *, source=None, digest=None):
+        self.section = section
+        self.records = records
+        self.fetched = fetched
+        self.source = source
+        self.digest = _digest(_records_to_json(records)) if digest is None else digest
+
+    def rows(self):
+        """
+        @return {path: fields}
+        """
+        return dict(self.records)
+
+
+class Snapshot:
+    """
+    Normalized records of every section of a switch, with a sha256 of the content that
+    only changes when the configuration does: the time each section was read is kept
+    aside.
+    """
+
+    def __init__(self, host, sections, taken=None):
+        self.host = host
+        self.sections = sections
+        self.taken = time.time() if taken is None else taken
+
+    @property
+    def digest(self):
+        return _digest(
+            {name: section.digest for name, section in sorted(self.sections.items())}
+        )
+
+    def to_dict(self):
+        return {
+            "version": SNAPSHOT_FORMAT_VERSION,
+            "host": self.host,
+            "taken": self.taken,
+            "digest": self.digest,
+            "fetched": {
+                name: section.fetched for name, section in sorted(self.sections.items())
+            },
+            "sources": {
+                name: section.source
+                for name, section in sorted(self.sections.items())
+                if section.source is not None
+            },
+            "sections": {
+                name: _records_to_json(section.records)
+                for name, section in sorted(self.sections.items())
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data) -> "Snapshot":
+        if data.get("version") != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {data.get('version')}")
+
+        # snapshots written before the sources were recorded have none
+        sources = data.get("sources", {})
+        snapshot = cls(
+            data["host"],
+            {
+                name: SectionSnapshot(
+                    name,
+                    _records_from_json(items),
+                    data["fetched"][name],
+                    source=sources.get(name),
+                )
+                for name, items in data["sections"].items()
+            },
+            taken=data["taken"],
+        )
+        if snapshot.digest != data["digest"]:
+            raise ValueError(f"Snapshot of {data['host']} doesn't match its digest")
+        return snapshot
+
+    def __str__(self):
+        return (
+            f"<Snapshot {self.host} sections={len(self.sections)} "
+            f"digest={self.digest[:12]}>"
+        )
+
+
+def save_snapshot(snapshot: Snapshot, path):
+    with gzip.open(path, "wt", encoding="utf-8", compresslevel=9) as f:
+        json.dump(snapshot.to_dict(), f, separators=(",", ":"), sort_keys=True)
+
+
+def load_snapshot(path) -> Snapshot:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return Snapshot.from_dict(json.load(f))
+
+
+def fetch_sections(
+    switch: SwitchConfigurationManager,
+    sections,
+    *,
+    batch_sections=DEFAULT_SNAPSHOT_BATCH_SECTIONS,
+    max_in_flight=DEFAULT_SNAPSHOT_MAX_IN_FLIGHT,
+    previous=None,
+):
+    """
+    Read sections with multi-section WCD requests sent concurrently
+
+    @param previous {section: SectionSnapshot} of an earlier read, whose records are
+                    reused for the sections the switch sent back unchanged
+    @return {section: SectionSnapshot}, sections the switch doesn't know are empty
+    @raise ResponseError when a read is answered with an error status
+    """
+    sections = list(sections)
+    batches = []
+    for first in range(0, len(sections), batch_sections):
+        last = first + batch_sections
+        batches.append(sections[first:last])
+
+    def fetch(batch):
+        fetched = time.time()
+        xmltree = switch.fetch_sections_xml(batch)
+        response = WCDResponse.from_xml_response(xmltree)
+        statusCode = response.actionStatus.statusCode
+        if statusCode not in (None, StatusCode.OK):
+            # the sections would be stored empty, as if the switch had no configuration
+            raise ResponseError(
+                f"error response reading {','.join(batch)}: "
+                f"{response.actionStatus.statusString}",
+                statusCode,
+            )
+        deviceConfiguration = response.deviceConfiguration
+        nodes = {
+            node.tag: node
+            for node in (() if deviceConfiguration is None else deviceConfiguration)
+        }
+        result = {}
+        for section in batch:
+            node = nodes.get(section)
+            if node is None:
+                result[section] = SectionSnapshot(section, [], fetched)
+                continue
+            source = source_digest(node)
+            known = (previous or {}).get(section)
+            if known is not None and known.source == source:
+                result[section] = SectionSnapshot(
+                    section, known.records, fetched, source=source, digest=known.digest
+                )
+            else:
+                result[section] = SectionSnapshot(
+                    section, normalize_section(node), fetched, source=source
+                )
+        return result
+
+    result = {}
+    workers = max(1, min(max_in_flight, len(batches)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for fetched in executor.map(fetch, batches):
+            result.update(fetched)
+    return result
+
+
+def take_snapshot(
+    switch: SwitchConfigurationManager,
+    sections=SNAPSHOT_SECTIONS,
+    *,
+    previous: Snapshot = None,
+    batch_sections=DEFAULT_SNAPSHOT_BATCH_SECTIONS,
+    max_in_flight=DEFAULT_SNAPSHOT_MAX_IN_FLIGHT,
+) -> Snapshot:
+    """
+    Read and normalize every section of the switch.
+
+    Every section is read, whoever changed it since the previous snapshot. Given a
+    previous snapshot, the sections the switch sends back byte for byte as then keep
+    their records, only their normalization and digest are skipped.
+    """
+    fetched = fetch_sections(
+        switch,
+        sections,
+        batch_sections=batch_sections,
+        max_in_flight=max_in_flight,
+        previous=None if previous is None else previous.sections,
+    )
+    if previous is not None:
+        unchanged = [
+            name
+            for name in sections
+            if name in previous.sections
+            and fetched[name].digest == previous.sections[name].digest
+        ]
+        logger.info(
+            f"[{switch.host}] snapshot: {len(sections) - len(unchanged)} sections "
+            f"changed, {len(unchanged)} unchanged"
+        )
+
+    return Snapshot(switch.host, {name: fetched[name] for name in sections})
+
+
+def diff_snapshots(before: Snapshot, after: Snapshot):
+    """
+    @return (section, path, field, before, after) for every field that differs, field is
+            None for rows only present on one side
+    """
+    changes = []
+    for name in sorted(set(before.sections) | set(after.sections)):
+        old, new = before.sections.get(name), after.sections.get(name)
+        if old is not None and new is not None and old.digest == new.digest:
+            continue
+        oldRows = old.rows() if old is not None else {}
+        newRows = new.rows() if new is not None else {}
+        for path in sorted(set(oldRows) | set(newRows)):
+            if path not in newRows:
+                changes.append((name, path, None, oldRows[path], None))
+            elif path not in oldRows:
+                changes.append((name, path, None, None, newRows[path]))
+            else:
+                oldFields, newFields = oldRows[path], newRows[path]
+                for field in sorted(set(oldFields) | set(newFields)):
+                    if oldFields.get(field) != newFields.get(field):
+                        changes.append(
+                            (
+                                name,
+                                path,
+                                field,
+                                oldFields.get(field),
+                                newFields.get(field),
+                            )
+                        )
+    return changes
+
+
+def format_path(path):
+    return "/".join(
+        tag + "".join(f"[{name}={value}]" for name, value in key) for tag, key in path
+    )
+
+
+def restore_snapshot(
+    switch: SwitchConfigurationManager,
+    snapshot: Snapshot,
+    sections=None,
+    *,
+    skip_field=is_operational_field,
+):
+    """
+    Write a snapshot back through a reconcile transaction: the current values are read
+    in one request and only the fields that differ are sent, batched.
+
+    @param skip_field predicate on field names left out of the restore, by default the
+                      operational state fields
+    @return the SectionWrites sent or skipped
+    """
+    with switch.reconcile() as tx:
+        for name in sections or sorted(snapshot.sections):
+            records = []
+            for path, fields in snapshot.sections[name].records:
+                keys = {field for _, key in path for field, _ in key}
+                fields = {
+                    field: value
+                    for field, value in fields.items()
+                    if field in keys or not skip_field(field)
+                }
+                if any(field not in keys for field in fields):
+                    records.append(((name, path), fields))
+            if not records:
+                continue
+            tx.submit(
+                SectionWrite(
+                    section=name,
+                    node=build_service_factory(name, records),
+                    query=name,
+                    description=f"error while restoring {name}",
+                )
+            )
+    return tx.results
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Snapshot the configuration of a switch, compare or restore snapshots"
+    )
+    parser.add_argument(
+        "--host",
+        required=False,
+        dest="host",
+        type=str,
+        help="host switch api",
+    )
+    parser.add_argument(
+        "--username",
+        required=False,
+        default="cisco",
+        dest="username",
+        type=str,
+        help="switch api username",
+    )
+    parser.add_argument(
+        "--password",
+        required=False,
+        default="cisco",
+        dest="password",
+        type=str,
+        help="switch api password",
+    )
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument(
+        "--output",
+        dest="output",
+        type=str,
+        help="take a snapshot of --host and write it to this file",
+    )
+    group.add_argument(
+        "--diff",
+        nargs=2,
+        dest="diff",
+        type=str,
+        metavar=("BEFORE", "AFTER"),
+        help="print the differences between two snapshot files",
+    )
+    group.add_argument(
+        "--restore",
+        dest="restore",
+        type=str,
+        help="write this snapshot back to --host",
+    )
+    parser.add_argument(
+        "--previous",
+        required=False,
+        dest="previous",
+        type=str,
+        help="previous snapshot of the host, sections read back unchanged aren't parsed again",
+    )
+    parser.add_argument(
+        "--section",
+        required=False,
+        action="append",
+        dest="sections",
+        type=str,
+        help="limit the snapshot or the restore to this section, can be repeated",
+    )
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(encoding="utf-8", level=logging.INFO)
+
+    if args.diff is None and args.host is None:
+        parser.error("--host is required to take or restore a snapshot")
+    run(args)
+
+
+def run(args, switch: SwitchConfigurationManager = None):
+    """
+    Take, compare or restore snapshots with the parsed command line arguments
+
+    @param switch manager whose open session is reused, as the daemon does; it stays
+                  open afterwards. A new one is logged in and closed when None
+    """
+    if args.diff:
+        for name, path, field, before, after in diff_snapshots(
+            load_snapshot(args.diff[0]), load_snapshot(args.diff[1])
+        ):
+            print(f"{name} {format_path(path)} {field or '(row)'}: {before} -> {after}")
+        return
+
+    owned = switch is None
+    if owned:
+        from marvell_11abbe00.transport import SwitchTransport
+
+        switch = SwitchConfigurationManager(args.host, transport=SwitchTransport())
+    try:
+        with (
+            SwitchSession(switch, args.username, args.password)
+            if owned
+            else nullcontext()
+        ):
+            if args.restore:
+                writes = restore_snapshot(
+                    switch, load_snapshot(args.restore), args.sections
+                )
+                logger.info(
+                    f"restored {len([write for write in writes if not write.skipped])} "
+                    f"sections, {len([write for write in writes if write.skipped])} "
+                    "already matching"
+                )
+            else:
+                previous = load_snapshot(args.previous) if args.previous else None
+                snapshot = take_snapshot(
+                    switch,
+                    args.sections or SNAPSHOT_SECTIONS,
+                    previous=previous,
+                )
+                save_snapshot(snapshot, args.output)
+                logger.info(f"{snapshot} written to {args.output}")
+    finally:
+        if owned:
+            switch.transport.close()
+
+
+if __name__ == "__main__":
+    main()
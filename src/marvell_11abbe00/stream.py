@@ -0,0 +1,138 @@
+import xml.etree.ElementTree as ET
+
+from marvell_11abbe00.response import ActionStatus, SectionRecord
+
+DEFAULT_CHUNK_SIZE = 8192
+
+
+class WCDStreamParser:
+    """
+    Incremental parser of WCD responses built on XMLPullParser.
+
+    Chunks of the body are fed as they are downloaded and ActionStatus / SectionRecord
+    items are returned as soon as their element is complete. Completed rows are dropped
+    from the partial tree, so memory stays bounded by the largest row rather than by the
+    whole response.
+
+    Records of a container holding both fields and nested rows come after those rows,
+    unlike parse_section_records which lists the container first.
+    """
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._stack = []
+        # one [fields, has child elements] pair per open element of the current section
+        self._rows = []
+        self._section = None
+        self.actionStatuses = []
+
+    def feed(self, data) -> list:
+        self._parser.feed(data)
+        return self._read_events()
+
+    def close(self) -> list:
+        self._parser.close()
+        return self._read_events()
+
+    @property
+    def actionStatus(self):
+        return self.actionStatuses[0] if self.actionStatuses else None
+
+    def _read_events(self):
+        items = []
+        for event, node in self._parser.read_events():
+            if event == "start":
+                self._start(node)
+            else:
+                item = self._end(node)
+                if item is not None:
+                    items.append(item)
+        return items
+
+    def _start(self, node):
+        if self._section is not None:
+            self._rows[-1][1] = True
+            self._rows.append([{}, False])
+        elif (
+            node.get("type") == "section"
+            and self._stack
+            and self._stack[-1].tag == "DeviceConfiguration"
+        ):
+            self._section = node.tag
+            self._rows.append([{}, False])
+        self._stack.append(node)
+
+    def _end(self, node):
+        self._stack.pop()
+        parent = self._stack[-1] if self._stack else None
+
+        if self._section is None:
+            if node.tag != "ActionStatus":
+                return None
+            actionStatus = ActionStatus.from_xml_node(node)
+            self.actionStatuses.append(actionStatus)
+            self._drop(node, parent)
+            return actionStatus
+
+        fields, hasChildren = self._rows.pop()
+        if self._rows and not hasChildren:
+            self._rows[-1][0][node.tag] = node.text or ""
+            self._drop(node, parent)
+            return None
+
+        self._drop(node, parent)
+        section = self._section
+        if not self._rows:
+            self._section = None
+            path = ""
+        else:
+            # the open elements below the section are the containers of this row
+            first = len(self._stack) - len(self._rows) + 1
+            containers = self._stack[first:] + [node]
+            path = "/".join(element.tag for element in containers)
+
+        if fields:
+            return SectionRecord(section, path, fields)
+        return None
+
+    @staticmethod
+    def _drop(node, parent):
+        if parent is not None:
+            parent.remove(node)
+        node.clear()
+
+
+def iter_response(chunks):
+    """
+    Parse a WCD response from an iterable of byte or str chunks.
+
+    @return generator of ActionStatus and SectionRecord items in document order
+    """
+    parser = WCDStreamParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+def is_section_record(item, section=None):
+    return isinstance(item, SectionRecord) and (
+        section is None or item.section == section
+    )
+
+
+def iter_section_records(chunks, section=None):
+    for item in iter_response(chunks):
+        if is_section_record(item, section):
+            yield item
+
+
+def parse_action_status(text):
+    """
+    Single pass extraction of the first ActionStatus of a response body
+    """
+    parser = WCDStreamParser()
+    parser.feed(text)
+    parser.close()
+    if parser.actionStatus is None:
+        raise ValueError("Can't find <ActionStatus> root")
+    return parser.actionStatus
@@ -1,11 +1,15 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-import urllib3
-import requests
+from functools import wraps
+from itertools import chain
 import logging
+import time
 
 from marvell_11abbe00.endpoints import (
     Sections,
     SystemActions,
+    expand_interfaces,
     get_login_endpoint,
     get_section_query,
     get_system_action_endpoint,
@@ -15,94 +19,268 @@ from marvell_11abbe00.builder import (
     VLAN,
     BridgeSetting,
     CurrentLocalTime,
-    DeviceConfiguration,
     GlobalSetting,
     InterfaceEntry,
     ServiceFactory,
-    Version,
     Entry,
     Value,
 )
+from marvell_11abbe00.batch import (
+    DEFAULT_BATCH_MAX_SECTIONS,
+    SectionWrite,
+    SwitchTransaction,
+    build_queries,
+)
 import xml.etree.ElementTree as ET
 
+from marvell_11abbe00.cache import SectionCache
+from marvell_11abbe00.instrument import (
+    Observable,
+    RequestEvent,
+    interface_of,
+    observed,
+)
+from marvell_11abbe00.reconcile import ReconcileTransaction
 from marvell_11abbe00.response import ActionStatus, StatusCode
+from marvell_11abbe00.retry import (
+    CircuitBreaker,
+    Deadline,
+    ResponseError,
+    RetryPolicy,
+    call_with_retry,
+)
+from marvell_11abbe00.stream import (
+    DEFAULT_CHUNK_SIZE,
+    is_section_record,
+    iter_response,
+    parse_action_status,
+)
+from marvell_11abbe00.template import (
+    PAYLOAD_BACKEND_TEMPLATE,
+    TemplateNode,
+    entry_template,
+    serialize_payload,
+)
+from marvell_11abbe00.throttle import limited
+from marvell_11abbe00.vlans import (
+    VLANSet,
+    as_vlan_set,
+    interface_vlan_sets,
+    is_vlan_set_field,
+)
 
 logger = logging.getLogger(__name__)
 
-urllib3.disable_warnings()
-urllib3.util.url._QUERY_CHARS.add("{")
-urllib3.util.url._QUERY_CHARS.add("}")
+# per interface requests of a bulk setter in flight at once
+DEFAULT_BULK_MAX_IN_FLIGHT = 4
 
 
 def handle_response_code(request):
-    xmltree = ET.fromstring(request.text)
-    actionStatus = ActionStatus.from_xml_response(xmltree)
+    actionStatus = parse_action_status(request.text)
     if actionStatus.statusCode is not None and actionStatus.statusCode != StatusCode.OK:
-        raise Exception(f"error response: {actionStatus.statusString}")
+        raise ResponseError(
+            f"error response: {actionStatus.statusString}", actionStatus.statusCode
+        )
 
     return True
 
 
-class SwitchConfigurationManager:
-    def is_authenticated(func):
-        def inner(*args, **kwargs):
-            if args[0].token is None:
-                raise Exception("Method should be called in an authenticated context")
-            func(*args, **kwargs)
+def session_id_from_login(status_code, text, headers):
+    if status_code != 200:
+        raise Exception("Invalid HTTP status code")
+
+    actionStatus = parse_action_status(text)
+    if actionStatus.statusCode is not None and actionStatus.statusCode != StatusCode.OK:
+        raise Exception(f"error response: {actionStatus.statusString}")
+
+    sessionid = headers.get("sessionID")
+    if not sessionid:
+        raise Exception("Error while login: sessionID not found")
 
-        return inner
+    return sessionid
 
-    def __init__(self, host):
-        self.host = host
-        self.token = None
 
-    def login(self, user="cisco", password="cisco"):
-        r = requests.get(
-            get_login_endpoint(self.host, user=user, password=password), verify=False
+def assign_action_statuses(writes, body):
+    """
+    Map the ActionStatus nodes of a WCD response back to the writes sent in the request.
+
+    When the switch answers with fewer statuses than writes, e.g. a single one, they
+    only apply to all the writes when they are all OK. Otherwise which writes failed,
+    and whether the others were applied, is unknown: their actionStatus is left None.
+
+    @return StatusCode of the request, that of its first failed ActionStatus if any
+    """
+    statuses = [
+        item for item in iter_response([body]) if isinstance(item, ActionStatus)
+    ]
+    if not statuses:
+        raise ValueError("Can't find <ActionStatus> root")
+    failed = [
+        status for status in statuses if status.statusCode not in (None, StatusCode.OK)
+    ]
+    if len(statuses) != len(writes):
+        statuses = [None if failed else statuses[0]] * len(writes)
+
+    for write, actionStatus in zip(writes, statuses):
+        write.actionStatus = actionStatus
+
+    if failed:
+        return failed[0].statusCode
+    return statuses[0].statusCode
+
+
+def record_bulk_error(host, error, writes):
+    for write in writes:
+        logger.error(f"[{host}] {write.key}: {error}")
+        write.error = error
+
+
+def check_write(write):
+    if not write.ok:
+        raise Exception(
+            f"error response: {write.actionStatus.statusString}"
+            if write.actionStatus is not None
+            else write.description
         )
-        if r.status_code != 200:
-            raise Exception("Invalid HTTP status code")
 
-        if not handle_response_code(r):
-            raise Exception("error while login")
+    return write
 
-        sessionid = r.headers.get("sessionID")
-        if not sessionid:
-            raise Exception("Error while login: sessionID not found")
 
-        self.token = r.headers["sessionID"]
-        return self.token
+def _counted(chunks, event):
+    for chunk in chunks:
+        event.responseBytes += len(chunk)
+        yield chunk
+
+
+def check_read_status(event, actionStatus):
+    event.statusCode = actionStatus.statusCode
+    if actionStatus.statusCode not in (None, StatusCode.OK):
+        raise ResponseError(
+            f"error response: {actionStatus.statusString}", actionStatus.statusCode
+        )
+
+
+def interface_container(section):
+    if section in (
+        Sections.LLDP_INTERFACE_LIST.value,
+        Sections.STANDARD_8021X_INTERFACE_LIST.value,
+    ):
+        return InterfaceEntry().tag
+    return Entry().tag
+
+
+def interface_section_write(section, interfaceNames, settings=None):
+    """
+    `set` of the same settings on one or several interface rows of a section. A single
+    interface is addressed through its own query, several through the bare section.
+    """
+    fields = [item for entry in settings or [] for item in entry.items()]
+    values = [str(value) for _, value in fields]
+    node = TemplateNode(
+        entry_template(
+            section,
+            interface_container(section),
+            ("interfaceName", *(key for key, _ in fields)),
+            len(interfaceNames),
+        ),
+        [value for name in interfaceNames for value in (name, *values)],
+    )
+
+    if len(interfaceNames) == 1:
+        query = get_section_query(section, {"interfaceName": interfaceNames[0]})
+    else:
+        query = section
+    return SectionWrite(
+        section=section,
+        node=node,
+        query=query,
+        description=f"error while setting interface {section} settings",
+    )
+
+
+def assign_bulk_status(merged, writes):
+    for write in writes.values():
+        write.actionStatus = merged.actionStatus
+
+
+def section_query(section, interfaceName=None):
+    """
+    @return the section name and the WCD query reading it, optionally for one interface
+    """
+    section = section.value if isinstance(section, Sections) else section
+    if interfaceName is None:
+        return section, section
+    return section, get_section_query(section, {"interfaceName": interfaceName})
+
+
+def is_authenticated(func):
+    @wraps(func)
+    def inner(*args, **kwargs):
+        if args[0].token is None:
+            raise Exception("Method should be called in an authenticated context")
+        return func(*args, **kwargs)
+
+    return inner
+
+
+class SwitchOperations(Observable):
+    """
+    Setters shared by the blocking and asyncio managers. Every setter builds a
+    SectionWrite and hands it to submit(), which is where the I/O happens.
+    """
+
+    # builder serializes through ElementTree, template renders cached XML skeletons
+    payload_backend = PAYLOAD_BACKEND_TEMPLATE
+
+    def __init__(self, host, cache=None):
+        self.host = host
+        self.token = None
+        self.session = None
+        self.cache = SectionCache() if cache is None else cache
+        self.observers = []
+        # sections found to reject several interface rows in a single ServiceFactory
+        self.singleRowSections = set()
+        self.retry_policy = RetryPolicy()
+        self.breaker = CircuitBreaker()
+        # job wide retry.Deadline, every call gives up once it expires
+        self.deadline = None
+        # throttle.AdaptiveLimiter pacing the requests to the host, None for no limit
+        self.limiter = None
+        self._transaction = None
+
+    def notify(self, event):
+        if self.limiter is not None:
+            event.limits = self.limiter.stats()
+        super().notify(event)
+
+    def submit(self, write):
+        raise NotImplementedError
+
+    def set_interfaces_section_settings(self, *, section, interfaces, settings=None):
+        raise NotImplementedError
 
     @is_authenticated
     def set_max_idle_timeout(self, timeout=0):
-        payload = (
-            DeviceConfiguration()
-            .append(Version("1.0"))
-            .append(
-                ServiceFactory(
+        return self.submit(
+            SectionWrite(
+                section=Sections.EWS_SERVICE_TABLE.value,
+                node=ServiceFactory(
                     serviceName=Sections.EWS_SERVICE_TABLE.value, action="set"
                 ).append(
                     Entry().append(Value(key="maxIdleTimeout", value=str(timeout)))
-                )
+                ),
+                description="error while setting idle timeout",
             )
-        ).build()
-
-        xml = ET.tostring(payload, encoding="utf8")
-        r = requests.post(
-            get_wcd_endpoint(self.host, []),
-            data=xml,
-            verify=False,
-            headers={"sessionID": self.token},
         )
 
-        if not handle_response_code(r):
-            raise Exception("error while setting idle timeout")
-
     @is_authenticated
     def set_time(self, date=datetime.today()):
-        payload = (
-            DeviceConfiguration().append(
-                ServiceFactory(serviceName=Sections.TIME_SETTING.value, action="set")
+        return self.submit(
+            SectionWrite(
+                section=Sections.TIME_SETTING.value,
+                node=ServiceFactory(
+                    serviceName=Sections.TIME_SETTING.value, action="set"
+                )
                 .append(Value(key="setTimeMode", value=str(1)))
                 .append(
                     CurrentLocalTime()
@@ -112,122 +290,71 @@ class SwitchConfigurationManager:
                     .append(Value(key="hour", value=str(date.hour)))
                     .append(Value(key="minute", value=str(date.minute)))
                     .append(Value(key="second", value=str(date.second)))
-                )
+                ),
+                versioned=False,
+                description="error while setting time",
             )
-        ).build()
-
-        xml = ET.tostring(payload, encoding="utf8")
-        r = requests.post(
-            get_wcd_endpoint(self.host, []),
-            data=xml,
-            verify=False,
-            headers={"sessionID": self.token},
         )
 
-        if not handle_response_code(r):
-            raise Exception("error while setting time")
-
     @is_authenticated
     def set_vlan_id(self, vlanid):
-        payload = (
-            DeviceConfiguration()
-            .append(Version("1.0"))
-            .append(
-                ServiceFactory(
+        return self.submit(
+            SectionWrite(
+                section=Sections.VLAN_LIST.value,
+                node=ServiceFactory(
                     serviceName=Sections.VLAN_LIST.value, action="set"
-                ).append(VLAN().append(Value(key="VLANID", value=str(vlanid))))
+                ).append(VLAN().append(Value(key="VLANID", value=str(vlanid)))),
+                query=Sections.VLAN_LIST.value,
+                description="error while setting vlan id",
             )
-        ).build()
-
-        xml = ET.tostring(payload, encoding="utf8")
-        r = requests.post(
-            get_wcd_endpoint(self.host, [Sections.VLAN_LIST.value]),
-            data=xml,
-            verify=False,
-            headers={"sessionID": self.token},
         )
 
-        if not handle_response_code(r):
-            raise Exception("error while setting vlan id")
-
     @is_authenticated
     def set_section_settings(self, *, section, settings=None):
-        entries = Entry()
-        for entry in settings or []:
-            for key, value in entry.items():
-                entries = entries.append(Value(key=key, value=str(value)))
-
-        payload = (
-            DeviceConfiguration()
-            .append(Version("1.0"))
-            .append(ServiceFactory(serviceName=section, action="set").append(entries))
-        ).build()
-
-        xml = ET.tostring(payload, encoding="utf8")
-        url = get_wcd_endpoint(
-            self.host,
-            [section],
+        fields = [item for entry in settings or [] for item in entry.items()]
+        node = TemplateNode(
+            entry_template(section, "Entry", tuple(key for key, _ in fields)),
+            [str(value) for _, value in fields],
         )
 
-        logger.debug(f"url: {url}")
-        logger.debug(f"payload: {ET.tostring(payload)}")
-
-        r = requests.post(
-            url,
-            data=xml,
-            verify=False,
-            headers={"sessionID": self.token},
+        return self.submit(
+            SectionWrite(
+                section=section,
+                node=node,
+                query=section,
+                description=f"error while setting interface {section} settings",
+            )
         )
 
-        logger.debug(f"response: {ET.tostring(ET.fromstring(r.text))}")
-
-        if not handle_response_code(r):
-            raise Exception(f"error while setting interface {section} settings")
-
     @is_authenticated
     def set_interface_section_settings(self, *, section, interfaceName, settings=None):
-        Container = (
-            InterfaceEntry
-            if section == Sections.LLDP_INTERFACE_LIST.value
-            or section == Sections.STANDARD_8021X_INTERFACE_LIST.value
-            else Entry
-        )
-        entries = Container().append(Value(key="interfaceName", value=interfaceName))
-        for entry in settings or []:
-            for key, value in entry.items():
-                entries = entries.append(Value(key=key, value=str(value)))
-
-        payload = (
-            DeviceConfiguration()
-            .append(Version("1.0"))
-            .append(ServiceFactory(serviceName=section, action="set").append(entries))
-        ).build()
-
-        xml = ET.tostring(payload, encoding="utf8")
-        url = get_wcd_endpoint(
-            self.host,
-            [
-                get_section_query(
-                    section,
-                    {"interfaceName": interfaceName},
-                )
-            ],
-        )
-
-        logger.debug(f"url: {url}")
-        logger.debug(f"payload: {ET.tostring(payload)}")
-
-        r = requests.post(
-            url,
-            data=xml,
-            verify=False,
-            headers={"sessionID": self.token},
-        )
-
-        logger.debug(f"response: {ET.tostring(ET.fromstring(r.text))}")
+        return self.submit(interface_section_write(section, [interfaceName], settings))
 
-        if not handle_response_code(r):
-            raise Exception(f"error while setting interface {section} settings")
+    def plan_bulk_writes(self, section, interfaces, settings):
+        """
+        @return the interface names, one SectionWrite per interface, and the write of all
+                of them as rows of a single ServiceFactory, None when the section is
+                known not to accept it
+        """
+        names = expand_interfaces(interfaces)
+        if isinstance(settings, dict):
+            settings = [settings]
+        writes = {
+            name: interface_section_write(section, [name], settings) for name in names
+        }
+        merged = None
+        if len(names) > 1 and section not in self.singleRowSections:
+            merged = interface_section_write(section, names, settings)
+        return names, writes, merged
+
+    def learn_bulk_support(self, section, merged, writes):
+        """
+        Remember the sections rejecting several rows in one request while accepting the
+        same settings one interface at a time
+        """
+        if merged is not None and all(write.ok for write in writes.values()):
+            logger.info(f"[{self.host}] {section} only accepts one row per request")
+            self.singleRowSections.add(section)
 
     @is_authenticated
     def set_interface_vlan_settings(self, *, interfaceName, settings):
@@ -269,6 +396,14 @@ class SwitchConfigurationManager:
             settings=settings,
         )
 
+    @is_authenticated
+    def set_poe_pse_interfaces_settings(self, *, interfaces, settings):
+        return self.set_interfaces_section_settings(
+            section=Sections.POE_PSE_INTERFACE_LIST.value,
+            interfaces=interfaces,
+            settings=settings,
+        )
+
     @is_authenticated
     def set_stp_settings(
         self,
@@ -280,11 +415,12 @@ class SwitchConfigurationManager:
         pathCostDefaultValueType,
         bridgePriority,
     ):
-        payload = (
-            DeviceConfiguration()
-            .append(Version("1.0"))
-            .append(
-                ServiceFactory(serviceName=Sections.STP.value, action="set").append(
+        return self.submit(
+            SectionWrite(
+                section=Sections.STP.value,
+                node=ServiceFactory(
+                    serviceName=Sections.STP.value, action="set"
+                ).append(
                     GlobalSetting()
                     .append(
                         Value(key="BPDUHandlingMode", value=bpduHandlingMode).append(
@@ -301,21 +437,12 @@ class SwitchConfigurationManager:
                         .append(Value(key="maxAge", value=maxAge))
                         .append(Value(key="bridgePriority", value=bridgePriority))
                     )
-                )
+                ),
+                query=Sections.STP.value,
+                description="error while setting stp settings",
             )
-        ).build()
-
-        xml = ET.tostring(payload, encoding="utf8")
-        r = requests.post(
-            get_wcd_endpoint(self.host, [Sections.STP.value]),
-            data=xml,
-            verify=False,
-            headers={"sessionID": self.token},
         )
 
-        if not handle_response_code(r):
-            raise Exception("error while setting stp settings")
-
     @is_authenticated
     def set_stp_global_settings(self, *, settings):
         return self.set_section_settings(
@@ -330,6 +457,14 @@ class SwitchConfigurationManager:
             settings=settings,
         )
 
+    @is_authenticated
+    def set_security_interfaces_settings(self, *, interfaces, settings):
+        return self.set_interfaces_section_settings(
+            section=Sections.INTERFACE_SECURITY_TABLE.value,
+            interfaces=interfaces,
+            settings=settings,
+        )
+
     @is_authenticated
     def set_forwarding_global_settings(self, *, settings):
         return self.set_section_settings(
@@ -352,17 +487,426 @@ class SwitchConfigurationManager:
             settings=settings,
         )
 
+
+class SwitchConfigurationManager(SwitchOperations):
+    def __init__(self, host, transport=None, cache=None):
+        super().__init__(host, cache=cache)
+        if transport is None:
+            # imported here so the modules only building payloads don't load requests
+            from marvell_11abbe00.transport import SwitchTransport
+
+            transport = SwitchTransport()
+        self.transport = transport
+
+    def login(self, user="cisco", password="cisco"):
+        event = RequestEvent(host=self.host, method="GET", kind="login")
+        with observed(self, event):
+
+            def attempt(deadline):
+                r = self.transport.get(
+                    get_login_endpoint(self.host, user=user, password=password),
+                    deadline=deadline,
+                )
+                event.record_response(r)
+                return r, None
+
+            r, sent = self.call_with_retry(attempt, label=f"[{self.host}] login")
+            event.retries = sent - 1
+            self.token = session_id_from_login(r.status_code, r.text, r.headers)
+        return self.token
+
+    def batch(self, *, max_sections=DEFAULT_BATCH_MAX_SECTIONS, isolate_failures=True):
+        """
+        Queue every set operation issued inside the block and flush them on exit as the
+        fewest possible multi-section WCD requests.
+
+        with switch.batch() as tx:
+            tx.set_poe_pse_interface_settings(interfaceName="gi0", settings=[...])
+            tx.set_security_interface_settings(interfaceName="gi0", settings=[...])
+        """
+        return self._transaction_scope(
+            SwitchTransaction(
+                self, max_sections=max_sections, isolate_failures=isolate_failures
+            )
+        )
+
+    def reconcile(self, *, max_sections=DEFAULT_BATCH_MAX_SECTIONS):
+        """
+        Like batch(), but the current values of every targeted section are read first
+        with a single WCD GET and only the fields that differ are sent. Writes already
+        matching the switch are marked as skipped.
+        """
+        return self._transaction_scope(
+            ReconcileTransaction(self, max_sections=max_sections)
+        )
+
+    @contextmanager
+    def _transaction_scope(self, transaction):
+        if self._transaction is not None:
+            yield self._transaction
+            return
+
+        self._transaction = transaction
+        try:
+            yield transaction
+        except BaseException:
+            transaction.discard()
+            raise
+        finally:
+            self._transaction = None
+
+        transaction.flush()
+        failures = transaction.failures
+        if failures:
+            raise Exception(
+                "error while flushing batch: "
+                + ", ".join(f"{write.key} ({write.description})" for write in failures)
+            )
+
+    def submit(self, write):
+        """
+        Send a section write right away or queue it when a batch is in progress
+        """
+        if self._transaction is not None:
+            return self._transaction.queue(write)
+
+        self.post_writes([write])
+        return check_write(write)
+
     @is_authenticated
-    def get_sections_xml(self, sections=[]):
+    def set_interfaces_section_settings(
+        self,
+        *,
+        section,
+        interfaces,
+        settings=None,
+        max_in_flight=DEFAULT_BULK_MAX_IN_FLIGHT,
+    ):
+        """
+        Apply the same settings to many interfaces of a section with the fewest requests:
+        all the interfaces as rows of a single ServiceFactory, or one request per
+        interface, max_in_flight at a time, for sections the switch rejects that on.
+        Inside a batch the per interface writes are queued instead.
+
+        switch.set_poe_pse_interfaces_settings(interfaces="gi0-7", settings={"adminEnable": "1"})
+
+        @param interfaces port list with ranges, e.g. "gi0-7,te1-4" or ["gi0-3", "te1"]
+        @param settings dict of fields, or list of dicts like the single interface setters
+        @return dict of interface name to its SectionWrite, failures aren't raised: a
+                rejected write has an error actionStatus, a write whose request failed
+                has the exception in its error attribute
+        """
+        names, writes, merged = self.plan_bulk_writes(section, interfaces, settings)
+        if not names:
+            return writes
+        if self._transaction is not None:
+            for write in writes.values():
+                self._transaction.queue(write)
+            return writes
+
+        if merged is not None:
+            try:
+                self.post_writes([merged])
+            except Exception as e:
+                # the rows may have been applied, don't send them again one by one
+                record_bulk_error(self.host, e, writes.values())
+                return writes
+            if merged.ok:
+                assign_bulk_status(merged, writes)
+                return writes
+            logger.debug(f"[{self.host}] {section} rows rejected, one per request")
+
+        def post(write):
+            try:
+                self.post_writes([write])
+            except Exception as e:
+                record_bulk_error(self.host, e, [write])
+
+        with ThreadPoolExecutor(max_workers=min(max_in_flight, len(names))) as executor:
+            for _ in executor.map(post, writes.values()):
+                pass
+
+        self.learn_bulk_support(section, merged, writes)
+        return writes
+
+    @is_authenticated
+    def post_writes(self, writes):
+        """
+        Send one or more section writes in a single WCD request and map the resulting
+        ActionStatus back to every write. Transport errors are retried and rejected
+        sessions renewed according to retry_policy.
+        """
+        event = RequestEvent(
+            host=self.host,
+            method="POST",
+            kind="write",
+            sections=[write.section for write in writes],
+            interfaces=[interface_of(write.query) for write in writes],
+        )
+        with observed(self, event):
+            xml = serialize_payload(writes, self.payload_backend)
+            url = get_wcd_endpoint(self.host, build_queries(writes))
+            event.payloadBytes = len(xml)
+
+            logger.debug(f"url: {url}")
+            logger.debug(f"payload: {xml}")
+
+            generation = None
+            statusCode = None
+
+            def attempt(deadline):
+                nonlocal generation, statusCode
+                headers, generation = self.session_headers()
+                r = self.transport.post(
+                    url, data=xml, headers=headers, deadline=deadline
+                )
+                self.mark_session_used()
+                event.record_response(r)
+                for write in writes:
+                    self.cache.invalidate(write.section)
+
+                logger.debug(f"response: {r.text}")
+
+                started = time.perf_counter()
+                statusCode = assign_action_statuses(writes, r.content)
+                event.timings["parse"] = time.perf_counter() - started
+                return r, statusCode
+
+            _, sent = self.call_with_retry(
+                attempt,
+                idempotent=all(write.idempotent for write in writes),
+                relogin=(
+                    None if self.session is None else lambda: self.relogin(generation)
+                ),
+                label=f"[{self.host}] write {writes[0].key}",
+            )
+            event.retries = sent - 1
+            event.statusCode = statusCode
+
+        return writes
+
+    def call_with_retry(
+        self, attempt, *, idempotent=True, relogin=None, label="", streamed=False
+    ):
+        """
+        Run a request attempt under the retry policy, the call timeout, the job deadline,
+        the circuit breaker and the limiter of the host
+
+        @param streamed the attempt returns once the first bytes of the response arrived,
+                        the limiter doesn't take its duration for a latency
+        """
+        if self.limiter is not None:
+            attempt = limited(self.limiter, attempt, sample=not streamed)
+        callDeadline = (
+            Deadline(self.retry_policy.call_timeout)
+            if self.retry_policy.call_timeout is not None
+            else None
+        )
+        return call_with_retry(
+            attempt,
+            policy=self.retry_policy,
+            idempotent=idempotent,
+            deadline=Deadline.earliest(self.deadline, callDeadline),
+            breaker=self.breaker,
+            relogin=relogin,
+            label=label or f"[{self.host}]",
+        )
+
+    def relogin(self, generation):
+        self.session.refresh(generation)
+
+    def session_headers(self):
+        """
+        @return the request headers and the session generation they were built from
+        """
+        generation = self.session.ensure_valid() if self.session is not None else None
+        return {"sessionID": self.token}, generation
+
+    def mark_session_used(self):
+        if self.session is not None:
+            self.session.touch()
+
+    @is_authenticated
+    def fetch_sections_xml(self, sections=[]):
         endpoint = get_wcd_endpoint(self.host, sections)
-        http = urllib3.PoolManager(cert_reqs="CERT_NONE")
-        r = http.request(
-            "GET",
-            endpoint,
-            headers={"sessionID": self.token},
+        event = self._read_event(sections)
+        with observed(self, event):
+            generation = None
+
+            def attempt(deadline):
+                nonlocal generation
+                headers, generation = self.session_headers()
+                r = self.transport.get(endpoint, headers=headers, deadline=deadline)
+                self.mark_session_used()
+                event.record_response(r)
+
+                started = time.perf_counter()
+                xmltree = ET.fromstring(r.content)
+                event.timings["parse"] = time.perf_counter() - started
+                actionStatus = next(xmltree.iter("ActionStatus"), None)
+                return xmltree, (
+                    ActionStatus.from_xml_node(actionStatus).statusCode
+                    if actionStatus is not None
+                    else None
+                )
+
+            xmltree, sent = self.call_with_retry(
+                attempt,
+                relogin=(
+                    None if self.session is None else lambda: self.relogin(generation)
+                ),
+                label=f"[{self.host}] read {','.join(sections)}",
+            )
+            event.retries = sent - 1
+
+        return xmltree
+
+    def _read_event(self, queries):
+        return RequestEvent(
+            host=self.host,
+            method="GET",
+            kind="read",
+            sections=[query.partition("&")[0] for query in queries],
+            interfaces=[interface_of(query) for query in queries],
+        )
+
+    @is_authenticated
+    def get_section(self, section, interfaceName=None, *, max_age=None):
+        """
+        Read the records of a section, optionally restricted to one interface.
+
+        Reads are served from the per-host cache while younger than max_age (the cache
+        TTL by default), max_age=0 forces a fresh read.
+        """
+        section, query = section_query(section, interfaceName)
+        records = self.cache.get((section, query), max_age)
+        if records is None:
+            records = list(self.stream_section_records([query], section))
+            self.cache.put((section, query), records)
+
+        return records
+
+    @is_authenticated
+    def get_interface_vlans(self, interfaces=None, *, max_age=None):
+        """
+        VLAN lists of interfaces, read with a single request of VLANInterfaceISList
+
+        @param interfaces port list with ranges such as "te1-4", every interface when None
+        @return {interfaceName: {field: VLANSet}}
+        """
+        memberships = interface_vlan_sets(
+            self.get_section(Sections.VLAN_INTERFACE_IS_LIST, max_age=max_age)
         )
+        if interfaces is None:
+            return memberships
+        return {
+            name: memberships.get(name, {}) for name in expand_interfaces(interfaces)
+        }
 
-        xmltree = ET.fromstring(r.data)
+    @is_authenticated
+    def update_interface_vlans(
+        self, *, interfaces, field="trunkMemberVLANs", add=None, remove=None
+    ):
+        """
+        Add VLANs to and remove VLANs from a VLAN list of interfaces. The current lists
+        are read first and only the interfaces whose list actually changes are written,
+        in a single batch, with the list in its shortest range form.
+
+        switch.update_interface_vlans(interfaces="te1-4", add="2350-2351", remove=[2363])
+
+        @param field trunkMemberVLANs, generalTaggedVLANs or generalUntaggedVLANs
+        @param add VLANSet, range string or iterable of VLAN IDs
+        @param remove VLANSet, range string or iterable of VLAN IDs
+        @return dict of interface name to its SectionWrite, for the interfaces written
+        """
+        if not is_vlan_set_field(field):
+            raise ValueError(f"{field} isn't a VLAN list field")
+        add = as_vlan_set(add or ())
+        remove = as_vlan_set(remove or ())
+
+        writes = {}
+        with self.batch() as tx:
+            for name, fields in self.get_interface_vlans(interfaces, max_age=0).items():
+                before = fields.get(field, VLANSet())
+                after = (before | add) - remove
+                if after == before:
+                    continue
+                writes[name] = tx.set_interface_vlan_settings(
+                    interfaceName=name, settings=[{field: after}]
+                )
+        logger.info(
+            f"[{self.host}] {field}: {len(writes)} interfaces changed, "
+            f"+{add or '-'} -{remove or '-'}"
+        )
+        return writes
+
+    @is_authenticated
+    def stream_section_records(self, sections=[], section=None):
+        """
+        Yield the SectionRecords of a WCD read while the response is still downloading,
+        without building the whole tree.
+
+        Opening the stream goes through call_with_retry like every other request: it is
+        retried until its first item arrives, and a rejected session is renewed. An
+        error once records were yielded can't be retried and is raised.
+
+        @param section only yield the records of this section
+        @raise ResponseError when the switch answers with an error status
+        """
+        endpoint = get_wcd_endpoint(self.host, sections)
+        event = self._read_event(sections)
+        with observed(self, event):
+            generation = None
+
+            def attempt(deadline):
+                nonlocal generation
+                headers, generation = self.session_headers()
+                r = self.transport.get(
+                    endpoint, headers=headers, stream=True, deadline=deadline
+                )
+                try:
+                    event.record_response(r, body=False)
+                    chunks = r.iter_content(chunk_size=DEFAULT_CHUNK_SIZE)
+                    items = iter_response(_counted(chunks, event))
+                    # a rejected session only answers with an ActionStatus
+                    first = next(items, None)
+                except BaseException:
+                    r.close()
+                    raise
+                self.mark_session_used()
+                if isinstance(first, ActionStatus) and first.statusCode not in (
+                    None,
+                    StatusCode.OK,
+                ):
+                    r.close()
+                    return (None, [first]), first.statusCode
+                return (r, chain([] if first is None else [first], items)), None
+
+            (r, items), sent = self.call_with_retry(
+                attempt,
+                relogin=(
+                    None if self.session is None else lambda: self.relogin(generation)
+                ),
+                label=f"[{self.host}] read {','.join(sections)}",
+                streamed=True,
+            )
+            event.retries = sent - 1
+            if r is None:
+                check_read_status(event, items[0])
+
+            with r:
+                started = time.perf_counter()
+                for item in items:
+                    if isinstance(item, ActionStatus):
+                        check_read_status(event, item)
+                    elif is_section_record(item, section):
+                        yield item
+                # parsing runs interleaved with the download
+                event.timings["download"] = time.perf_counter() - started
+
+    @is_authenticated
+    def get_sections_xml(self, sections=[]):
+        xmltree = self.fetch_sections_xml(sections)
         ET.indent(xmltree, space="\t", level=0)
         ET.dump(xmltree)
         # print(ET.tostring(xmltree, encoding="utf8"))
@@ -375,6 +919,6 @@ class SwitchConfigurationManager:
         endpoint = get_system_action_endpoint(
             self.host, SystemActions.DOWNLOAD_CONFIGURATION_FILE.value
         )
-        r = requests.get(endpoint, verify=False, headers={"sessionID": self.token})
+        r = self.transport.get(endpoint, headers={"sessionID": self.token})
 
         print(f"Response: {r.text}")
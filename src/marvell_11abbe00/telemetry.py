@@ -0,0 +1,405 @@
+import argparse
+import logging
+import math
+import sys
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from marvell_11abbe00.defaults import DEFAULT_READ_TIMEOUT
+from marvell_11abbe00.fleet import DEFAULT_MAX_IN_FLIGHT_HOSTS, load_inventory
+from marvell_11abbe00.session import SwitchSession
+from marvell_11abbe00.switch import SwitchConfigurationManager
+
+logger = logging.getLogger(__name__)
+
+# the sections the web UI polls for its statistics pages
+TELEMETRY_SECTIONS = ("StatisticsList", "RMONStatistics")
+
+DEFAULT_POLL_INTERVAL = 10.0
+# samples kept per counter, an hour at the default interval
+DEFAULT_RING_CAPACITY = 360
+
+LINE_PROTOCOL_MEASUREMENT = "marvell_counters"
+
+COUNTER_32_RANGE = 2**32
+COUNTER_64_RANGE = 2**64
+
+
+def is_counter_field(name):
+    return name.endswith("Count")
+
+
+def counter_delta(previous, current):
+    """
+    Increase of a counter between two samples, across a wraparound. The counter width is
+    guessed from the previous value: below 2^32 it is taken as a 32 bit counter.
+
+    @return the delta, None when the counter went back by more than half its range,
+            which is a reset (reboot, cleared statistics) rather than a wraparound
+    """
+    if current >= previous:
+        return current - previous
+
+    counterRange = COUNTER_32_RANGE if previous < COUNTER_32_RANGE else COUNTER_64_RANGE
+    delta = current + counterRange - previous
+    if delta > counterRange // 2:
+        return None
+    return delta
+
+
+class RingBuffer:
+    """
+    Fixed size circular buffer over a preallocated array, the oldest values are
+    overwritten once it is full
+
+    @param typecode array typecode, "d" for floats, "Q" for unsigned 64 bit counters
+    """
+
+    def __init__(self, capacity, typecode="d"):
+        self.capacity = capacity
+        self._items = array(typecode, [0]) * capacity
+        self._next = 0
+        self._size = 0
+
+    def append(self, value):
+        self._items[self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        if self._size < self.capacity:
+            self._size += 1
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("ring buffer index out of range")
+        return self._items[(self._next - self._size + index) % self.capacity]
+
+    def __iter__(self):
+        for index in range(self._size):
+            yield self[index]
+
+
+class CounterSeries:
+    """
+    Samples of one counter of one interface: timestamps, raw values and the rate per
+    second since the previous sample, NaN when unknown
+    """
+
+    def __init__(self, capacity=DEFAULT_RING_CAPACITY):
+        self.times = RingBuffer(capacity, "d")
+        self.values = RingBuffer(capacity, "Q")
+        self.rates = RingBuffer(capacity, "d")
+
+    def add(self, timestamp, value):
+        """
+        @return the rate since the previous sample, None for the first one or a reset
+        """
+        rate = None
+        if len(self.values):
+            delta = counter_delta(self.values[-1], value)
+            elapsed = timestamp - self.times[-1]
+            if delta is not None and elapsed > 0:
+                rate = delta / elapsed
+
+        self.times.append(timestamp)
+        self.values.append(value)
+        self.rates.append(math.nan if rate is None else rate)
+        return rate
+
+    def __len__(self):
+        return len(self.values)
+
+
+class InterfaceSample:
+    """
+    Counters of one interface row read in one poll, with their rates per second
+    """
+
+    __slots__ = ("host", "section", "interfaceName", "timestamp", "counters", "rates")
+
+    def __init__(self, host, section, interfaceName, timestamp, counters, rates):
+        self.host = host
+        self.section = section
+        self.interfaceName = interfaceName
+        self.timestamp = timestamp
+        self.counters = counters
+        self.rates = rates
+
+    def __str__(self):
+        return (
+            f"<InterfaceSample {self.host} {self.section} {self.interfaceName} "
+            f"counters={len(self.counters)} rates={len(self.rates)}>"
+        )
+
+
+def _escape_tag(value):
+    return (
+        value.replace("\\", "\\\\")
+        .replace(",", "\\,")
+        .replace(" ", "\\ ")
+        .replace("=", "\\=")
+    )
+
+
+def to_line_protocol(sample: InterfaceSample, measurement=LINE_PROTOCOL_MEASUREMENT):
+    """
+    InfluxDB line protocol of a sample, counters as integers and rates as `<name>_rate`
+    floats, with a nanosecond timestamp
+    """
+    tags = ",".join(
+        f"{name}={_escape_tag(value)}"
+        for name, value in (
+            ("host", sample.host),
+            ("section", sample.section),
+            ("interface", sample.interfaceName),
+        )
+    )
+    fields = [f"{name}={value}i" for name, value in sample.counters.items()]
+    fields.extend(f"{name}_rate={rate}" for name, rate in sample.rates.items())
+    return f"{measurement},{tags} {','.join(fields)} {int(sample.timestamp * 1e9)}"
+
+
+class TelemetryPoller:
+    """
+    Poll the statistics sections of many switches on a schedule.
+
+    Every round reads the sections of every host with a single streamed WCD request,
+    max_in_flight hosts at a time, and yields one InterfaceSample per interface row as
+    soon as its host answers. Each counter keeps its last `capacity` samples in ring
+    buffers, so memory doesn't grow with the number of rounds.
+
+    with TelemetryPoller(load_inventory("hosts.txt"), interval=10) as poller:
+        for sample in poller.run(rounds=6):
+            print(to_line_protocol(sample))
+    """
+
+    def __init__(
+        self,
+        inventory,
+        *,
+        sections=TELEMETRY_SECTIONS,
+        interval=DEFAULT_POLL_INTERVAL,
+        capacity=DEFAULT_RING_CAPACITY,
+        max_in_flight=DEFAULT_MAX_IN_FLIGHT_HOSTS,
+        transport_factory=None,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        self.inventory = inventory
+        self.sections = list(sections)
+        self.interval = interval
+        self.capacity = capacity
+        self.max_in_flight = max_in_flight
+        if transport_factory is None:
+            # imported here so importing the module doesn't load requests
+            from marvell_11abbe00.transport import SwitchTransport
+
+            transport_factory = SwitchTransport
+        self.transport_factory = transport_factory
+        self.clock = clock
+        self.sleep = sleep
+        self.series = {}
+        self.switches = {}
+        self.sessions = {}
+        self.errors = 0
+
+    def start(self):
+        for fleetHost in self.inventory:
+            switch = SwitchConfigurationManager(
+                fleetHost.host, transport=self.transport_factory()
+            )
+            # polling keeps the session busy, no keep alive thread needed
+            self.sessions[fleetHost.host] = SwitchSession(
+                switch,
+                fleetHost.username,
+                fleetHost.password,
+                keep_alive_interval=None,
+            )
+            self.switches[fleetHost.host] = switch
+        return self
+
+    def stop(self):
+        for host, switch in self.switches.items():
+            self.sessions[host].stop()
+            switch.transport.close()
+        self.switches = {}
+        self.sessions = {}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def counter_series(self, host, section, interfaceName, counter) -> CounterSeries:
+        key = (host, section, interfaceName, counter)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = CounterSeries(self.capacity)
+        return series
+
+    def poll_host(self, host):
+        """
+        @return the InterfaceSamples of one read of the host sections
+        """
+        switch = self.switches[host]
+        self.sessions[host].ensure_valid()
+        rows = []
+        for record in switch.stream_section_records(self.sections):
+            interfaceName = record.get("interfaceName")
+            if interfaceName is None:
+                continue
+            counters = {
+                name: int(value)
+                for name, value in record.fields.items()
+                if is_counter_field(name) and value
+            }
+            if not counters:
+                # a line protocol point needs at least one field
+                continue
+            rows.append((record.section, interfaceName, counters))
+        timestamp = time.time()
+
+        samples = []
+        for section, interfaceName, counters in rows:
+            rates = {}
+            for name, value in counters.items():
+                rate = self.counter_series(host, section, interfaceName, name).add(
+                    timestamp, value
+                )
+                if rate is not None:
+                    rates[name] = rate
+            samples.append(
+                InterfaceSample(
+                    host, section, interfaceName, timestamp, counters, rates
+                )
+            )
+        return samples
+
+    def poll(self):
+        """
+        One round over every host, samples are yielded per host as they come in
+        """
+        workers = max(1, min(self.max_in_flight, len(self.switches)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(self.poll_host, host): host for host in self.switches
+            }
+            for future in as_completed(futures):
+                try:
+                    yield from future.result()
+                except Exception as e:
+                    self.errors += 1
+                    logger.warning(f"[{futures[future]}] poll failed: {e}")
+
+    def run(self, rounds=None):
+        """
+        Poll every interval seconds, rounds start on a fixed schedule whatever the time
+        the previous one took
+
+        @param rounds number of rounds, None polls until the iterator is closed
+        """
+        started = self.clock()
+        index = 0
+        while rounds is None or index < rounds:
+            yield from self.poll()
+            index += 1
+            if rounds is not None and index >= rounds:
+                break
+            delay = started + index * self.interval - self.clock()
+            if delay > 0:
+                self.sleep(delay)
+            else:
+                logger.warning(f"round {index} took longer than {self.interval}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Poll the interface counters of switches and print them in line protocol"
+    )
+    parser.add_argument(
+        "--inventory",
+        required=True,
+        dest="inventory",
+        type=str,
+        help="path to the inventory of hosts and credentials",
+    )
+    parser.add_argument(
+        "--interval",
+        required=False,
+        default=DEFAULT_POLL_INTERVAL,
+        dest="interval",
+        type=float,
+        help="seconds between two polls of every host",
+    )
+    parser.add_argument(
+        "--rounds",
+        required=False,
+        dest="rounds",
+        type=int,
+        help="number of polls, runs until interrupted by default",
+    )
+    parser.add_argument(
+        "--section",
+        required=False,
+        action="append",
+        dest="sections",
+        type=str,
+        help="section to poll, can be repeated, StatisticsList and RMONStatistics by default",
+    )
+    parser.add_argument(
+        "--output",
+        required=False,
+        dest="output",
+        type=str,
+        help="append the line protocol to this file instead of stdout",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        required=False,
+        default=DEFAULT_MAX_IN_FLIGHT_HOSTS,
+        dest="maxInFlight",
+        type=int,
+        help="maximum number of hosts polled at the same time",
+    )
+    parser.add_argument(
+        "--timeout",
+        required=False,
+        default=DEFAULT_READ_TIMEOUT,
+        dest="timeout",
+        type=float,
+        help="read timeout in seconds for each request",
+    )
+
+    args = parser.parse_args()
+
+    logging.basicConfig(encoding="utf-8", level=logging.INFO)
+
+    from marvell_11abbe00.transport import SwitchTransport
+
+    poller = TelemetryPoller(
+        load_inventory(args.inventory),
+        sections=args.sections or TELEMETRY_SECTIONS,
+        interval=args.interval,
+        max_in_flight=args.maxInFlight,
+        transport_factory=lambda: SwitchTransport(read_timeout=args.timeout),
+    )
+    output = sys.stdout if args.output is None else open(args.output, "a")
+    try:
+        with poller:
+            for sample in poller.run(args.rounds):
+                output.write(to_line_protocol(sample) + "\n")
+                output.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+from functools import lru_cache
+import xml.etree.ElementTree as ET
+
+from marvell_11abbe00.batch import build_payload
+from marvell_11abbe00.builder import RequestNode, ServiceFactory, Value
+
+# what ET.tostring(..., encoding="utf8") writes before the root element
+XML_DECLARATION = "<?xml version='1.0' encoding='utf8'?>\n"
+
+PAYLOAD_BACKEND_BUILDER = "builder"
+PAYLOAD_BACKEND_TEMPLATE = "template"
+
+TEMPLATE_CACHE_SIZE = 1024
+
+
+def escape_text(text):
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text
+
+
+def escape_attrib(text):
+    text = escape_text(text)
+    if '"' in text:
+        text = text.replace('"', "&quot;")
+    if "\r" in text:
+        text = text.replace("\r", "&#13;")
+    if "\n" in text:
+        text = text.replace("\n", "&#10;")
+    if "\t" in text:
+        text = text.replace("\t", "&#09;")
+    return text
+
+
+def _check_text(text):
+    if not isinstance(text, str):
+        raise TypeError(f"cannot serialize {text!r} (type {type(text).__name__})")
+    return text
+
+
+def _open_tag(node):
+    attrib = "".join(
+        f' {key}="{escape_attrib(_check_text(value))}"'
+        for key, value in node.attrib.items()
+    )
+    return f"<{node.tag}{attrib}"
+
+
+def render_node(node, out):
+    """
+    Serialize a RequestNode tree in a single pass, as ET.tostring would serialize its
+    build()
+    """
+    if isinstance(node, TemplateNode):
+        out.append(node.render())
+        return
+
+    out.append(_open_tag(node))
+    if node.text or node.children:
+        out.append(">")
+        if node.text:
+            out.append(escape_text(_check_text(node.text)))
+        for child in node.children:
+            render_node(child, out)
+        out.append(f"</{node.tag}>")
+    else:
+        out.append(" />")
+
+
+class Slot:
+    """
+    Placeholder for a leaf value in a template skeleton
+    """
+
+
+SLOT = Slot()
+
+
+class PayloadTemplate:
+    """
+    XML of a RequestNode skeleton rendered once, split around its Slot leaves so a
+    payload is the literal parts joined with the escaped values.
+    """
+
+    def __init__(self, skeleton: RequestNode):
+        self.skeleton = skeleton
+        self.parts = []
+        self.slots = 0
+        self._current = []
+        self._compile(skeleton)
+        self.parts.append("".join(self._current))
+        del self._current
+
+    def _compile(self, node):
+        self._current.append(_open_tag(node))
+        if node.text is SLOT:
+            self._current.append(">")
+            self.parts.append("".join(self._current))
+            self._current = [f"</{node.tag}>"]
+            self.slots += 1
+            return
+
+        if node.text or node.children:
+            self._current.append(">")
+            if node.text:
+                self._current.append(escape_text(node.text))
+            for child in node.children:
+                self._compile(child)
+            self._current.append(f"</{node.tag}>")
+        else:
+            self._current.append(" />")
+
+    def render(self, values):
+        parts = self.parts
+        out = [parts[0]]
+        for index, value in enumerate(values):
+            value = escape_text(_check_text(value))
+            if value:
+                out.append(value)
+                out.append(parts[index + 1])
+            else:
+                # an empty leaf is written as a short empty element, like ET does
+                out[-1] = out[-1][:-1] + " />"
+                out.append(parts[index + 1].split(">", 1)[1])
+        return "".join(out)
+
+    def build(self, values):
+        """
+        ET.Element of the skeleton filled with values, for callers that need a tree
+        """
+        values = iter(values)
+
+        def build(node):
+            element = ET.Element(node.tag, node.attrib)
+            if node.text is SLOT:
+                element.text = next(values)
+            elif node.text is not None:
+                element.text = node.text
+            for child in node.children:
+                element.append(build(child))
+            return element
+
+        return build(self.skeleton)
+
+
+class TemplateNode:
+    """
+    Stand-in for a ServiceFactory node built from a cached PayloadTemplate and the
+    values of its slots, in document order
+    """
+
+    def __init__(self, template: PayloadTemplate, values):
+        if len(values) != template.slots:
+            raise ValueError(f"expected {template.slots} values, got {len(values)}")
+        self.template = template
+        self.values = values
+
+    @property
+    def tag(self):
+        return self.template.skeleton.tag
+
+    def render(self):
+        return self.template.render(self.values)
+
+    def build(self):
+        return self.template.build(self.values)
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def entry_template(section, container, keys, rows=1) -> PayloadTemplate:
+    """
+    Template of a `set` of rows: <section action="set"><container> with one leaf per
+    key </container>...</section>
+
+    @param container tag of the row element, Entry or InterfaceEntry
+    @param keys field names of every row, in order
+    @param rows number of rows, their values follow each other
+    """
+    serviceFactory = ServiceFactory(serviceName=section, action="set")
+    for _ in range(rows):
+        row = RequestNode(tag=container)
+        for key in keys:
+            row.append(Value(key=key, value=SLOT))
+        serviceFactory.append(row)
+
+    return PayloadTemplate(serviceFactory)
+
+
+def render_payload(writes) -> bytes:
+    """
+    Serialize the DeviceConfiguration request of batch.build_payload without building
+    an ElementTree, byte for byte what ET.tostring(build_payload(writes), "utf8") gives
+    """
+    out = [XML_DECLARATION, "<DeviceConfiguration>"]
+    if len(writes) > 1 or writes[0].versioned:
+        out.append("<version>1.0</version>")
+    for write in writes:
+        render_node(write.node, out)
+    out.append("</DeviceConfiguration>")
+
+    return "".join(out).encode("utf-8")
+
+
+def serialize_payload(writes, backend=PAYLOAD_BACKEND_TEMPLATE) -> bytes:
+    if backend == PAYLOAD_BACKEND_BUILDER:
+        return ET.tostring(build_payload(writes), encoding="utf8")
+    return render_payload(writes)
@@ -0,0 +1,345 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from marvell_11abbe00.response import StatusCode
+from marvell_11abbe00.retry import RETRY, Deadline, DeadlineExceeded, classify_error
+
+logger = logging.getLogger(__name__)
+
+# requests in flight to one switch
+DEFAULT_INITIAL_LIMIT = 2
+DEFAULT_MIN_LIMIT = 1
+DEFAULT_MAX_LIMIT = 16
+
+# requests started per second on one switch
+DEFAULT_INITIAL_RATE = 10.0
+DEFAULT_MIN_RATE = 0.5
+DEFAULT_MAX_RATE = 200.0
+DEFAULT_BURST = 4.0
+# requests per second the rate gains for every second without overload
+DEFAULT_RATE_INCREASE = 10.0
+
+# both limits are multiplied by this on overload
+DEFAULT_BACKOFF_RATIO = 0.5
+# a request slower than this many times the baseline latency is a sign of overload
+DEFAULT_LATENCY_TOLERANCE = 2.0
+# latencies under this are never taken for overload, whatever the baseline
+DEFAULT_LATENCY_FLOOR = 0.05
+
+# how fast the baseline follows latencies above it, it drops to any lower one at once
+BASELINE_DRIFT = 0.02
+LATENCY_SMOOTHING = 0.2
+THROUGHPUT_WINDOW = 1.0
+
+# answers the embedded web server gives when it is overwhelmed; an AUTHENTICATION_ERROR
+# is only an expired session, renewed by call_with_retry
+OVERLOAD_STATUSES = {StatusCode.PAYLOAD_ERROR}
+
+
+class TokenBucket:
+    """
+    Rate limit of `rate` requests per second with bursts of up to `burst` requests.
+
+    A request takes a token, possibly one that is only refilled later: the bucket goes
+    into debt and the caller sleeps until then, so waiting callers are spaced evenly.
+    """
+
+    def __init__(
+        self, rate, burst=DEFAULT_BURST, *, clock=time.monotonic, sleep=time.sleep
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = burst
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill(self.clock())
+            self.rate = rate
+
+    def acquire(self, deadline: Deadline = None):
+        """
+        Take a token, sleeping until it is available
+
+        @return seconds slept
+        @raise DeadlineExceeded when the token comes after the deadline
+        """
+        with self._lock:
+            self._refill(self.clock())
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            if deadline is not None and wait > deadline.remaining():
+                self.tokens += 1
+                raise DeadlineExceeded("deadline exceeded waiting for the rate limit")
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+
+class Ticket:
+    """
+    A request let through by an AdaptiveLimiter, handed back to release()
+    """
+
+    __slots__ = ("started", "saturated", "throttled")
+
+    def __init__(self, started, saturated, throttled):
+        self.started = started
+        # the request filled the last slot, or had to wait for the rate limit: only
+        # then did the limits hold the switch back and deserve to grow
+        self.saturated = saturated
+        self.throttled = throttled
+
+
+class AdaptiveLimiter:
+    """
+    Finds how hard a switch can be driven: limits the requests in flight and the
+    requests started per second, raising both while the switch keeps up and cutting
+    them as soon as it shows overload (AIMD, additive increase multiplicative decrease).
+
+    A latency above latency_tolerance times the baseline, the lowest latency seen
+    lately, means requests queue up in the switch: the requests in flight are cut. A
+    transport error or timeout, or a PAYLOAD_ERROR answer, means the switch is failing:
+    both the requests in flight and the rate are cut. Both limits start doubling every
+    round trip (slow start) until the first overload, then the requests in flight grow
+    by one per round trip and the rate by rate_increase per second. Only one cut is made
+    per round trip: the requests already in flight when the limits were cut don't cut
+    them again.
+
+    switch.limiter = AdaptiveLimiter(max_limit=8, label=switch.host)
+
+    Thread safe, share one limiter between all the threads sending to a switch.
+    """
+
+    def __init__(
+        self,
+        *,
+        initial_limit=DEFAULT_INITIAL_LIMIT,
+        min_limit=DEFAULT_MIN_LIMIT,
+        max_limit=DEFAULT_MAX_LIMIT,
+        initial_rate=DEFAULT_INITIAL_RATE,
+        min_rate=DEFAULT_MIN_RATE,
+        max_rate=DEFAULT_MAX_RATE,
+        burst=DEFAULT_BURST,
+        rate_increase=DEFAULT_RATE_INCREASE,
+        backoff_ratio=DEFAULT_BACKOFF_RATIO,
+        latency_tolerance=DEFAULT_LATENCY_TOLERANCE,
+        latency_floor=DEFAULT_LATENCY_FLOOR,
+        clock=time.monotonic,
+        sleep=time.sleep,
+        label="",
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate_increase = rate_increase
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self.latency_floor = latency_floor
+        self.clock = clock
+        self.label = label
+        self.limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self.bucket = TokenBucket(
+            max(min_rate, min(initial_rate, max_rate)), burst, clock=clock, sleep=sleep
+        )
+        self.inFlight = 0
+        self.slowStart = True
+        self.baseline = None
+        self.latency = None
+        self.requests = 0
+        self.overloads = 0
+        self.decreases = 0
+        self.lastDecrease = None
+        self._completions = deque()
+        self._condition = threading.Condition()
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    def set_maximums(self, *, max_limit=None, max_rate=None):
+        """
+        Change the ceilings of the limits, bringing the limits under them
+        """
+        with self._condition:
+            if max_limit is not None:
+                self.max_limit = max_limit
+                self.limit = float(max(self.min_limit, min(self.limit, max_limit)))
+            if max_rate is not None:
+                self.max_rate = max_rate
+                self.bucket.set_rate(
+                    max(self.min_rate, min(self.bucket.rate, max_rate))
+                )
+            self._condition.notify_all()
+
+    def acquire(self, deadline: Deadline = None) -> Ticket:
+        """
+        Wait for the rate limit then for a free slot. Requests sleeping on the rate limit
+        hold no slot, so the requests in flight are only those actually sent.
+
+        @raise DeadlineExceeded when the deadline expires first
+        """
+        throttled = self.bucket.acquire(deadline) > 0 or self.bucket.tokens < 1
+        with self._condition:
+            while self.inFlight >= int(self.limit):
+                timeout = None if deadline is None else deadline.remaining()
+                if timeout is not None and timeout <= 0:
+                    raise DeadlineExceeded("deadline exceeded waiting for a slot")
+                self._condition.wait(timeout)
+            self.inFlight += 1
+            saturated = self.inFlight >= int(self.limit)
+        return Ticket(self.clock(), saturated, throttled)
+
+    def release(self, ticket: Ticket, *, error=None, statusCode=None, sample=True):
+        """
+        Free the slot of a finished request and adapt the limits to how it went
+
+        @param error exception the request failed with, only the transport errors and
+                     timeouts call_with_retry retries are taken for overload
+        @param statusCode StatusCode of the answer
+        @param sample False when the duration says nothing about the switch, e.g. a
+                      streamed response read at the pace of its consumer
+        """
+        now = self.clock()
+        latency = now - ticket.started
+        with self._condition:
+            self.inFlight -= 1
+            self.requests += 1
+            self._completions.append(now)
+            while now - self._completions[0] > THROUGHPUT_WINDOW:
+                self._completions.popleft()
+
+            reason = None
+            failed = True
+            if error is not None:
+                if is_overload_error(error):
+                    reason = type(error).__name__
+                else:
+                    # e.g. an unparsable answer, it says nothing of the load
+                    sample = False
+            elif statusCode in OVERLOAD_STATUSES:
+                reason = statusCode.name
+            elif statusCode == StatusCode.AUTHENTICATION_ERROR:
+                # rejected before any work, it says nothing of the load either
+                sample = False
+            elif sample:
+                reason = self._sample_latency(latency)
+                failed = False
+
+            if reason is not None:
+                self.overloads += 1
+                # the requests sent before the last cut saw the old limits
+                if self.lastDecrease is None or ticket.started >= self.lastDecrease:
+                    self._decrease(now, reason, failed)
+            elif sample:
+                self._increase(ticket)
+            self._condition.notify_all()
+
+    def _sample_latency(self, latency):
+        """
+        @return "latency" when the request was slow enough to be a sign of overload
+        """
+        overloaded = (
+            self.baseline is not None
+            and latency > self.latency_floor
+            and latency > self.baseline * self.latency_tolerance
+        )
+        if self.baseline is None or latency < self.baseline:
+            self.baseline = latency
+        else:
+            self.baseline += BASELINE_DRIFT * (latency - self.baseline)
+        self.latency = (
+            latency
+            if self.latency is None
+            else self.latency + LATENCY_SMOOTHING * (latency - self.latency)
+        )
+        return "latency" if overloaded else None
+
+    def _increase(self, ticket: Ticket):
+        if ticket.saturated and self.limit < self.max_limit:
+            step = 1.0 if self.slowStart else 1.0 / self.limit
+            self.limit = min(self.max_limit, self.limit + step)
+        if ticket.throttled and self.bucket.rate < self.max_rate:
+            # requests complete about rate times per second
+            rate = self.bucket.rate
+            step = 1.0 if self.slowStart else self.rate_increase / rate
+            self.bucket.set_rate(min(self.max_rate, rate + step))
+
+    def _decrease(self, now, reason, failed):
+        """
+        @param failed the switch failed requests rather than only slowing down, the rate
+                      is cut as well
+        """
+        previousLimit = self.limit
+        previousRate = self.bucket.rate
+        self.limit = max(float(self.min_limit), self.limit * self.backoff_ratio)
+        if failed:
+            # cut from what the switch actually got, the limit may not have been reached
+            rate = min(
+                previousRate, max(len(self._completions) / THROUGHPUT_WINDOW, 1.0)
+            )
+            self.bucket.set_rate(max(self.min_rate, rate * self.backoff_ratio))
+        self.slowStart = False
+        self.decreases += 1
+        self.lastDecrease = now
+        logger.info(
+            f"{self.label} overload ({reason}), in flight {previousLimit:.1f} -> "
+            f"{self.limit:.1f}, rate {previousRate:.1f} -> {self.bucket.rate:.1f}/s"
+        )
+
+    def stats(self):
+        with self._condition:
+            return {
+                "limit": int(self.limit),
+                "rate": round(self.bucket.rate, 2),
+                "in_flight": self.inFlight,
+                "baseline": self.baseline,
+                "latency": self.latency,
+                "requests": self.requests,
+                "overloads": self.overloads,
+                "decreases": self.decreases,
+                "slow_start": self.slowStart,
+            }
+
+
+def is_overload_error(error):
+    """
+    Timeouts, broken connections and gateway errors, as opposed to errors of the request
+    itself
+    """
+    return classify_error(error) == RETRY
+
+
+def limited(limiter: AdaptiveLimiter, attempt, *, sample=True):
+    """
+    Wrap a call_with_retry attempt so every request it sends goes through the limiter,
+    the backoff between retries doesn't hold a slot
+
+    @param sample False for attempts returning a streamed response as soon as its first
+                  bytes arrive, their duration isn't the latency of the request
+    """
+
+    def limited_attempt(deadline):
+        ticket = limiter.acquire(deadline)
+        try:
+            result, statusCode = attempt(deadline)
+        except Exception as e:
+            limiter.release(ticket, error=e)
+            raise
+        except BaseException:
+            limiter.release(ticket, sample=False)
+            raise
+        limiter.release(ticket, statusCode=statusCode, sample=sample)
+        return result, statusCode
+
+    return limited_attempt
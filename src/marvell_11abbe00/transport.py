@@ -0,0 +1,201 @@
+import threading
+import time
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from marvell_11abbe00.defaults import (
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_POOL_CONNECTIONS,
+    DEFAULT_POOL_MAXSIZE,
+    DEFAULT_READ_TIMEOUT,
+)
+from marvell_11abbe00.retry import RETRYABLE_HTTP_STATUSES
+
+urllib3.disable_warnings()
+urllib3.util.url._QUERY_CHARS.add("{")
+urllib3.util.url._QUERY_CHARS.add("}")
+
+
+class ConnectionCounter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.requests = 0
+
+    def connection_opened(self):
+        with self._lock:
+            self.opened += 1
+
+    def request_sent(self):
+        with self._lock:
+            self.requests += 1
+
+    @property
+    def reused(self):
+        return max(self.requests - self.opened, 0)
+
+
+# connection setup timings of the request in progress on the current thread
+_phases = threading.local()
+
+
+def _record_phase(name, seconds):
+    phases = getattr(_phases, "current", None)
+    if phases is not None:
+        phases[name] = phases.get(name, 0.0) + seconds
+
+
+def _timed_connection(connection_class):
+    class TimedConnection(connection_class):
+        def _new_conn(self):
+            started = time.perf_counter()
+            try:
+                return super()._new_conn()
+            finally:
+                self._socketTime = time.perf_counter() - started
+                _record_phase("connect", self._socketTime)
+
+        def connect(self):
+            self._socketTime = 0.0
+            started = time.perf_counter()
+            super().connect()
+            if isinstance(self, HTTPSConnection):
+                _record_phase("tls", time.perf_counter() - started - self._socketTime)
+
+    return TimedConnection
+
+
+def _counting_pool(pool_class, counter):
+    class CountingConnectionPool(pool_class):
+        ConnectionCls = _timed_connection(pool_class.ConnectionCls)
+
+        def _new_conn(self):
+            counter.connection_opened()
+            return super()._new_conn()
+
+    return CountingConnectionPool
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose connection pools report every new TCP/TLS connection to a shared counter
+    """
+
+    def __init__(self, counter, **kwargs):
+        self.counter = counter
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _counting_pool(HTTPConnectionPool, self.counter),
+            "https": _counting_pool(HTTPSConnectionPool, self.counter),
+        }
+
+
+class SwitchTransport:
+    """
+    Pooled keep-alive HTTP(S) session shared by every request sent to a switch.
+
+    The embedded web server is slow at TLS handshakes, so all the calls done by
+    SwitchConfigurationManager and the HAR replayer go through one requests.Session
+    whose connections are reused whenever the switch keeps them open.
+    """
+
+    def __init__(
+        self,
+        *,
+        pool_connections=DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize=DEFAULT_POOL_MAXSIZE,
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+        read_timeout=DEFAULT_READ_TIMEOUT,
+        verify=False,
+    ):
+        self.timeout = (connect_timeout, read_timeout)
+        self.verify = verify
+        self.counter = ConnectionCounter()
+
+        adapter = CountingHTTPAdapter(
+            self.counter,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=True,
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method, url, deadline=None, **kwargs):
+        """
+        Send a request through the pooled session. The response carries a timings dict
+        with the connect (name resolution included) and tls time of a new connection,
+        server_wait until the headers arrived and download of the body, in seconds.
+
+        @param deadline retry.Deadline, the connect and read timeouts are capped to the
+                        time it leaves
+        @raise requests.HTTPError on a gateway error status, the error page in front of
+               the switch would otherwise reach the XML parsers
+        """
+        timeout = kwargs.pop("timeout", self.timeout)
+        if deadline is not None:
+            deadline.check()
+            remaining = deadline.remaining()
+            if not isinstance(timeout, tuple):
+                timeout = (timeout, timeout)
+            timeout = tuple(min(value, remaining) for value in timeout)
+        kwargs["timeout"] = timeout
+        kwargs.setdefault("verify", self.verify)
+        self.counter.request_sent()
+
+        _phases.current = phases = {}
+        started = time.perf_counter()
+        try:
+            r = self.session.request(method=method, url=url, **kwargs)
+        finally:
+            _phases.current = None
+        total = time.perf_counter() - started
+
+        setup = phases.get("connect", 0.0) + phases.get("tls", 0.0)
+        headers = r.elapsed.total_seconds()
+        phases["server_wait"] = max(headers - setup, 0.0)
+        if not kwargs.get("stream"):
+            phases["download"] = max(total - headers, 0.0)
+        r.timings = phases
+        if r.status_code in RETRYABLE_HTTP_STATUSES:
+            r.close()
+            r.raise_for_status()
+        return r
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    @property
+    def connections_opened(self):
+        return self.counter.opened
+
+    @property
+    def connections_reused(self):
+        return self.counter.reused
+
+    def stats(self):
+        return {
+            "requests": self.counter.requests,
+            "connections_opened": self.counter.opened,
+            "connections_reused": self.counter.reused,
+        }
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
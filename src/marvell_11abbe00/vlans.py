@@ -0,0 +1,191 @@
+import re
+
+VLAN_ID_MIN = 1
+VLAN_ID_MAX = 4094
+BITMAP_SIZE = 4096
+
+# VLANInterfaceISList fields holding VLAN lists in the switch range syntax
+VLAN_SET_FIELDS = ("trunkMemberVLANs", "generalTaggedVLANs", "generalUntaggedVLANs")
+
+
+def is_vlan_set_field(name):
+    return name.endswith("VLANs")
+
+
+_RUN = re.compile(b"1+")
+
+
+def _check_range(first, last):
+    if not VLAN_ID_MIN <= first <= last <= VLAN_ID_MAX:
+        raise ValueError(f"Invalid VLAN range {first}-{last}")
+
+
+def _range_bits(first, last):
+    _check_range(first, last)
+    return ((1 << (last - first + 1)) - 1) << first
+
+
+class VLANSet:
+    """
+    Immutable set of VLAN IDs stored as a 4096 bit bitmap in an int, bit n set when VLAN
+    n is a member. Union, intersection and difference are single integer operations.
+
+    It reads and writes the range syntax of the switch, e.g. `1-2349,2363,2450-4093`,
+    which str() always gives back in its shortest form.
+
+    VLANSet.parse("2-2349,2363") | VLANSet([2350, 2351])
+    """
+
+    __slots__ = ("bits",)
+
+    def __init__(self, vlans=()):
+        bits = 0
+        for vlan in vlans:
+            bits |= _range_bits(vlan, vlan)
+        self.bits = bits
+
+    @classmethod
+    def from_bits(cls, bits) -> "VLANSet":
+        if bits < 0 or bits.bit_length() > VLAN_ID_MAX + 1 or bits & 1:
+            raise ValueError("Invalid VLAN bitmap")
+        vlanSet = cls.__new__(cls)
+        vlanSet.bits = bits
+        return vlanSet
+
+    @classmethod
+    def parse(cls, text) -> "VLANSet":
+        """
+        @param text comma separated VLAN IDs and inclusive ranges, empty for no VLAN
+        @raise ValueError for malformed text or IDs outside 1-4094
+        """
+        # one character per VLAN, lowest first: filling slices and converting the
+        # string once keeps this linear where or-ing a big int per range is not
+        digits = bytearray(b"0") * BITMAP_SIZE
+        for item in (text or "").split(","):
+            item = item.strip()
+            if not item:
+                continue
+            first, separator, last = item.partition("-")
+            try:
+                first, last = int(first), int(last if separator else first)
+                _check_range(first, last)
+            except ValueError:
+                raise ValueError(f"Invalid VLAN list {text!r}")
+            end = last + 1
+            digits[first:end] = b"1" * (end - first)
+        digits.reverse()
+        return cls.from_bits(int(digits, 2))
+
+    @classmethod
+    def range(cls, first, last) -> "VLANSet":
+        return cls.from_bits(_range_bits(first, last))
+
+    def ranges(self):
+        """
+        @return the (first, last) runs of consecutive VLANs, in order
+        """
+        # binary digits lowest VLAN first, the runs of ones are the ranges
+        digits = format(self.bits, "b").encode("ascii")[::-1]
+        return [(run.start(), run.end() - 1) for run in _RUN.finditer(digits)]
+
+    def __str__(self):
+        return ",".join(
+            str(first) if first == last else f"{first}-{last}"
+            for first, last in self.ranges()
+        )
+
+    def __repr__(self):
+        return f"VLANSet({str(self)!r})"
+
+    def __iter__(self):
+        for first, last in self.ranges():
+            yield from range(first, last + 1)
+
+    def __len__(self):
+        return bin(self.bits).count("1")
+
+    def __bool__(self):
+        return self.bits != 0
+
+    def __contains__(self, vlan):
+        return isinstance(vlan, int) and vlan >= 0 and (self.bits >> vlan) & 1 == 1
+
+    def __eq__(self, other):
+        if not isinstance(other, VLANSet):
+            return NotImplemented
+        return self.bits == other.bits
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def __or__(self, other):
+        return VLANSet.from_bits(self.bits | as_vlan_set(other).bits)
+
+    def __and__(self, other):
+        return VLANSet.from_bits(self.bits & as_vlan_set(other).bits)
+
+    def __sub__(self, other):
+        return VLANSet.from_bits(self.bits & ~as_vlan_set(other).bits)
+
+    def __xor__(self, other):
+        return VLANSet.from_bits(self.bits ^ as_vlan_set(other).bits)
+
+    def __le__(self, other):
+        return self.bits & ~as_vlan_set(other).bits == 0
+
+    def __ge__(self, other):
+        return as_vlan_set(other) <= self
+
+    def isdisjoint(self, other):
+        return self.bits & as_vlan_set(other).bits == 0
+
+    union = __or__
+    intersection = __and__
+    difference = __sub__
+    issubset = __le__
+    issuperset = __ge__
+
+
+def as_vlan_set(value) -> VLANSet:
+    """
+    @param value VLANSet, range string or iterable of VLAN IDs
+    """
+    if isinstance(value, VLANSet):
+        return value
+    if isinstance(value, str):
+        return VLANSet.parse(value)
+    if isinstance(value, int):
+        return VLANSet([value])
+    return VLANSet(value)
+
+
+def field_values_equal(name, current, requested):
+    """
+    Compare two values of a field, VLAN lists as sets so `1-3` matches `1,2,3`
+    """
+    if current == requested:
+        return True
+    if current is None or requested is None or not is_vlan_set_field(name):
+        return False
+    try:
+        return VLANSet.parse(current) == VLANSet.parse(requested)
+    except ValueError:
+        return False
+
+
+def interface_vlan_sets(records, fields=VLAN_SET_FIELDS):
+    """
+    @param records SectionRecords of VLANInterfaceISList
+    @return {interfaceName: {field: VLANSet}} for the fields present on every row
+    """
+    memberships = {}
+    for record in records:
+        interfaceName = record.get("interfaceName")
+        if interfaceName is None:
+            continue
+        memberships[interfaceName] = {
+            field: VLANSet.parse(record.get(field))
+            for field in fields
+            if record.get(field) is not None
+        }
+    return memberships
@@ -54,34 +54,35 @@ if __name__ == "__main__":
     switch.set_vlan_id(2363)
 
     # setup te1 and te3
-    for interface in ["te1", "te3"]:
-        switch.set_interface_vlan_settings(
-            interfaceName=interface,
-            settings=[
-                {"switchportModeAdmin": SwitchPortModeAdmin.GENERAL.value},
-                {"generalPVID": 2351},
-                {
-                    (
-                        "generalTaggedVLANs"
-                        if interface == "te1"
-                        else "generalUntaggedVLANs"
-                    ): "2350-2351"
-                },
-            ],
-        )
-        switch.set_interface_vlan_settings(
-            interfaceName=interface,
-            settings=[
-                {"generalTaggedVLANs": 2351},
-            ],
-        )
-        switch.set_interface_lldp_settings(
-            interfaceName=interface,
-            settings=[{"portState": LLDPInterfaceListPortState.DISABLED.value}],
-        )
-        switch.set_interface_cdp_settings(
-            interfaceName=interface, settings=[{"enbl": 2}]
-        )
+    with switch.reconcile() as tx:
+        for interface in ["te1", "te3"]:
+            tx.set_interface_vlan_settings(
+                interfaceName=interface,
+                settings=[
+                    {"switchportModeAdmin": SwitchPortModeAdmin.GENERAL.value},
+                    {"generalPVID": 2351},
+                    {
+                        (
+                            "generalTaggedVLANs"
+                            if interface == "te1"
+                            else "generalUntaggedVLANs"
+                        ): "2350-2351"
+                    },
+                ],
+            )
+            tx.set_interface_vlan_settings(
+                interfaceName=interface,
+                settings=[
+                    {"generalTaggedVLANs": 2351},
+                ],
+            )
+            tx.set_interface_lldp_settings(
+                interfaceName=interface,
+                settings=[{"portState": LLDPInterfaceListPortState.DISABLED.value}],
+            )
+            tx.set_interface_cdp_settings(
+                interfaceName=interface, settings=[{"enbl": 2}]
+            )
 
     # setup te2
     switch.set_interface_vlan_settings(
@@ -170,16 +171,17 @@ if __name__ == "__main__":
     #         ],
     #     )
 
-    for ports in ["gi0", "gi1", "gi2", "gi3", "gi4", "gi5", "gi6", "gi7"]:
-        switch.set_poe_pse_interface_settings(
-            interfaceName=ports,
-            settings=[
-                {
-                    "adminEnable": POEPSEInterfaceAdminEnable.ENABLED.value,
-                    "powerPriority": PowerPriority.LOW.value,
-                }
-            ],
-        )
+    with switch.batch() as tx:
+        for ports in ["gi0", "gi1", "gi2", "gi3", "gi4", "gi5", "gi6", "gi7"]:
+            tx.set_poe_pse_interface_settings(
+                interfaceName=ports,
+                settings=[
+                    {
+                        "adminEnable": POEPSEInterfaceAdminEnable.ENABLED.value,
+                        "powerPriority": PowerPriority.LOW.value,
+                    }
+                ],
+            )
 
     switch.set_vlan_id(1)
     switch.set_stp_settings(
@@ -195,17 +197,18 @@ if __name__ == "__main__":
         settings=[{"STPOperationMode": STPOperationMode.RSTP.value, "enabled": "1"}]
     )
 
-    for ports in ["gi0", "gi1", "gi2", "gi3", "gi4", "gi5", "gi6", "gi7"]:
-        switch.set_security_interface_settings(
-            interfaceName=ports,
-            settings=[
-                {
-                    "maxMACCount": "0",
-                    "lockInterfaceAdminEnabled": LockInterfaceAdminEnabled.UNLOCKED.value,
-                    "learningMode": LearningMode.SECURE_DELETE_ON_RESET.value,
-                }
-            ],
-        )
+    with switch.batch() as tx:
+        for ports in ["gi0", "gi1", "gi2", "gi3", "gi4", "gi5", "gi6", "gi7"]:
+            tx.set_security_interface_settings(
+                interfaceName=ports,
+                settings=[
+                    {
+                        "maxMACCount": "0",
+                        "lockInterfaceAdminEnabled": LockInterfaceAdminEnabled.UNLOCKED.value,
+                        "learningMode": LearningMode.SECURE_DELETE_ON_RESET.value,
+                    }
+                ],
+            )
 
     switch.set_forwarding_global_settings(settings=[{"agingInterval": 300}])
     switch.set_interface_8021x_settings(
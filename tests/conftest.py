@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from marvell_11abbe00.mock_server import MockSwitchServer, MockSwitchState
+from marvell_11abbe00.replay import load_replay_plan
+from marvell_11abbe00.session import SwitchSession
+from marvell_11abbe00.switch import SwitchConfigurationManager
+from marvell_11abbe00.transport import SwitchTransport
+
+HAR_FILE = os.path.join(os.path.dirname(__file__), os.pardir, "switch-capture.har")
+
+
+@pytest.fixture(scope="session")
+def har_file():
+    return HAR_FILE
+
+
+@pytest.fixture(scope="session")
+def plan():
+    return load_replay_plan(HAR_FILE)
+
+
+@pytest.fixture
+def mock_switch():
+    """
+    Mock switch seeded with the sections read in the capture
+    """
+    with MockSwitchServer(state=MockSwitchState.from_har(HAR_FILE)) as server:
+        yield server
+
+
+@pytest.fixture
+def connect():
+    """
+    Log a new manager in to a mock switch, its connections are closed after the test
+    """
+    switches = []
+
+    def connect(server):
+        switch = SwitchConfigurationManager(server.address, transport=SwitchTransport())
+        SwitchSession(switch, keep_alive_interval=None).start()
+        switches.append(switch)
+        return switch
+
+    yield connect
+
+    for switch in switches:
+        switch.session.stop()
+        switch.transport.close()
+
+
+@pytest.fixture
+def switch(mock_switch, connect):
+    return connect(mock_switch)
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+
+from marvell_11abbe00.async_switch import AsyncSwitchConfigurationManager  # noqa: E402
+from marvell_11abbe00.retry import ResponseError  # noqa: E402
+
+
+def test_gathered_reads(mock_switch):
+    async def main():
+        async with AsyncSwitchConfigurationManager(mock_switch.address) as switch:
+            await switch.login()
+            return await asyncio.gather(
+                switch.fetch_sections_xml(["PoEGlobalSetting"]),
+                switch.get_section("Standard802_3List"),
+                switch.get_section("Standard802_3List", "gi1"),
+            )
+
+    tree, records, gi1 = asyncio.run(main())
+
+    assert tree.findtext(".//powerLimitMode") == "5"
+    assert len(records) > len(gi1) > 0
+    assert {record.get("interfaceName") for record in gi1} == {"gi1"}
+
+
+def test_batch_and_cache_invalidation(mock_switch):
+    async def main():
+        async with AsyncSwitchConfigurationManager(mock_switch.address) as switch:
+            await switch.login()
+            before = await switch.get_section("ForwardingGlobalSetting")
+            async with switch.batch() as tx:
+                await tx.set_forwarding_global_settings(
+                    settings=[{"agingInterval": "600"}]
+                )
+                await tx.set_stp_global_settings(settings=[{"STPEnabled": "2"}])
+            after = await switch.get_section("ForwardingGlobalSetting")
+            return before, after
+
+    before, after = asyncio.run(main())
+
+    assert before == []
+    assert [record.get("agingInterval") for record in after] == ["600"]
+    assert mock_switch.stats["writes"] == 1
+
+
+def test_rejected_read_raises_and_isnt_cached(mock_switch):
+    switch = AsyncSwitchConfigurationManager(mock_switch.address)
+
+    async def main():
+        async with switch:
+            await switch.login()
+            mock_switch.sessions.clear()
+            await switch.get_section("PoEGlobalSetting")
+
+    with pytest.raises(ResponseError) as error:
+        asyncio.run(main())
+
+    assert error.value.statusCode.name == "AUTHENTICATION_ERROR"
+    assert switch.cache.get(("PoEGlobalSetting", "PoEGlobalSetting"), None) is None
+
+
+def test_http_error_fails_streamed_read(mock_switch):
+    switch = AsyncSwitchConfigurationManager(mock_switch.address)
+
+    async def main():
+        async with switch:
+            async for _ in switch.transport.iter_chunks(
+                "GET", f"{mock_switch.address}/missing"
+            ):
+                pass
+
+    with pytest.raises(aiohttp.ClientResponseError):
+        asyncio.run(main())
+
+
+def test_manager_runs_in_several_loops(mock_switch):
+    switch = AsyncSwitchConfigurationManager(mock_switch.address)
+
+    async def read():
+        async with switch:
+            await switch.login()
+            return await switch.get_section("PoEGlobalSetting", max_age=0)
+
+    assert asyncio.run(read())
+    assert asyncio.run(read())
+
+
+# the connections of the first loop are left to the garbage collector
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnraisableExceptionWarning")
+def test_session_left_open_by_a_previous_loop(mock_switch):
+    switch = AsyncSwitchConfigurationManager(mock_switch.address)
+
+    async def read():
+        await switch.login()
+        return await switch.get_section("PoEGlobalSetting", max_age=0)
+
+    try:
+        assert asyncio.run(read())
+        assert asyncio.run(read())
+    finally:
+        asyncio.run(switch.close())
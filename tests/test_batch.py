@@ -0,0 +1,146 @@
+import pytest
+
+from marvell_11abbe00.batch import SectionWrite, SwitchTransaction, plan_batches
+from marvell_11abbe00.builder import RequestNode
+from marvell_11abbe00.mock_server import action_status_xml, response_xml
+from marvell_11abbe00.response import StatusCode
+from marvell_11abbe00.switch import assign_action_statuses
+
+
+def broken_write():
+    # a ServiceFactory without action, the switch rejects the whole request
+    return SectionWrite(section="Broken", node=RequestNode(tag="Broken"))
+
+
+def global_setting(server, section, field):
+    return server.state.sections[section].findtext(f"Entry/{field}")
+
+
+def test_batch_sends_one_request(mock_switch, switch):
+    writes = mock_switch.stats["writes"]
+
+    with switch.batch() as tx:
+        forwarding = tx.set_forwarding_global_settings(
+            settings=[{"agingInterval": "600"}]
+        )
+        lldp = tx.set_section_settings(
+            section="LLDPGlobalSetting", settings=[{"LLDPEnabled": "2"}]
+        )
+
+    assert mock_switch.stats["writes"] == writes + 1
+    assert forwarding.ok and lldp.ok
+    assert (
+        global_setting(mock_switch, "ForwardingGlobalSetting", "agingInterval") == "600"
+    )
+    assert global_setting(mock_switch, "LLDPGlobalSetting", "LLDPEnabled") == "2"
+
+
+def test_batch_isolates_failed_write(mock_switch, switch):
+    writes = mock_switch.stats["writes"]
+
+    with pytest.raises(Exception, match="error while flushing batch: Broken"):
+        with switch.batch() as tx:
+            lldp = tx.set_section_settings(
+                section="LLDPGlobalSetting", settings=[{"LLDPEnabled": "2"}]
+            )
+            broken = tx.submit(broken_write())
+
+    # the rejected request, then each write on its own
+    assert mock_switch.stats["writes"] == writes + 3
+    assert lldp.ok
+    assert not broken.ok
+    assert global_setting(mock_switch, "LLDPGlobalSetting", "LLDPEnabled") == "2"
+
+
+def test_batch_without_isolation_fails_every_write(mock_switch, switch):
+    writes = mock_switch.stats["writes"]
+
+    with pytest.raises(Exception, match="error while flushing batch"):
+        with switch.batch(isolate_failures=False) as tx:
+            lldp = tx.set_section_settings(
+                section="LLDPGlobalSetting", settings=[{"LLDPEnabled": "2"}]
+            )
+            tx.submit(broken_write())
+
+    assert mock_switch.stats["writes"] == writes + 1
+    assert not lldp.ok
+
+
+def test_batch_discarded_on_error(mock_switch, switch):
+    writes = mock_switch.stats["writes"]
+
+    with pytest.raises(KeyError):
+        with switch.batch() as tx:
+            tx.set_forwarding_global_settings(settings=[{"agingInterval": "600"}])
+            raise KeyError("abort")
+
+    assert mock_switch.stats["writes"] == writes
+
+
+def test_plan_batches_keeps_writes_to_a_key_apart():
+    writes = [
+        SectionWrite(section="A", node=None),
+        SectionWrite(section="B", node=None),
+        SectionWrite(section="A", node=None),
+    ]
+
+    assert [[write.key for write in batch] for batch in plan_batches(writes)] == [
+        ["A", "B"],
+        ["A"],
+    ]
+    assert len(plan_batches(writes[:2], max_sections=1)) == 2
+
+
+def answer(*statusCodes):
+    return response_xml(
+        "".join(action_status_xml("wcd", statusCode) for statusCode in statusCodes)
+    ).encode()
+
+
+def test_statuses_mapped_to_writes():
+    writes = [
+        SectionWrite(section="A", node=None),
+        SectionWrite(section="B", node=None),
+    ]
+
+    statusCode = assign_action_statuses(
+        writes, answer(StatusCode.OK, StatusCode.PAYLOAD_ERROR)
+    )
+    assert statusCode == StatusCode.PAYLOAD_ERROR
+    assert [write.ok for write in writes] == [True, False]
+
+    # a single OK covers every write
+    assert assign_action_statuses(writes, answer(StatusCode.OK)) == StatusCode.OK
+    assert all(write.ok for write in writes)
+
+    # a single error can't be pinned on one write
+    statusCode = assign_action_statuses(writes, answer(StatusCode.PAYLOAD_ERROR))
+    assert statusCode == StatusCode.PAYLOAD_ERROR
+    assert [write.actionStatus for write in writes] == [None, None]
+
+
+def test_isolation_only_resends_failed_writes():
+    class Switch:
+        def __init__(self):
+            self.requests = []
+
+        def post_writes(self, writes):
+            self.requests.append([write.key for write in writes])
+            assign_action_statuses(
+                writes,
+                answer(
+                    *(
+                        StatusCode.PAYLOAD_ERROR if write.key == "B" else StatusCode.OK
+                        for write in writes
+                    )
+                ),
+            )
+
+    switch = Switch()
+    tx = SwitchTransaction(switch)
+    for key in "ABC":
+        tx.queue(SectionWrite(section=key, node=None))
+    tx.flush()
+
+    assert switch.requests == [["A", "B", "C"], ["B"]]
+    assert [write.key for write in tx.failures] == ["B"]
@@ -0,0 +1,34 @@
+import json
+import os
+import sys
+
+import marvell_11abbe00
+from marvell_11abbe00 import benchmark
+
+
+def test_benchmark_run_and_compare(har_file, tmp_path, monkeypatch):
+    # the import benchmarks start fresh interpreters, which need to find the package
+    monkeypatch.setenv("PYTHONPATH", os.path.dirname(marvell_11abbe00.__path__[0]))
+    output = tmp_path / "results.json"
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["benchmark", "--har", har_file, "--output", str(output), "--repeat", "2"],
+    )
+    benchmark.main()
+
+    results = json.loads(output.read_text())
+    assert results["version"] == benchmark.RESULTS_FORMAT_VERSION
+    benchmarks = results["benchmarks"]
+    assert set(benchmarks) == {"builder", "parser", "imports", "replay", "setters"}
+    assert set(benchmarks["builder"]) == set(benchmark.SETTER_CASES)
+    assert set(benchmarks["imports"]) == {"interpreter", *benchmark.IMPORT_CASES}
+    assert benchmarks["setters"]["set_vlan_id"]["n"] == 2
+
+    replay = benchmarks["replay"]
+    assert replay["summary"]["sent"] == replay["entries"]
+    assert replay["transport"]["connections_opened"] == 1
+
+    lines = benchmark.compare(results, results)
+    assert lines[-1].startswith("replay: ")
+    assert all("(1.00x)" in line for line in lines[:-1])
@@ -0,0 +1,51 @@
+import requests
+
+from marvell_11abbe00.endpoints import expand_interfaces
+from marvell_11abbe00.retry import RetryPolicy
+
+POE = "PoEPSEInterfaceList"
+
+
+def poe_rows(server):
+    return {
+        entry.findtext("interfaceName"): entry.findtext("adminEnable")
+        for entry in server.state.sections[POE]
+    }
+
+
+def test_expand_interfaces():
+    assert expand_interfaces("gi0-2,te1") == ["gi0", "gi1", "gi2", "te1"]
+    assert expand_interfaces(["gi3", "gi5-gi6"]) == ["gi3", "gi5", "gi6"]
+
+
+def test_bulk_setter_sends_one_request(mock_switch, switch):
+    writes = switch.set_poe_pse_interfaces_settings(
+        interfaces="gi0-3", settings={"adminEnable": "2"}
+    )
+
+    assert sorted(writes) == ["gi0", "gi1", "gi2", "gi3"]
+    assert all(write.ok for write in writes.values())
+    assert mock_switch.stats["writes"] == 1
+    assert poe_rows(mock_switch) == {f"gi{i}": "2" for i in range(4)}
+
+
+def test_bulk_setter_without_interfaces(mock_switch, switch):
+    assert switch.set_poe_pse_interfaces_settings(interfaces=[], settings={}) == {}
+    assert mock_switch.stats["writes"] == 0
+
+
+def test_bulk_setter_records_request_errors(mock_switch, switch):
+    # one request per interface
+    switch.singleRowSections.add(POE)
+    switch.retry_policy = RetryPolicy(max_attempts=1)
+    mock_switch.fail_next(1, status=503)
+
+    writes = switch.set_poe_pse_interfaces_settings(
+        interfaces="gi0-3", settings={"adminEnable": "2"}
+    )
+
+    failed = [write for write in writes.values() if not write.ok]
+    assert len(failed) == 1
+    assert isinstance(failed[0].error, requests.HTTPError)
+    assert mock_switch.stats["writes"] == 3
+    assert len(poe_rows(mock_switch)) == 3
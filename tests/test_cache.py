@@ -0,0 +1,63 @@
+from marvell_11abbe00.cache import SectionCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl():
+    clock = Clock()
+    cache = SectionCache(ttl=10, clock=clock)
+    cache.put(("STP", "STP"), "records")
+
+    clock.now = 10
+    assert cache.get(("STP", "STP")) == "records"
+    # a shorter max_age misses without dropping the entry
+    assert cache.get(("STP", "STP"), max_age=5) is None
+    assert len(cache) == 1
+
+    clock.now = 10.5
+    assert cache.get(("STP", "STP")) is None
+    assert len(cache) == 0
+    assert cache.stats() == {"size": 0, "hits": 1, "misses": 2, "evictions": 0}
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = SectionCache(maxsize=2, clock=Clock())
+    cache.put(("A", "A"), 1)
+    cache.put(("B", "B"), 2)
+    cache.get(("A", "A"))
+    cache.put(("C", "C"), 3)
+
+    assert cache.get(("B", "B")) is None
+    assert cache.get(("A", "A")) == 1 and cache.get(("C", "C")) == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_invalidate_drops_every_query_of_a_section():
+    cache = SectionCache(clock=Clock())
+    cache.put(("PoEPSEInterfaceList", "PoEPSEInterfaceList"), 1)
+    cache.put(("PoEPSEInterfaceList", "PoEPSEInterfaceList&interfaceName=gi1"), 2)
+    cache.put(("STP", "STP"), 3)
+
+    cache.invalidate("PoEPSEInterfaceList")
+    assert len(cache) == 1 and cache.get(("STP", "STP")) == 3
+
+
+def test_switch_reads_are_cached_until_written(mock_switch, switch):
+    reads = mock_switch.stats["reads"]
+    records = switch.get_section("ForwardingGlobalSetting")
+    assert switch.get_section("ForwardingGlobalSetting") is records
+    assert mock_switch.stats["reads"] == reads + 1
+
+    switch.get_section("ForwardingGlobalSetting", max_age=0)
+    assert mock_switch.stats["reads"] == reads + 2
+
+    switch.set_forwarding_global_settings(settings=[{"agingInterval": "450"}])
+    (record,) = switch.get_section("ForwardingGlobalSetting")
+    assert mock_switch.stats["reads"] == reads + 3
+    assert record.agingInterval == "450" and record.get_int("agingInterval") == 450
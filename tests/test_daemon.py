@@ -0,0 +1,96 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import marvell_11abbe00
+from marvell_11abbe00.daemon import DaemonServer, SwitchDaemon
+
+SRC = os.path.dirname(marvell_11abbe00.__path__[0])
+
+
+def loaded_modules(module):
+    """
+    Modules a fresh interpreter has loaded once it imported module
+    """
+    code = f"import json, sys, {module}; print(json.dumps(sorted(sys.modules)))"
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": SRC},
+    )
+    return set(json.loads(result.stdout))
+
+
+@pytest.mark.parametrize(
+    "module",
+    ["marvell_11abbe00.switch", "marvell_11abbe00.replay", "marvell_11abbe00.snapshot"],
+)
+def test_entry_points_do_not_load_the_http_stack(module):
+    modules = loaded_modules(module)
+    assert not {"requests", "urllib3", "haralyzer"} & modules
+
+
+def test_client_only_loads_the_standard_library():
+    modules = loaded_modules("marvell_11abbe00.client")
+    assert {name for name in modules if name.startswith("marvell_11abbe00")} == {
+        "marvell_11abbe00",
+        "marvell_11abbe00.client",
+    }
+
+
+def run_client(*argv):
+    """
+    Run the client in its own interpreter, the daemon redirects the output of this one
+    while a command runs
+    """
+    return subprocess.run(
+        [sys.executable, "-m", "marvell_11abbe00.client", *argv],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": SRC},
+    )
+
+
+def test_daemon_keeps_switch_warm(mock_switch, tmp_path):
+    path = str(tmp_path / "daemon.sock")
+    server = DaemonServer(path, SwitchDaemon())
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,))
+    thread.start()
+    try:
+        for name in ("first", "second"):
+            assert (
+                run_client(
+                    "--socket",
+                    path,
+                    "snapshot",
+                    "--host",
+                    mock_switch.address,
+                    "--section",
+                    "STP",
+                    "--output",
+                    str(tmp_path / name),
+                ).returncode
+                == 0
+            )
+        # both commands ran in the session the first one opened
+        assert mock_switch.stats["logins"] == 1
+        assert (tmp_path / "second").exists()
+
+        status = run_client("--socket", path, "status")
+        assert status.returncode == 0
+        assert f"{mock_switch.address} cisco: 2 commands" in status.stdout
+        assert run_client("--socket", path, "stop").returncode == 0
+        thread.join(5)
+    finally:
+        server.shutdown()
+        thread.join()
+        server.server_close()
+
+    assert not os.path.exists(path)
+    assert run_client("--socket", path, "--no-fallback", "status").returncode == 1
@@ -0,0 +1,67 @@
+from marvell_11abbe00.fleet import FleetHost, FleetRunner, load_inventory, replay_plan
+from marvell_11abbe00.mock_server import MockSwitchServer, MockSwitchState
+from marvell_11abbe00.retry import RetryPolicy
+
+
+def test_load_inventory(tmp_path):
+    text = tmp_path / "hosts.txt"
+    text.write_text("# lab\nhttp://a admin secret\nhttp://b  # default user\n")
+    inventory = load_inventory(text)
+    assert [(h.host, h.username, h.password) for h in inventory] == [
+        ("http://a", "admin", "secret"),
+        ("http://b", "cisco", "cisco"),
+    ]
+
+    json = tmp_path / "hosts.json"
+    json.write_text('[{"host": "http://c", "username": "admin"}]')
+    assert [(h.host, h.username) for h in load_inventory(json)] == [
+        ("http://c", "admin")
+    ]
+
+
+def test_replay_plan_on_every_host(plan, har_file):
+    events = []
+    with (
+        MockSwitchServer(state=MockSwitchState.from_har(har_file)) as a,
+        MockSwitchServer(state=MockSwitchState.from_har(har_file)) as b,
+    ):
+        runner = FleetRunner(
+            [FleetHost(a.address), FleetHost(b.address)],
+            replay_plan(plan),
+            progress=lambda host, event, detail: events.append((host, event)),
+        )
+        results = runner.run()
+
+        assert a.stats["writes"] == b.stats["writes"] > 0
+
+    assert all(result.ok for result in results.values())
+    assert {result.result["ok"] for result in results.values()} == {len(plan)}
+    assert sorted(events.count((host, "finished")) for host in results) == [1, 1]
+
+
+def test_entry_errors_fail_the_host(mock_switch):
+    runner = FleetRunner(
+        [FleetHost(mock_switch.address)],
+        lambda switch, fleetHost, progress: {"sent": 3, "ok": 1, "errors": 2},
+    )
+    result = runner.run()[mock_switch.address]
+
+    assert result.error is None
+    assert result.entryErrors == 2
+    assert not result.ok
+    assert "entry_errors=2" in str(result)
+
+
+def test_unreachable_host_fails(mock_switch):
+    address = mock_switch.address
+    mock_switch.stop()
+
+    runner = FleetRunner(
+        [FleetHost(address)],
+        lambda switch, fleetHost, progress: None,
+        retry_policy=RetryPolicy(max_attempts=1),
+    )
+    result = runner.run()[address]
+
+    assert result.error is not None
+    assert not result.ok
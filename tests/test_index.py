@@ -0,0 +1,108 @@
+from marvell_11abbe00.fleet import FleetHost
+from marvell_11abbe00.index import ConfigIndex, load_index, refresh_index, save_index
+
+GI1 = (("interfaceName", "gi1"),)
+GI2 = (("interfaceName", "gi2"),)
+
+
+def hits(results):
+    return [(hit.host, hit.section, hit.interfaceName) for hit in results]
+
+
+def build_index():
+    index = ConfigIndex()
+    index.ingest(
+        "a",
+        "PoEPSEInterfaceList",
+        {GI1: {"powerPriority": "1"}, GI2: {"powerPriority": "3"}},
+        fetched=100.0,
+    )
+    index.ingest(
+        "a",
+        "VLANInterfaceISList",
+        {GI1: {"trunkMemberVLANs": "1-3,10"}, GI2: {"trunkMemberVLANs": "20"}},
+        fetched=100.0,
+    )
+    index.ingest(
+        "b",
+        "PoEPSEInterfaceList",
+        {GI1: {"powerPriority": "1"}},
+        fetched=100.0,
+    )
+    return index
+
+
+def test_lookup_and_find():
+    index = build_index()
+
+    assert hits(index.lookup("PoEPSEInterfaceList", "powerPriority", 1)) == [
+        ("a", "PoEPSEInterfaceList", "gi1"),
+        ("b", "PoEPSEInterfaceList", "gi1"),
+    ]
+    # VLAN lists match on membership
+    assert hits(index.find("trunkMemberVLANs", "2")) == [
+        ("a", "VLANInterfaceISList", "gi1")
+    ]
+    assert hits(index.query("trunkMemberVLANs=3,10")) == hits(
+        index.find("trunkMemberVLANs", "2")
+    )
+    assert index.query("trunkMemberVLANs=3-11") == []
+    assert hits(index.query("PoEPSEInterfaceList.powerPriority=3")) == [
+        ("a", "PoEPSEInterfaceList", "gi2")
+    ]
+    assert index.stats() == {"hosts": 2, "rows": 5, "terms": 2, "vlan_lists": 2}
+
+
+def test_ingest_replaces_and_remove_drops_rows():
+    index = build_index()
+
+    index.ingest("a", "PoEPSEInterfaceList", {GI2: {"powerPriority": "1"}})
+    assert hits(index.lookup("PoEPSEInterfaceList", "powerPriority", "1")) == [
+        ("a", "PoEPSEInterfaceList", "gi2"),
+        ("b", "PoEPSEInterfaceList", "gi1"),
+    ]
+    assert index.lookup("PoEPSEInterfaceList", "powerPriority", "3") == []
+
+    index.remove("a", "VLANInterfaceISList")
+    assert index.find("trunkMemberVLANs", "20") == []
+    assert index.stale_sections("a", ["VLANInterfaceISList"]) == ["VLANInterfaceISList"]
+
+    index.remove("a")
+    index.remove("b")
+    assert index.rows == {} and index.fetched == {}
+    assert index.stats() == {"hosts": 0, "rows": 0, "terms": 0, "vlan_lists": 0}
+
+
+def test_save_and_load(tmp_path):
+    index = build_index()
+    path = tmp_path / "index.json.gz"
+    save_index(index, path)
+
+    loaded = load_index(path)
+    assert loaded.to_dict() == index.to_dict()
+    assert hits(loaded.find("trunkMemberVLANs", "10")) == hits(
+        index.find("trunkMemberVLANs", "10")
+    )
+    assert loaded.stale_sections("a", ["PoEPSEInterfaceList"], max_age=60) == [
+        "PoEPSEInterfaceList"
+    ]
+
+
+def test_refresh_from_switches(mock_switch, switch):
+    switch.set_interface_vlan_settings(
+        interfaceName="gi1", settings=[{"trunkMemberVLANs": "1-3,2363"}]
+    )
+    index = ConfigIndex()
+    sections = ["VLANInterfaceISList", "PoEPSEInterfaceList"]
+    inventory = [FleetHost(mock_switch.address), FleetHost("http://127.0.0.1:9")]
+
+    errors = refresh_index(index, inventory, sections)
+    assert list(errors) == ["http://127.0.0.1:9"]
+    assert hits(index.find("trunkMemberVLANs", "2363")) == [
+        (mock_switch.address, "VLANInterfaceISList", "gi1")
+    ]
+
+    # sections indexed moments ago aren't read again
+    reads = mock_switch.stats["reads"]
+    refresh_index(index, inventory[:1], sections)
+    assert mock_switch.stats["reads"] == reads
@@ -0,0 +1,66 @@
+from marvell_11abbe00.instrument import LatencyAggregator, percentile, summarize
+from marvell_11abbe00.response import StatusCode
+
+
+def test_percentiles():
+    samples = [float(value) for value in range(1, 101)]
+    assert percentile(samples, 0.5) == 50 and percentile(samples, 0.99) == 99
+    assert percentile([], 0.5) is None
+    assert summarize([3.0, 1.0, 2.0]) == {
+        "n": 3,
+        "min": 1.0,
+        "mean": 2.0,
+        "p50": 2.0,
+        "p95": 3.0,
+        "p99": 3.0,
+        "max": 3.0,
+    }
+
+
+def test_observers_see_every_request(switch):
+    events_seen = []
+    events = switch.add_observer(events_seen.append)
+    aggregator = switch.add_observer(LatencyAggregator())
+
+    def broken(event):
+        raise RuntimeError("observer bug")
+
+    # a failing observer doesn't fail the request
+    switch.add_observer(broken)
+
+    switch.get_section("PoEPSEInterfaceList", "gi1")
+    switch.set_poe_pse_interface_settings(
+        interfaceName="gi1", settings=[{"powerPriority": "2"}]
+    )
+    switch.remove_observer(events)
+    switch.get_section("PoEPSEInterfaceList", max_age=0)
+
+    read, write = events_seen
+    assert (read.method, read.kind, read.section) == (
+        "GET",
+        "read",
+        "PoEPSEInterfaceList",
+    )
+    assert read.interfaces == ["gi1"] and read.responseBytes > 0
+    assert (write.method, write.kind, write.interfaces) == ("POST", "write", ["gi1"])
+    assert write.statusCode == StatusCode.OK and write.payloadBytes > 0
+    for event in events_seen:
+        assert event.error is None and event.duration > 0
+        assert {"server_wait", "download"} <= set(event.timings)
+    assert "parse" in write.timings
+
+    summary = aggregator.summary()
+    assert summary[("GET", "PoEPSEInterfaceList")]["total"]["n"] == 2
+    assert summary[("POST", "PoEPSEInterfaceList")]["total"]["n"] == 1
+    assert len(aggregator.report().splitlines()) == 3
+
+    metrics = aggregator.openmetrics()
+    assert metrics.endswith("# EOF\n")
+    assert (
+        'marvell_wcd_request_duration_seconds_count{method="GET",'
+        'section="PoEPSEInterfaceList"} 2'
+    ) in metrics
+    assert (
+        'marvell_wcd_requests_total{method="POST",'
+        'section="PoEPSEInterfaceList",status="OK"} 1'
+    ) in metrics
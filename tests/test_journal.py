@@ -0,0 +1,97 @@
+import os
+
+from marvell_11abbe00 import replay
+from marvell_11abbe00.journal import ReplayJournal
+from marvell_11abbe00.response import StatusCode
+
+
+def replay_args(server, har_file, *options):
+    return replay.build_parser().parse_args(
+        ["--host", server.address, "--har", har_file, *options]
+    )
+
+
+def test_resume_skips_confirmed_entries(mock_switch, switch, plan, har_file, tmp_path):
+    # a replay interrupted after its first entries
+    with ReplayJournal.open(tmp_path, plan, mock_switch.address) as journal:
+        replay.replay_entries(
+            switch, plan.entries[:100], "cisco", "cisco", journal=journal
+        )
+        confirmed = set(journal.confirmed)
+    assert confirmed and max(confirmed) < 100
+
+    summary = replay.run(
+        replay_args(mock_switch, har_file, "--resume", "--journal-dir", str(tmp_path)),
+        switch=switch,
+        plan=plan,
+    )
+
+    assert summary["skipped"] == len(confirmed)
+    assert summary["ok"] + summary["skipped"] == len(plan)
+    # a complete replay removes its journal
+    assert os.listdir(tmp_path) == []
+
+
+def test_journal_of_another_host_is_not_resumed(mock_switch, switch, plan, tmp_path):
+    with ReplayJournal.open(tmp_path, plan, "http://elsewhere") as journal:
+        journal.record(0, None)
+    with ReplayJournal.open(tmp_path, plan, mock_switch.address) as journal:
+        replay.replay_entries(
+            switch, plan.entries[:10], "cisco", "cisco", journal=journal
+        )
+
+    with ReplayJournal.open(
+        tmp_path, plan, mock_switch.address, resume=True
+    ) as journal:
+        assert journal.confirmed
+    with ReplayJournal.open(tmp_path, plan, "http://elsewhere", resume=True) as journal:
+        assert not journal.confirmed
+
+
+def test_replay_without_session(mock_switch, plan, har_file):
+    from marvell_11abbe00.switch import SwitchConfigurationManager
+    from marvell_11abbe00.transport import SwitchTransport
+
+    switch = SwitchConfigurationManager(
+        mock_switch.address, transport=SwitchTransport()
+    )
+    switch.login()
+    try:
+        summary = replay.run(
+            replay_args(mock_switch, har_file, "--no-journal"), switch=switch, plan=plan
+        )
+    finally:
+        switch.transport.close()
+
+    assert summary["ok"] == len(plan)
+
+
+def test_unreadable_journal_is_started_over(plan, tmp_path):
+    with ReplayJournal.open(tmp_path, plan, "http://switch") as journal:
+        path = journal.path
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"version":0}\n{"index":0,"status":"OK"}\n')
+
+    with ReplayJournal.open(tmp_path, plan, "http://switch", resume=True) as journal:
+        assert not journal.confirmed
+        journal.record(1, StatusCode.OK)
+
+    # the records written after starting over are resumed
+    with ReplayJournal.open(tmp_path, plan, "http://switch", resume=True) as journal:
+        assert journal.confirmed == {1}
+
+
+def test_torn_line_is_dropped_on_resume(plan, tmp_path):
+    with ReplayJournal.open(tmp_path, plan, "http://switch") as journal:
+        journal.record(0, StatusCode.OK)
+        path = journal.path
+    # crashed while writing the next record
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"index":1,"sta')
+
+    with ReplayJournal.open(tmp_path, plan, "http://switch", resume=True) as journal:
+        assert journal.confirmed == {0}
+        journal.record(2, StatusCode.OK)
+
+    with ReplayJournal.open(tmp_path, plan, "http://switch", resume=True) as journal:
+        assert journal.confirmed == {0, 2}
@@ -0,0 +1,65 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from marvell_11abbe00.mac_table import ADDED, MOVED, REMOVED, MACTableTracker
+
+
+def set_secure_table(server, rows):
+    table = ET.Element("SecureAddressTable", {"type": "section"})
+    for interfaceName, vlan, mac in rows:
+        entry = ET.SubElement(table, "Entry")
+        ET.SubElement(entry, "interfaceName").text = interfaceName
+        ET.SubElement(entry, "VLANID").text = str(vlan)
+        ET.SubElement(entry, "MACAddress").text = mac
+    server.state.sections["SecureAddressTable"] = table
+
+
+def changes(tracker):
+    return sorted((change.kind, change.entry.mac) for change in tracker.poll())
+
+
+def test_tracker_reports_changes(mock_switch, switch):
+    set_secure_table(
+        mock_switch, [("gi0", 1, "00:00:00:00:00:01"), ("gi1", 2, "00:00:00:00:00:02")]
+    )
+    tracker = MACTableTracker(switch, "secure", interfaces="gi0-1")
+    assert changes(tracker) == [
+        (ADDED, "00:00:00:00:00:01"),
+        (ADDED, "00:00:00:00:00:02"),
+    ]
+    assert changes(tracker) == []
+
+    set_secure_table(
+        mock_switch, [("gi1", 1, "00:00:00:00:00:01"), ("gi1", 3, "00:00:00:00:00:03")]
+    )
+    assert changes(tracker) == [
+        (ADDED, "00:00:00:00:00:03"),
+        (MOVED, "00:00:00:00:00:01"),
+        (REMOVED, "00:00:00:00:00:02"),
+    ]
+    assert len(tracker) == 2
+
+
+def test_failed_poll_keeps_previous_entries(mock_switch, switch, monkeypatch):
+    set_secure_table(mock_switch, [("gi0", 1, "00:00:00:00:00:01")])
+    tracker = MACTableTracker(switch, "secure", interfaces="gi0-1")
+    tracker.poll_all()
+
+    set_secure_table(
+        mock_switch, [("gi0", 1, "00:00:00:00:00:01"), ("gi0", 2, "00:00:00:00:00:02")]
+    )
+    stream = switch.stream_section_records
+
+    def failing_stream(sections, section=None):
+        if "gi1" in sections[0]:
+            raise ConnectionError("lost the switch")
+        return stream(sections, section)
+
+    monkeypatch.setattr(switch, "stream_section_records", failing_stream)
+    with pytest.raises(ConnectionError):
+        tracker.poll_all()
+    monkeypatch.undo()
+
+    # learned while the poll failed, still reported
+    assert changes(tracker) == [(ADDED, "00:00:00:00:00:02")]
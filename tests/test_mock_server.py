@@ -0,0 +1,80 @@
+import pytest
+
+from marvell_11abbe00.mock_server import MockSwitchState
+from marvell_11abbe00.response import StatusCode
+from marvell_11abbe00.switch import SwitchConfigurationManager
+from marvell_11abbe00.transport import SwitchTransport
+
+
+def test_state_seeded_from_capture(har_file):
+    state = MockSwitchState.from_har(har_file)
+
+    assert state.sections["PoEGlobalSetting"].findtext("powerLimitMode") == "5"
+
+
+def test_state_write_applies_set_and_delete():
+    state = MockSwitchState()
+    assert (
+        state.write(
+            b'<DeviceConfiguration><VLANList action="set">'
+            b"<VLAN><VLANID>10</VLANID></VLAN><VLAN><VLANID>20</VLANID></VLAN>"
+            b"</VLANList></DeviceConfiguration>"
+        )
+        == StatusCode.OK
+    )
+    assert (
+        state.write(
+            b'<DeviceConfiguration><VLANList action="delete">'
+            b"<VLAN><VLANID>10</VLANID></VLAN></VLANList></DeviceConfiguration>"
+        )
+        == StatusCode.OK
+    )
+
+    assert [vlan.findtext("VLANID") for vlan in state.sections["VLANList"]] == ["20"]
+    assert state.write(b"<DeviceConfiguration><VLANList/>") == StatusCode.PAYLOAD_ERROR
+    assert (
+        state.write(b"<DeviceConfiguration><VLANList/></DeviceConfiguration>")
+        == StatusCode.PAYLOAD_ERROR
+    )
+
+
+def test_multi_section_read(switch):
+    xmltree = switch.fetch_sections_xml(["PoEGlobalSetting", "Standard802_3List"])
+
+    sections = [node.tag for node in xmltree.find("DeviceConfiguration")]
+    assert sections == ["version", "PoEGlobalSetting", "Standard802_3List"]
+
+
+def test_interface_filter(switch):
+    xmltree = switch.fetch_sections_xml(["Standard802_3List&interfaceName=gi1"])
+
+    names = {node.text for node in xmltree.iter("interfaceName")}
+    assert names == {"gi1"}
+
+
+def test_unknown_session_rejected(mock_switch):
+    switch = SwitchConfigurationManager(
+        mock_switch.address, transport=SwitchTransport()
+    )
+    switch.token = "UserId=127.0.0.1&1&;path=/"
+    try:
+        xmltree = switch.fetch_sections_xml(["PoEGlobalSetting"])
+    finally:
+        switch.transport.close()
+
+    assert xmltree.findtext("ActionStatus/statusCode") == "4"
+    assert mock_switch.stats["rejected"] == 1
+    assert mock_switch.stats["reads"] == 0
+
+
+def test_wrong_password_rejected(mock_switch):
+    switch = SwitchConfigurationManager(
+        mock_switch.address, transport=SwitchTransport()
+    )
+    try:
+        with pytest.raises(Exception):
+            switch.login("cisco", "wrong")
+    finally:
+        switch.transport.close()
+
+    assert not mock_switch.sessions
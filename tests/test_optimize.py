@@ -0,0 +1,67 @@
+from marvell_11abbe00.mock_server import MockSwitchServer, MockSwitchState
+from marvell_11abbe00.optimize import (
+    OptimizationReport,
+    UnsupportedWrite,
+    analyze_write,
+    merge_consecutive,
+    optimize_plan,
+)
+from marvell_11abbe00.replay import replay_entries
+from marvell_11abbe00.snapshot import normalize_section
+
+
+def mock_state(server):
+    return {
+        name: normalize_section(section)
+        for name, section in server.state.sections.items()
+    }
+
+
+def single_row_write(plan):
+    for entry in plan.entries:
+        if entry.method != "POST":
+            continue
+        try:
+            shape = analyze_write(entry)
+        except UnsupportedWrite:
+            continue
+        if shape is not None and shape.section and len(shape.rows) == 1:
+            return entry, shape
+
+
+def test_optimized_plan_reaches_same_state(
+    mock_switch, switch, plan, har_file, connect
+):
+    optimized, report = optimize_plan(plan)
+    assert len(optimized) == report.after < len(plan)
+    assert report.removed > 0
+
+    summary = replay_entries(switch, plan.entries, "cisco", "cisco")
+    assert summary["errors"] == 0
+    with MockSwitchServer(state=MockSwitchState.from_har(har_file)) as server:
+        summary = replay_entries(connect(server), optimized.entries, "cisco", "cisco")
+
+        assert summary["errors"] == 0
+        assert server.stats["writes"] < mock_switch.stats["writes"]
+        assert mock_state(server) == mock_state(mock_switch)
+
+
+def test_optimize_plan_is_stable(plan):
+    optimized, _ = optimize_plan(plan)
+    again, report = optimize_plan(optimized)
+
+    assert report.removed == 0
+    assert len(again) == len(optimized)
+
+
+def test_merge_consecutive_stops_at_read(plan):
+    write, shape = single_row_write(plan)
+    read = next(entry for entry in plan.entries if entry.method == "GET")
+
+    merged = merge_consecutive([(write, shape), (write, shape)], OptimizationReport(2))
+    assert len(merged) == 1
+
+    # the read must see the first write, the second one can't be folded into it
+    items = [(write, shape), (read, None), (write, shape)]
+    kept = merge_consecutive(items, OptimizationReport(3))
+    assert [entry.method for entry, _ in kept] == ["POST", "GET", "POST"]
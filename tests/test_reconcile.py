@@ -0,0 +1,67 @@
+def test_reconcile_skips_matching_writes(mock_switch, switch):
+    with switch.reconcile() as tx:
+        first = tx.set_forwarding_global_settings(settings=[{"agingInterval": "600"}])
+    assert first.ok and not first.skipped
+
+    writes, reads = mock_switch.stats["writes"], mock_switch.stats["reads"]
+    with switch.reconcile() as tx:
+        second = tx.set_forwarding_global_settings(settings=[{"agingInterval": "600"}])
+
+    assert second.skipped
+    assert mock_switch.stats["writes"] == writes
+    # the current values of every section come from a single read
+    assert mock_switch.stats["reads"] == reads + 1
+
+
+def test_reconcile_sends_only_changed_fields(mock_switch, switch):
+    switch.set_section_settings(
+        section="LLDPGlobalSetting",
+        settings=[{"LLDPEnabled": "1", "chassisIdSource": "7"}],
+    )
+
+    with switch.reconcile() as tx:
+        write = tx.set_section_settings(
+            section="LLDPGlobalSetting",
+            settings=[{"LLDPEnabled": "2", "chassisIdSource": "7"}],
+        )
+
+    sent = write.node.build()
+    assert sent.find(".//LLDPEnabled") is not None
+    assert sent.find(".//chassisIdSource") is None
+    entry = mock_switch.state.sections["LLDPGlobalSetting"].find("Entry")
+    assert entry.findtext("LLDPEnabled") == "2"
+    assert entry.findtext("chassisIdSource") == "7"
+
+
+def test_reconcile_compares_vlan_lists_as_sets(mock_switch, switch):
+    switch.set_interface_vlan_settings(
+        interfaceName="gi1", settings=[{"trunkMemberVLANs": "1-3,10"}]
+    )
+
+    writes = mock_switch.stats["writes"]
+    with switch.reconcile() as tx:
+        write = tx.set_interface_vlan_settings(
+            interfaceName="gi1", settings=[{"trunkMemberVLANs": "10,3,2,1"}]
+        )
+
+    assert write.skipped
+    assert mock_switch.stats["writes"] == writes
+
+    with switch.reconcile() as tx:
+        write = tx.set_interface_vlan_settings(
+            interfaceName="gi1", settings=[{"trunkMemberVLANs": "1-3"}]
+        )
+
+    assert not write.skipped
+    assert mock_switch.stats["writes"] == writes + 1
+
+
+def test_reconcile_tracks_writes_within_transaction(mock_switch, switch):
+    writes = mock_switch.stats["writes"]
+    with switch.reconcile() as tx:
+        first = tx.set_forwarding_global_settings(settings=[{"agingInterval": "900"}])
+        again = tx.set_forwarding_global_settings(settings=[{"agingInterval": "900"}])
+
+    assert not first.skipped
+    assert again.skipped
+    assert mock_switch.stats["writes"] == writes + 1
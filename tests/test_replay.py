@@ -0,0 +1,45 @@
+from marvell_11abbe00 import replay
+from marvell_11abbe00.mock_server import MockSwitchServer, MockSwitchState
+from marvell_11abbe00.snapshot import normalize_section, take_snapshot
+
+
+def replay_args(server, har_file, *options):
+    return replay.build_parser().parse_args(
+        ["--host", server.address, "--har", har_file, *options]
+    )
+
+
+def mock_state(server):
+    return {
+        name: normalize_section(section)
+        for name, section in server.state.sections.items()
+    }
+
+
+def test_replay_applies_every_entry(mock_switch, switch, plan, har_file):
+    before = take_snapshot(switch)
+
+    summary = replay.run(
+        replay_args(mock_switch, har_file, "--no-journal"), switch=switch, plan=plan
+    )
+
+    assert summary["ok"] == len(plan)
+    assert summary["errors"] == 0
+    assert mock_switch.stats["writes"] > 0
+    assert take_snapshot(switch).digest != before.digest
+
+
+def test_pipelined_replay_matches_sequential(
+    mock_switch, switch, plan, har_file, connect
+):
+    summary = replay.replay_entries(switch, plan.entries, "cisco", "cisco")
+    assert summary["ok"] == len(plan)
+
+    with MockSwitchServer(state=MockSwitchState.from_har(har_file)) as server:
+        pipelined = connect(server)
+        summary = replay.replay_entries_pipelined(
+            pipelined, plan.entries, "cisco", "cisco", max_in_flight=8
+        )
+
+        assert summary["ok"] == len(plan)
+        assert mock_state(server) == mock_state(mock_switch)
@@ -0,0 +1,115 @@
+import pytest
+import requests
+
+from marvell_11abbe00.response import StatusCode
+from marvell_11abbe00.retry import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+    call_with_retry,
+)
+
+
+def no_backoff():
+    return RetryPolicy(base_delay=0)
+
+
+def test_transport_errors_are_retried():
+    failures = [requests.ConnectionError("reset"), requests.ReadTimeout("slow")]
+
+    def attempt(deadline):
+        if failures:
+            raise failures.pop(0)
+        return "answer", StatusCode.OK
+
+    assert call_with_retry(attempt, policy=no_backoff()) == ("answer", 3)
+
+
+def test_non_idempotent_write_is_not_resent():
+    sent = []
+
+    def attempt(deadline):
+        sent.append(1)
+        raise requests.ReadTimeout("slow")
+
+    with pytest.raises(requests.ReadTimeout):
+        call_with_retry(attempt, policy=no_backoff(), idempotent=False)
+    assert len(sent) == 1
+
+
+def test_rejected_session_logs_in_again():
+    statuses = [StatusCode.AUTHENTICATION_ERROR, StatusCode.OK]
+    relogins = []
+
+    def attempt(deadline):
+        return None, statuses.pop(0)
+
+    _, sent = call_with_retry(
+        attempt, policy=no_backoff(), relogin=lambda: relogins.append(1)
+    )
+    assert sent == 2
+    assert len(relogins) == 1
+
+
+def test_breaker_opens_after_consecutive_failures():
+    now = [0.0]
+    breaker = CircuitBreaker(
+        failure_threshold=2, reset_timeout=10, clock=lambda: now[0]
+    )
+
+    def attempt(deadline):
+        raise requests.ConnectionError("unreachable")
+
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            call_with_retry(
+                attempt, policy=RetryPolicy(max_attempts=1), breaker=breaker
+            )
+    with pytest.raises(CircuitOpenError):
+        call_with_retry(attempt, policy=RetryPolicy(max_attempts=1), breaker=breaker)
+
+    # a trial request once the timeout passed closes it again
+    now[0] = 10.0
+    assert call_with_retry(
+        lambda deadline: (None, StatusCode.OK), policy=RetryPolicy(), breaker=breaker
+    ) == (None, 1)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_streamed_read_renews_rejected_session(mock_switch, switch):
+    generation = switch.session.generation
+    # the switch forgot the session
+    mock_switch.sessions.clear()
+
+    records = list(
+        switch.stream_section_records(["PoEGlobalSetting"], "PoEGlobalSetting")
+    )
+
+    assert records
+    assert switch.session.generation == generation + 1
+
+
+def test_gateway_errors_are_retried(mock_switch, switch):
+    switch.retry_policy = no_backoff()
+    mock_switch.fail_next(2, status=503)
+
+    xmltree = switch.fetch_sections_xml(["PoEGlobalSetting"])
+
+    assert xmltree.findtext(".//powerLimitMode") == "5"
+    assert mock_switch.stats["unavailable"] == 2
+
+    mock_switch.fail_next(1, status=502)
+    write = switch.set_forwarding_global_settings(settings=[{"agingInterval": "600"}])
+
+    assert write.ok
+    assert mock_switch.stats["unavailable"] == 3
+
+
+def test_gateway_error_counts_as_breaker_failure(mock_switch, switch):
+    switch.retry_policy = RetryPolicy(max_attempts=1)
+    mock_switch.fail_next(1, status=504)
+
+    with pytest.raises(requests.HTTPError):
+        switch.fetch_sections_xml(["PoEGlobalSetting"])
+
+    assert switch.breaker.failures == 1
@@ -0,0 +1,76 @@
+import time
+
+from marvell_11abbe00 import replay
+from marvell_11abbe00.session import SwitchSession
+from marvell_11abbe00.switch import SwitchConfigurationManager
+from marvell_11abbe00.transport import SwitchTransport
+
+
+def test_expiring_session_is_renewed_before_use(mock_switch, switch):
+    session = switch.session
+    generation = session.generation
+    # idle for longer than the switch keeps a session
+    session.lastUsed -= session.idle_timeout
+
+    switch.set_forwarding_global_settings(settings=[{"agingInterval": "600"}])
+
+    assert session.generation == generation + 1
+    assert mock_switch.stats["rejected"] == 0
+
+
+def test_rejected_session_is_renewed(mock_switch, switch):
+    generation = switch.session.generation
+    # the switch forgot the session
+    mock_switch.sessions.clear()
+
+    write = switch.set_forwarding_global_settings(settings=[{"agingInterval": "600"}])
+
+    assert write.ok
+    assert switch.session.generation == generation + 1
+
+
+def test_refresh_of_a_stale_generation_logs_in_once(mock_switch, switch):
+    session = switch.session
+    generation = session.generation
+    logins = mock_switch.stats["logins"]
+
+    # two workers found the same token rejected
+    session.refresh(generation)
+    session.refresh(generation)
+
+    assert session.generation == generation + 1
+    assert mock_switch.stats["logins"] == logins + 1
+
+
+def test_keep_alive_holds_idle_session(mock_switch):
+    mock_switch.session_ttl = 0.5
+    switch = SwitchConfigurationManager(
+        mock_switch.address, transport=SwitchTransport()
+    )
+    try:
+        with SwitchSession(switch, keep_alive_interval=0.1) as session:
+            time.sleep(1.0)
+            assert session.keepAlives > 0
+            write = switch.set_forwarding_global_settings(
+                settings=[{"agingInterval": "600"}]
+            )
+            assert write.ok
+            assert session.logins == 1
+    finally:
+        switch.transport.close()
+
+
+def test_unreadable_answer_is_reported(monkeypatch, switch, plan):
+    class Garbage:
+        status_code = 200
+        headers = {}
+        content = b"<html>busy</html>"
+        text = content.decode()
+
+    monkeypatch.setattr(replay, "request_process", lambda *args, **kwargs: Garbage())
+    write = next(entry for entry in plan.entries if entry.method == "POST")
+
+    sent, ok = replay.replay_entry(switch, write, "cisco", "cisco", "0 / 1")
+
+    assert sent == 1
+    assert not ok
@@ -0,0 +1,88 @@
+import pytest
+
+from marvell_11abbe00.response import StatusCode
+from marvell_11abbe00.retry import ResponseError
+from marvell_11abbe00.snapshot import (
+    diff_snapshots,
+    load_snapshot,
+    restore_snapshot,
+    save_snapshot,
+    take_snapshot,
+)
+
+
+def test_snapshot_diff_and_restore(mock_switch, switch, connect):
+    switch.set_forwarding_global_settings(settings=[{"agingInterval": "300"}])
+    before = take_snapshot(switch)
+    assert diff_snapshots(before, take_snapshot(switch)) == []
+
+    # changed behind the back of the first manager
+    other = connect(mock_switch)
+    other.set_forwarding_global_settings(settings=[{"agingInterval": "600"}])
+    other.set_stp_global_settings(settings=[{"STPEnabled": "2"}])
+
+    after = take_snapshot(switch, previous=before)
+    changes = diff_snapshots(before, after)
+    assert {(section, field) for section, _, field, _, _ in changes} == {
+        ("ForwardingGlobalSetting", "agingInterval"),
+        # a row that didn't exist before
+        ("SpanningTreeGlobalParam", None),
+    }
+    aging = next(change for change in changes if change[2] == "agingInterval")
+    assert aging[3:] == ("300", "600")
+
+    writes = mock_switch.stats["writes"]
+    results = restore_snapshot(switch, before)
+    # only the section whose values differ is written
+    assert [write.section for write in results if not write.skipped] == [
+        "ForwardingGlobalSetting"
+    ]
+    assert mock_switch.stats["writes"] == writes + 1
+
+    # a restore only sets fields, the row added since stays
+    restored = take_snapshot(switch)
+    assert [change[0] for change in diff_snapshots(before, restored)] == [
+        "SpanningTreeGlobalParam"
+    ]
+
+
+def test_snapshot_reuses_unchanged_sections(mock_switch, switch, connect, tmp_path):
+    path = tmp_path / "switch.snapshot.gz"
+    save_snapshot(take_snapshot(switch), path)
+    before = load_snapshot(path)
+
+    other = connect(mock_switch)
+    other.set_forwarding_global_settings(settings=[{"agingInterval": "600"}])
+    reads = mock_switch.stats["reads"]
+    after = take_snapshot(switch, previous=before)
+
+    # every section is read again, whoever changed it
+    assert mock_switch.stats["reads"] > reads
+    reused = {
+        name
+        for name, section in after.sections.items()
+        if section.records is before.sections[name].records
+    }
+    assert reused == set(after.sections) - {"ForwardingGlobalSetting"}
+    assert [change[0] for change in diff_snapshots(before, after)] == [
+        "ForwardingGlobalSetting"
+    ]
+
+
+def test_rejected_read_fails_snapshot(mock_switch):
+    from marvell_11abbe00.switch import SwitchConfigurationManager
+    from marvell_11abbe00.transport import SwitchTransport
+
+    # without a SwitchSession a rejected session isn't renewed
+    switch = SwitchConfigurationManager(
+        mock_switch.address, transport=SwitchTransport()
+    )
+    switch.login()
+    mock_switch.sessions.clear()
+    try:
+        with pytest.raises(ResponseError) as error:
+            take_snapshot(switch)
+    finally:
+        switch.transport.close()
+
+    assert error.value.statusCode == StatusCode.AUTHENTICATION_ERROR
@@ -0,0 +1,79 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from marvell_11abbe00.benchmark import load_har_bodies
+from marvell_11abbe00.response import (
+    ActionStatus,
+    SectionRecord,
+    StatusCode,
+    parse_section_records,
+)
+from marvell_11abbe00.stream import (
+    iter_response,
+    iter_section_records,
+    parse_action_status,
+)
+
+
+def chunked(body, size):
+    starts = range(0, len(body), size)
+    return [body[start:end] for start, end in zip(starts, [*starts[1:], None])]
+
+
+def dom_records(body):
+    records = []
+    for deviceConfiguration in ET.fromstring(body).iter("DeviceConfiguration"):
+        for section in deviceConfiguration:
+            if section.get("type") == "section":
+                records += parse_section_records(section)
+    return records
+
+
+def as_tuples(records):
+    return sorted(
+        (record.section, record.path, sorted(record.fields.items()))
+        for record in records
+    )
+
+
+@pytest.fixture(scope="module")
+def bodies(har_file):
+    bodies = load_har_bodies(har_file)
+    assert bodies
+    return bodies
+
+
+@pytest.mark.parametrize("size", [1, 7, 4096, None])
+def test_stream_matches_dom_parser(bodies, size):
+    for body in bodies:
+        items = list(iter_response(chunked(body, size) if size else [body]))
+        records = [item for item in items if isinstance(item, SectionRecord)]
+        statuses = [item for item in items if isinstance(item, ActionStatus)]
+
+        assert as_tuples(records) == as_tuples(dom_records(body))
+        expected = ActionStatus.from_xml_response(ET.fromstring(body))
+        assert statuses[0].statusCode == expected.statusCode
+        assert parse_action_status(body).statusCode == expected.statusCode
+
+
+def test_section_records_are_filtered():
+    body = (
+        "<ResponseData><ActionStatus><statusCode>0</statusCode></ActionStatus>"
+        "<DeviceConfiguration>"
+        '<STP type="section"><BridgeSetting><a>1</a></BridgeSetting></STP>'
+        '<VLANList type="section"><VLAN><VLANID>1</VLANID></VLAN>'
+        "<VLAN><VLANID>2</VLANID></VLAN></VLANList>"
+        "</DeviceConfiguration></ResponseData>"
+    )
+    records = list(iter_section_records(chunked(body, 5), "VLANList"))
+    assert [(record.path, record.VLANID) for record in records] == [
+        ("VLAN", "1"),
+        ("VLAN", "2"),
+    ]
+    assert parse_action_status(body).statusCode == StatusCode.OK
+
+
+def test_missing_action_status():
+    with pytest.raises(ValueError):
+        parse_action_status("<ResponseData></ResponseData>")
@@ -0,0 +1,84 @@
+import math
+
+import pytest
+
+from marvell_11abbe00.fleet import FleetHost
+from marvell_11abbe00.telemetry import (
+    CounterSeries,
+    InterfaceSample,
+    RingBuffer,
+    TelemetryPoller,
+    counter_delta,
+    to_line_protocol,
+)
+
+
+def test_counter_delta():
+    assert counter_delta(100, 150) == 50
+    # 32 and 64 bit wraparounds
+    assert counter_delta(2**32 - 10, 5) == 15
+    assert counter_delta(2**64 - 10, 5) == 15
+    # going back by more than half the range is a reset
+    assert counter_delta(1000, 5) is None
+
+
+def test_ring_buffer_keeps_the_latest_values():
+    ring = RingBuffer(3, "Q")
+    for value in range(5):
+        ring.append(value)
+    assert list(ring) == [2, 3, 4] and len(ring) == 3
+    assert ring[0] == 2 and ring[-1] == 4
+    with pytest.raises(IndexError):
+        ring[3]
+
+
+def test_counter_series_rates():
+    series = CounterSeries(capacity=4)
+    assert series.add(0.0, 100) is None
+    assert series.add(10.0, 200) == 10.0
+    assert series.add(20.0, 250) == 5.0
+    assert series.add(30.0, 0) is None
+    assert len(series) == 4
+    assert math.isnan(series.rates[0]) and math.isnan(series.rates[-1])
+
+
+def test_line_protocol():
+    sample = InterfaceSample(
+        "http://a b", "StatisticsList", "gi1", 1.5, {"rxCount": 7}, {"rxCount": 0.5}
+    )
+    assert to_line_protocol(sample) == (
+        "marvell_counters,host=http://a\\ b,section=StatisticsList,interface=gi1 "
+        "rxCount=7i,rxCount_rate=0.5 1500000000"
+    )
+
+
+def test_poll_counters_and_rates(mock_switch):
+    delays = []
+
+    def traffic(delay):
+        # the counters move between two rounds
+        delays.append(delay)
+        statistics = mock_switch.state.sections["StatisticsList"]
+        for counter in statistics.iter("receivePacketByteCount"):
+            counter.text = str(int(counter.text) + 1000)
+
+    inventory = [FleetHost(mock_switch.address), FleetHost("http://127.0.0.1:9")]
+    with TelemetryPoller(inventory, sleep=traffic) as poller:
+        samples = list(poller.run(rounds=2))
+        # the unreachable host fails every round without stopping the others
+        assert poller.errors == 2
+    assert len(delays) == 1 and 0 < delays[0] <= poller.interval
+
+    rounds = sorted({sample.timestamp for sample in samples})
+    first, second = [
+        [sample for sample in samples if sample.timestamp == timestamp]
+        for timestamp in rounds
+    ]
+    assert first and {sample.host for sample in first} == {mock_switch.address}
+    assert {sample.section for sample in first} == {"StatisticsList", "RMONStatistics"}
+    assert all(sample.rates == {} for sample in first)
+
+    rates = {(sample.section, sample.interfaceName): sample.rates for sample in second}
+    assert rates[("StatisticsList", "gi0")]["receivePacketByteCount"] > 0
+    assert rates[("StatisticsList", "gi0")]["transmitUnicastPacketCount"] == 0
+    assert rates[("RMONStatistics", "gi0")]["receivePacketByteCount"] == 0
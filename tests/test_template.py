@@ -0,0 +1,72 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from marvell_11abbe00.batch import build_payload
+from marvell_11abbe00.benchmark import SETTER_CASES
+from marvell_11abbe00.switch import SwitchOperations, interface_section_write
+from marvell_11abbe00.template import (
+    PAYLOAD_BACKEND_BUILDER,
+    TemplateNode,
+    entry_template,
+    render_payload,
+    serialize_payload,
+)
+
+
+class CapturingSwitch(SwitchOperations):
+    def __init__(self):
+        super().__init__("template")
+        self.token = "template"
+
+    def submit(self, write):
+        return write
+
+
+def assert_same_bytes(writes):
+    expected = ET.tostring(build_payload(writes), encoding="utf8")
+    assert render_payload(writes) == expected
+    assert serialize_payload(writes, PAYLOAD_BACKEND_BUILDER) == expected
+
+
+@pytest.mark.parametrize("setter", sorted(SETTER_CASES))
+def test_setter_payload_matches_elementtree(setter):
+    switch = CapturingSwitch()
+    assert_same_bytes([getattr(switch, setter)(**SETTER_CASES[setter])])
+
+
+def test_batch_payload_matches_elementtree():
+    switch = CapturingSwitch()
+    writes = [
+        getattr(switch, setter)(**kwargs) for setter, kwargs in SETTER_CASES.items()
+    ]
+    writes.append(
+        interface_section_write(
+            "PoEPSEInterfaceList", ["gi0", "gi1", "gi2"], [{"adminEnable": "1"}]
+        )
+    )
+    assert_same_bytes(writes)
+
+
+@pytest.mark.parametrize(
+    "value", ["", "a&b", "<tag>", 'say "hi"', "tab\there", "line\nbreak", "é€"]
+)
+def test_escaped_values_match_elementtree(value):
+    switch = CapturingSwitch()
+    write = switch.set_section_settings(
+        section="LLDPGlobalSetting", settings=[{"chassisIdSource": value, "x": "1"}]
+    )
+    assert_same_bytes([write])
+
+
+def test_template_checks_its_values():
+    template = entry_template("STP", "Entry", ("a", "b"))
+    with pytest.raises(ValueError):
+        TemplateNode(template, ["1"])
+
+    write = CapturingSwitch().set_section_settings(
+        section="STP", settings=[{"a": "1", "b": "2"}]
+    )
+    write.node.values = ["1", 2]
+    with pytest.raises(TypeError):
+        render_payload([write])
@@ -0,0 +1,147 @@
+import threading
+
+import pytest
+import requests
+
+from marvell_11abbe00 import replay
+from marvell_11abbe00.response import StatusCode
+from marvell_11abbe00.retry import Deadline, DeadlineExceeded
+from marvell_11abbe00.throttle import AdaptiveLimiter, TokenBucket, limited
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def test_token_bucket_spaces_requests_after_burst():
+    clock = FakeClock()
+    bucket = TokenBucket(2.0, burst=2, clock=clock, sleep=clock.sleep)
+
+    assert [bucket.acquire() for _ in range(4)] == [0.0, 0.0, 0.5, 0.5]
+
+
+def test_token_bucket_gives_up_at_deadline():
+    clock = FakeClock()
+    bucket = TokenBucket(1.0, burst=1, clock=clock, sleep=clock.sleep)
+    bucket.acquire()
+
+    with pytest.raises(DeadlineExceeded):
+        bucket.acquire(Deadline(0.5, clock=clock))
+    # the token wasn't taken
+    assert bucket.acquire() == 1.0
+
+
+def test_limiter_waits_for_a_slot():
+    clock = FakeClock()
+    limiter = AdaptiveLimiter(initial_limit=2, clock=clock, sleep=clock.sleep)
+    tickets = [limiter.acquire(), limiter.acquire()]
+    assert tickets[-1].saturated
+
+    with pytest.raises(DeadlineExceeded):
+        limiter.acquire(Deadline(0, clock=clock))
+
+    limiter.release(tickets.pop(), statusCode=StatusCode.OK)
+    assert limiter.acquire(Deadline(0, clock=clock)) is not None
+
+
+def test_limiter_only_backs_off_on_overload():
+    clock = FakeClock()
+    limiter = AdaptiveLimiter(initial_limit=8, clock=clock, sleep=clock.sleep)
+
+    limiter.release(limiter.acquire(), error=ValueError("unparsable answer"))
+    assert limiter.decreases == 0
+    assert limiter.limit == 8
+
+    limiter.release(limiter.acquire(), error=requests.ReadTimeout("timed out"))
+    assert limiter.decreases == 1
+    assert limiter.limit == 4
+
+    clock.now += 1.0
+    limiter.release(limiter.acquire(), statusCode=StatusCode.PAYLOAD_ERROR)
+    assert limiter.decreases == 2
+    assert limiter.limit == 2
+
+
+def test_limiter_keeps_requests_in_flight_under_limit():
+    limiter = AdaptiveLimiter(
+        initial_limit=3, max_limit=3, initial_rate=200.0, burst=50
+    )
+    lock = threading.Lock()
+    inFlight = []
+    peak = []
+
+    def attempt(deadline):
+        with lock:
+            inFlight.append(1)
+            peak.append(len(inFlight))
+        threading.Event().wait(0.01)
+        with lock:
+            inFlight.pop()
+        return None, StatusCode.OK
+
+    send = limited(limiter, attempt)
+    threads = [
+        threading.Thread(target=lambda: [send(None) for _ in range(5)])
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max(peak) <= 3
+    assert limiter.inFlight == 0
+    assert limiter.requests == 40
+
+
+def test_adaptive_replay_succeeds(mock_switch, switch, plan, har_file):
+    summary = replay.run(
+        replay.build_parser().parse_args(
+            [
+                *("--host", mock_switch.address, "--har", har_file, "--no-journal"),
+                *("--parallel", "8", "--adaptive"),
+            ]
+        ),
+        switch=switch,
+        plan=plan,
+    )
+
+    assert summary["ok"] == len(plan)
+    assert switch.limiter.requests >= len(plan)
+    assert switch.limiter.inFlight == 0
+
+
+def test_expired_session_is_not_overload():
+    clock = FakeClock()
+    limiter = AdaptiveLimiter(initial_limit=8, clock=clock, sleep=clock.sleep)
+
+    limiter.release(limiter.acquire(), statusCode=StatusCode.AUTHENTICATION_ERROR)
+
+    assert limiter.overloads == 0
+    assert limiter.limit == 8
+    assert limiter.baseline is None
+
+
+def test_streamed_reads_are_not_sampled(mock_switch, switch):
+    switch.limiter = AdaptiveLimiter()
+
+    records = list(
+        switch.stream_section_records(["Standard802_3List"], "Standard802_3List")
+    )
+
+    assert records
+    assert switch.limiter.requests == 1
+    assert switch.limiter.inFlight == 0
+    assert switch.limiter.baseline is None
+
+    switch.fetch_sections_xml(["Standard802_3List"])
+    assert switch.limiter.baseline is not None
@@ -0,0 +1,43 @@
+import pytest
+import requests
+
+from marvell_11abbe00.replay import replay_entries
+from marvell_11abbe00.retry import Deadline, DeadlineExceeded
+from marvell_11abbe00.transport import SwitchTransport
+
+
+def test_switch_and_replay_share_one_connection(mock_switch, switch, plan):
+    for _ in range(5):
+        switch.get_section("ForwardingGlobalSetting", max_age=0)
+    replay_entries(switch, plan.entries[:10], "cisco", "cisco")
+
+    stats = switch.transport.stats()
+    assert stats["connections_opened"] == 1
+    assert stats["connections_reused"] == stats["requests"] - 1
+    assert mock_switch.stats["requests"] == stats["requests"]
+
+
+def test_request_timings(mock_switch):
+    url = f"{mock_switch.address}/device/authenticate_user.xml"
+    with SwitchTransport() as transport:
+        first = transport.get(url)
+        # only a new connection has a connect phase
+        second = transport.get(url)
+
+    assert first.timings["connect"] > 0 and "connect" not in second.timings
+    for response in (first, second):
+        assert {"server_wait", "download"} <= set(response.timings)
+
+
+def test_gateway_status_raises(mock_switch):
+    mock_switch.fail_next(1, status=502)
+    with SwitchTransport() as transport:
+        with pytest.raises(requests.HTTPError):
+            transport.get(f"{mock_switch.address}/")
+
+
+def test_expired_deadline_sends_nothing(mock_switch):
+    with SwitchTransport() as transport:
+        with pytest.raises(DeadlineExceeded):
+            transport.get(f"{mock_switch.address}/", deadline=Deadline(0))
+    assert mock_switch.stats["requests"] == 0
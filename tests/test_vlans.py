@@ -0,0 +1,75 @@
+import pytest
+
+from marvell_11abbe00.vlans import (
+    VLANSet,
+    as_vlan_set,
+    field_values_equal,
+    interface_vlan_sets,
+)
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("", ""),
+        ("1", "1"),
+        ("1-2349,2363,2450-4093", "1-2349,2363,2450-4093"),
+        ("3,1,2", "1-3"),
+        ("1-3, 2-5 ,10,10", "1-5,10"),
+        ("4094", "4094"),
+        ("1-4094", "1-4094"),
+    ],
+)
+def test_parse_and_format(text, expected):
+    vlanSet = VLANSet.parse(text)
+    assert str(vlanSet) == expected
+    assert VLANSet.parse(str(vlanSet)) == vlanSet
+
+
+@pytest.mark.parametrize("text", ["0", "4095", "5-3", "a", "1-", "1-2-3", "-4"])
+def test_parse_rejects_malformed_lists(text):
+    with pytest.raises(ValueError):
+        VLANSet.parse(text)
+
+
+def test_set_operations():
+    a = VLANSet.parse("1-10")
+    b = VLANSet([5, 6, 20])
+
+    assert str(a | b) == "1-10,20"
+    assert str(a & b) == "5-6"
+    assert str(a - b) == "1-4,7-10"
+    assert str(a ^ b) == "1-4,7-10,20"
+    assert VLANSet([2, 3]) <= a and a >= "2-3"
+    assert not b.issubset(a)
+    assert a.isdisjoint("11-20") and not a.isdisjoint(10)
+
+    assert len(a) == 10 and list(b) == [5, 6, 20]
+    assert 5 in a and 11 not in a and "5" not in a and -1 not in a
+    assert not VLANSet() and VLANSet.range(7, 9) == as_vlan_set([7, 8, 9])
+    assert hash(VLANSet.parse("1-3")) == hash(VLANSet([1, 2, 3]))
+
+    with pytest.raises(ValueError):
+        VLANSet([0])
+    with pytest.raises(ValueError):
+        VLANSet.from_bits(1)
+
+
+def test_field_values_equal():
+    assert field_values_equal("trunkMemberVLANs", "1-3", "1,2,3")
+    assert not field_values_equal("trunkMemberVLANs", "1-3", "1-4")
+    assert not field_values_equal("trunkNativeVLAN", "1-3", "1,2,3")
+    assert not field_values_equal("trunkMemberVLANs", None, "1")
+    assert not field_values_equal("trunkMemberVLANs", "x", "1")
+
+
+def test_interface_vlan_sets():
+    records = [
+        {"interfaceName": "gi1", "trunkMemberVLANs": "1-3,10", "trunkNativeVLAN": "1"},
+        {"interfaceName": "gi2", "generalTaggedVLANs": ""},
+        {"trunkMemberVLANs": "1"},
+    ]
+    assert interface_vlan_sets(records) == {
+        "gi1": {"trunkMemberVLANs": VLANSet([1, 2, 3, 10])},
+        "gi2": {"generalTaggedVLANs": VLANSet()},
+    }